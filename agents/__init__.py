@@ -1,4 +1,5 @@
 from agents.welcome_agent import WelcomeAgent
+from agents.async_welcome_agent import AsyncWelcomeAgent
 
 #Exportation de l'agent
-__all__ = ['WelcomeAgent']
\ No newline at end of file
+__all__ = ['WelcomeAgent', 'AsyncWelcomeAgent']
@@ -0,0 +1,242 @@
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+
+
+class AdmissionRejected(Exception):
+    """Requête refusée par le contrôle d'admission : réessayer après retry_after secondes"""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(f"Capacité Groq saturée ({reason}), réessayer dans {retry_after} s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """Autorisation d'envoyer un appel ; à rendre avec AdmissionController.release"""
+
+    __slots__ = ("cost", "prompt_tokens", "granted", "released", "queued", "waited")
+
+    def __init__(self, cost, prompt_tokens):
+        self.cost = cost
+        self.prompt_tokens = prompt_tokens
+        self.granted = False
+        self.released = False
+        self.queued = False
+        self.waited = 0.0
+
+
+class AdmissionController:
+    """Contrôle d'admission devant les appels Groq d'un modèle.
+
+    Deux seaux à jetons suivent le budget de requêtes et de tokens par
+    minute, et un plafond borne les appels simultanés. Le coût d'un appel
+    est estimé avant l'envoi (tokens du prompt + longueur moyenne observée
+    des réponses), puis corrigé avec l'usage réel renvoyé par Groq.
+
+    Un appel qui ne peut pas partir tout de suite attend dans une file FIFO
+    bornée. Si la file est pleine, ou si l'attente estimée dépasse le délai
+    accordé, il est refusé immédiatement (AdmissionRejected avec un délai
+    de réessai) au lieu d'échouer tard sur un 429 de Groq.
+    """
+
+    # Intervalle de vérification des attentes asynchrones bloquées par la concurrence
+    POLL_INTERVAL = 0.02
+
+    def __init__(self, rpm, tpm, max_in_flight, max_queue, timeout, expected_completion=256):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.expected_completion = float(expected_completion)
+        self.in_flight = 0
+        self._requests = float(rpm)
+        self._tokens = float(tpm)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self.counters = {"admitted": 0, "queued": 0, "rejected": 0, "timeouts": 0, "pauses": 0, "deferred": 0}
+
+    def estimate(self, prompt_tokens):
+        """Coût estimé d'un appel : prompt + réponse moyenne"""
+        return prompt_tokens + int(self.expected_completion)
+
+    # --- Budget (appelé sous verrou) ---
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+
+    def _budget_wait(self, requests, tokens, now):
+        """Secondes avant que le budget couvre `requests` appels et `tokens` tokens"""
+        wait = max(0.0, self._paused_until - now)
+        if requests > self._requests:
+            wait = max(wait, (requests - self._requests) * 60 / self.rpm)
+        if tokens > self._tokens:
+            wait = max(wait, (tokens - self._tokens) * 60 / self.tpm)
+        return wait
+
+    def _try_grant(self, ticket, now):
+        """Accorder le ticket si possible ; sinon secondes d'attente (None : limité par la concurrence)"""
+        self._refill(now)
+        if self.in_flight >= self.max_in_flight:
+            return None
+        wait = self._budget_wait(1, ticket.cost, now)
+        if wait > 0:
+            return wait
+        self._requests -= 1
+        self._tokens -= ticket.cost
+        self.in_flight += 1
+        self.counters["admitted"] += 1
+        ticket.granted = True
+        return 0.0
+
+    def _backlog_wait(self, ticket, now):
+        """Attente estimée si le ticket passe après toute la file"""
+        tokens = sum(queued.cost for queued in self._queue) + ticket.cost
+        return self._budget_wait(len(self._queue) + 1, tokens, now)
+
+    def _reject(self, reason, wait):
+        self.counters["rejected" if reason != "timeout" else "timeouts"] += 1
+        return AdmissionRejected(reason, max(1, math.ceil(wait)))
+
+    def _enter(self, ticket, timeout):
+        """Accorder immédiatement, mettre en file, ou refuser tout de suite"""
+        now = time.monotonic()
+        if not self._queue and self._try_grant(ticket, now) == 0.0:
+            return
+        wait = self._backlog_wait(ticket, now)
+        if len(self._queue) >= self.max_queue:
+            raise self._reject("queue_full", wait)
+        if wait > timeout:
+            raise self._reject("budget", wait)
+        ticket.queued = True
+        self.counters["queued"] += 1
+        self._queue.append(ticket)
+
+    def _leave(self, ticket):
+        """Retirer de la file un ticket abandonné et réveiller le suivant"""
+        if not ticket.granted and ticket in self._queue:
+            self._queue.remove(ticket)
+            self._cond.notify_all()
+
+    def _step(self, ticket):
+        """Tenter d'accorder le ticket s'il est en tête ; retourne l'attente suggérée"""
+        if self._queue[0] is not ticket:
+            return None
+        wait = self._try_grant(ticket, time.monotonic())
+        if wait == 0.0:
+            self._queue.popleft()
+            self._cond.notify_all()
+        return wait
+
+    # --- API ---
+
+    def _new_ticket(self, prompt_tokens):
+        # Un appel plus gros que tout le budget ne passerait jamais
+        return Ticket(min(self.estimate(prompt_tokens), self.tpm), prompt_tokens)
+
+    def acquire(self, prompt_tokens, timeout=None):
+        """Attendre l'autorisation d'envoyer un appel (AdmissionRejected si refusé)"""
+        timeout = self.timeout if timeout is None else min(timeout, self.timeout)
+        ticket = self._new_ticket(prompt_tokens)
+        started = time.monotonic()
+        deadline = started + timeout
+        with self._cond:
+            self._enter(ticket, timeout)
+            try:
+                while not ticket.granted:
+                    wait = self._step(ticket)
+                    if ticket.granted:
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise self._reject("timeout", self._backlog_wait(ticket, time.monotonic()))
+                    self._cond.wait(remaining if wait is None else min(wait, remaining))
+            finally:
+                self._leave(ticket)
+        ticket.waited = time.monotonic() - started
+        return ticket
+
+    def try_acquire(self, prompt_tokens, reserve=0.0):
+        """Appel de basse priorité (tâche de fond) : accordé tout de suite ou pas du tout.
+
+        Le ticket n'est accordé que si personne n'attend dans la file et qu'il
+        reste ensuite `reserve` (fraction du budget par minute) aux requêtes
+        des visiteurs ; sinon retourne None, l'appel est à reporter.
+        """
+        ticket = self._new_ticket(prompt_tokens)
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            if self._queue or self._budget_wait(1 + self.rpm * reserve, ticket.cost + self.tpm * reserve, now) > 0:
+                self.counters["deferred"] += 1
+                return None
+            if self._try_grant(ticket, now) != 0.0:
+                self.counters["deferred"] += 1
+                return None
+        return ticket
+
+    async def aacquire(self, prompt_tokens, timeout=None):
+        """Variante asynchrone : l'attente ne bloque pas la boucle d'événements"""
+        timeout = self.timeout if timeout is None else min(timeout, self.timeout)
+        ticket = self._new_ticket(prompt_tokens)
+        started = time.monotonic()
+        deadline = started + timeout
+        with self._cond:
+            self._enter(ticket, timeout)
+        try:
+            while not ticket.granted:
+                with self._cond:
+                    wait = self._step(ticket)
+                    if ticket.granted:
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise self._reject("timeout", self._backlog_wait(ticket, time.monotonic()))
+                await asyncio.sleep(min(wait or self.POLL_INTERVAL, remaining))
+        finally:
+            with self._cond:
+                self._leave(ticket)
+        ticket.waited = time.monotonic() - started
+        return ticket
+
+    def release(self, ticket, prompt_tokens=None, completion_tokens=None):
+        """Rendre la place et corriger le budget avec l'usage réel (si connu)"""
+        with self._cond:
+            if ticket.released or not ticket.granted:
+                return
+            ticket.released = True
+            self.in_flight -= 1
+            if completion_tokens is not None:
+                used = (prompt_tokens if prompt_tokens is not None else ticket.prompt_tokens) + completion_tokens
+                self._refill(time.monotonic())
+                # Rendre l'excédent estimé (ou prélever le dépassement)
+                self._tokens = min(self.tpm, self._tokens + ticket.cost - used)
+                self.expected_completion += 0.1 * (completion_tokens - self.expected_completion)
+            self._cond.notify_all()
+
+    def pause(self, seconds):
+        """Suspendre les admissions (Groq a répondu 429 malgré le budget)"""
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self.counters["pauses"] += 1
+
+    def stats(self):
+        with self._cond:
+            self._refill(time.monotonic())
+            stats = dict(self.counters)
+            stats["in_flight"] = self.in_flight
+            stats["queue"] = len(self._queue)
+            stats["requests_available"] = round(self._requests, 1)
+            stats["tokens_available"] = round(self._tokens)
+            stats["expected_completion_tokens"] = round(self.expected_completion)
+            stats["rpm"] = self.rpm
+            stats["tpm"] = self.tpm
+        return stats
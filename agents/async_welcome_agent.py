@@ -0,0 +1,318 @@
+import asyncio
+import threading
+import time
+import httpx
+from groq import AsyncGroq, DefaultAsyncHttpxClient, Groq
+from config import Config, GroqConfig, BatchConfig, SpeculationConfig
+from agents.welcome_agent import WelcomeAgent, agent_log, api_log, error_log
+from agents.admission import AdmissionRejected
+from agents.speculation import Speculator
+from agents.generation_policy import ContinuedCompletion, merge_usage
+from agents.tokens import estimate_messages_tokens
+from tracing import span
+import metrics
+
+
+class AsyncWelcomeAgent(WelcomeAgent):
+    """Variante asynchrone de WelcomeAgent pour le point d'entrée ASGI.
+    
+    Les appels Groq ne bloquent pas la boucle d'événements et passent tous
+    par un même pool de connexions HTTP, ce qui permet à un seul processus
+    de garder des centaines de complétions en vol.
+    """
+
+    SHARED = WelcomeAgent.SHARED + ("http_client", "_batch_slots")
+
+    def _create_client(self):
+        """Créer le client Groq asynchrone et son pool de connexions partagé"""
+        self._sync_client = None
+        self._summary_lock = threading.Lock()
+        # Conversations des lots en cours, tous lots et tous sites confondus
+        self._batch_slots = asyncio.Semaphore(BatchConfig.CONCURRENCY)
+        self.http_client = DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=GroqConfig.MAX_CONNECTIONS,
+                max_keepalive_connections=GroqConfig.MAX_KEEPALIVE_CONNECTIONS
+            )
+        )
+        return AsyncGroq(
+            api_key=Config.GROQ_API_KEY,
+            http_client=self.http_client,
+            max_retries=0,
+            timeout=GroqConfig.REQUEST_TIMEOUT
+        )
+
+    def _create_speculator(self):
+        """Appels spéculatifs exécutés comme tâches de la boucle d'événements"""
+        return Speculator(SpeculationConfig.MAX_IN_FLIGHT)
+
+    def _dispatch(self, draft):
+        """Démarrer l'appel spéculatif dans une tâche (qui hérite du contexte de la requête)"""
+        return asyncio.ensure_future(self._ashared_upstream(draft))
+
+    def _abandon(self, speculation, reason):
+        """Annuler la tâche spéculative : la requête HTTP vers Groq est interrompue"""
+        speculation.task.cancel()
+        speculation.task.add_done_callback(lambda task: self._discarded(speculation, reason, task))
+
+    def _summary_client(self):
+        """Client synchrone dédié aux threads de résumé, créé à la première utilisation"""
+        with self._summary_lock:
+            if self._sync_client is None:
+                # Retries gérés par self.resilience, comme pour le client asynchrone
+                self._sync_client = Groq(
+                    api_key=Config.GROQ_API_KEY,
+                    max_retries=0,
+                    timeout=GroqConfig.REQUEST_TIMEOUT
+                )
+            return self._sync_client
+
+    async def _acall_upstream(self, turn, stream=False):
+        """Appeler Groq avec le modèle routé, et basculer vers un repli en cas d'échec"""
+        attempts = self._upstream_chain(turn)
+        for index, (tier, model, deadline, retries) in enumerate(attempts):
+            try:
+                ticket = await self._aadmit(turn, model)
+            except AdmissionRejected:
+                if index == len(attempts) - 1:
+                    raise
+                continue
+            started = self._upstream_started(model)
+            try:
+                with span("groq"):
+                    result = await self.resilience[model].acall(
+                        self._request(turn, model, stream, deadline),
+                        max_retries=retries,
+                        stream=stream
+                    )
+            except asyncio.CancelledError:
+                # Appel abandonné (spéculation annulée, client parti) : rendre la place sans pénaliser le modèle
+                self._release(model, ticket)
+                metrics.upstream_in_flight.dec(model)
+                raise
+            except Exception as e:
+                self._release(model, ticket)
+                self._upstream_finished(model, started, e)
+                if index == len(attempts) - 1:
+                    raise
+                api_log.warning("model_fallback", extra={"fields": {
+                    "from_model": model, "to_model": attempts[index + 1][1], "error_type": type(e).__name__
+                }})
+                self.router.record_fallback(turn.route, attempts[index + 1][0])
+                continue
+            self._upstream_finished(model, started)
+            turn.model = model
+            self._hold(turn, model, ticket, stream, result)
+            return result
+
+    async def _agenerate(self, turn):
+        """Appeler Groq, puis demander la suite d'une réponse tronquée"""
+        completions = [await self._acall_upstream(turn)]
+        while True:
+            follow = self._continuation(
+                turn,
+                "".join(completion.choices[0].message.content or "" for completion in completions),
+                completions[-1].choices[0].finish_reason,
+                len(completions) - 1
+            )
+            if follow is None:
+                break
+            try:
+                with span("continue"):
+                    completions.append(await self._acall_upstream(follow))
+            except Exception as e:
+                self._continuation_failed(turn, e)
+                break
+        return completions[0] if len(completions) == 1 else ContinuedCompletion(completions)
+
+    async def _aadmit(self, turn, model):
+        """Réserver le budget du modèle sans bloquer la boucle d'événements"""
+        if self.admission is None:
+            return None
+        try:
+            with span("admission"):
+                ticket = await self.admission[model].aacquire(estimate_messages_tokens(turn.messages))
+        except AdmissionRejected as e:
+            metrics.admission.inc(model, e.reason)
+            raise
+        self._admitted(model, ticket)
+        return ticket
+
+    async def _ashared_upstream(self, turn):
+        """Appeler Groq, en partageant l'appel avec les tours identiques en cours"""
+        if self.single_flight is None:
+            return await self._agenerate(turn)
+        
+        async def call():
+            completion = await self._agenerate(turn)
+            return completion, turn.model
+        
+        (completion, turn.model), turn.shared = await self.single_flight.ado(
+            self._flight_key(turn), call, timeout=self._flight_timeout()
+        )
+        if turn.shared:
+            metrics.coalesced.inc()
+        return completion
+
+    async def aload_session(self, session_id="default"):
+        """Lire la session sur disque hors de la boucle d'événements, si nécessaire.
+
+        Appelée avant les accès synchrones au store (historique, ajout,
+        longueur) : ceux-ci trouvent alors la session en mémoire.
+        """
+        await self.sessions.arefresh(self._session_key(session_id))
+
+    async def respond(self, user_message, session_id="default"):
+        """Traiter un message ; contrairement à process_message, les erreurs sont levées"""
+        await self.aload_session(session_id)
+        speculation = self._speculate(user_message, session_id)
+        try:
+            if speculation is not None:
+                # Laisser la requête partir vers Groq avant les vérifications
+                await asyncio.sleep(0)
+            turn = self._prepare_turn(user_message, session_id, speculation)
+        except BaseException:
+            if speculation is not None:
+                self._abandon(speculation, "error")
+            raise
+        if speculation is not None:
+            self._settle_speculation(speculation, turn)
+        if turn.response is not None:
+            return turn.response
+        
+        if turn.speculation is not None:
+            completion = self._speculative_result(turn, await turn.speculation.task)
+        else:
+            completion = await self._ashared_upstream(turn)
+        
+        # L'appel Groq a pu dépasser l'intervalle de revalidation de la session
+        await self.aload_session(session_id)
+        with span("complete"):
+            return self._complete_turn(turn, completion)
+
+    async def process_message(self, user_message, session_id="default"):
+        """Traiter un message utilisateur et retourner la réponse de l'agent"""
+        try:
+            return await self.respond(user_message, session_id)
+            
+        except AdmissionRejected:
+            metrics.turns.inc("shed")
+            raise
+        except Exception as e:
+            error_log.error("process_message_failed", exc_info=e, extra={"fields": {"error_type": type(e).__name__}})
+            metrics.turns.inc("error")
+            
+            return self._error_response()
+
+    async def _arun_conversation(self, messages, session_id):
+        """Envoyer les messages d'une conversation dans l'ordre ; retourne (réponses, erreur)"""
+        responses = []
+        try:
+            for message in messages:
+                responses.append(await self.respond(message, session_id))
+        except AdmissionRejected as e:
+            metrics.turns.inc("shed")
+            return responses, e
+        except Exception as e:
+            error_log.error("batch_conversation_failed", exc_info=e, extra={"fields": {
+                "session_id": session_id, "error_type": type(e).__name__
+            }})
+            metrics.turns.inc("error")
+            return responses, e
+        return responses, None
+
+    async def process_batch(self, conversations):
+        """Traiter des conversations indépendantes en parallèle (au plus BatchConfig.CONCURRENCY
+        par worker, tous lots confondus) ; produit (conversation, réponses, erreur) au fil de l'eau"""
+        async def run(item):
+            async with self._batch_slots:
+                return item, await self._arun_conversation(item.messages, item.session_id)
+
+        tasks = [asyncio.ensure_future(run(item)) for item in conversations]
+        try:
+            for done in asyncio.as_completed(tasks):
+                item, (responses, error) = await done
+                yield item, responses, error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def stream_message(self, user_message, session_id="default"):
+        """Variante de process_message qui produit la réponse par fragments (deltas)"""
+        await self.aload_session(session_id)
+        turn = self._prepare_turn(user_message, session_id)
+        if turn.response is not None:
+            yield turn.response
+            return
+        
+        parts = []
+        outcome = "completed"
+        finish_reason = None
+        continuations, usages = 0, []
+        
+        try:
+            stream = await self._acall_upstream(turn, stream=True)
+            
+            while True:
+                async for chunk in stream:
+                    self._stream_usage(turn, chunk)
+                    if not chunk.choices:
+                        continue
+                    finish_reason = chunk.choices[0].finish_reason or finish_reason
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        if not parts:
+                            self._first_chunk(turn)
+                        parts.append(delta)
+                        yield delta
+                
+                # Réponse coupée par max_tokens : enchaîner sur le flux de sa suite
+                follow = self._continuation(turn, "".join(parts), finish_reason, continuations)
+                if follow is None:
+                    break
+                self._release(*turn.ticket, turn.usage)
+                usages.append(turn.usage)
+                turn.ticket = turn.usage = None
+                continuations += 1
+                try:
+                    stream = await self._acall_upstream(follow, stream=True)
+                except Exception as e:
+                    self._continuation_failed(turn, e)
+                    break
+                turn.ticket = follow.ticket
+                finish_reason = None
+                    
+        except AdmissionRejected:
+            metrics.turns.inc("shed")
+            raise
+        except Exception as e:
+            error_log.error("stream_message_failed", exc_info=e, extra={"fields": {"error_type": type(e).__name__}})
+            if not parts:
+                metrics.turns.inc("error")
+                yield self._error_response()
+                return
+            outcome = "error"
+        finally:
+            if turn.ticket:
+                self._release(*turn.ticket, turn.usage)
+            if usages:
+                turn.usage = merge_usage(usages + [turn.usage])
+        
+        await self.aload_session(session_id)
+        self._record_stream(turn, parts, outcome, finish_reason, continuations)
+
+    async def awarm_up(self):
+        """Variante asynchrone de warm_up : ouvre une connexion dans le pool partagé"""
+        started = time.perf_counter()
+        try:
+            await self.client.models.list(timeout=GroqConfig.PREWARM_TIMEOUT)
+        except Exception as e:
+            agent_log.warning("prewarm_failed", extra={"fields": {"error_type": type(e).__name__}})
+            return {"ok": False, "error_type": type(e).__name__}
+        return {"ok": True, "ms": round((time.perf_counter() - started) * 1000, 1)}
+
+    async def aclose(self):
+        """Fermer le pool de connexions HTTP"""
+        if self.summarizer:
+            self.summarizer.shutdown()
+        await self.client.close()
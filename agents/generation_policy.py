@@ -0,0 +1,148 @@
+import threading
+from bisect import bisect_left
+from collections import deque
+from types import SimpleNamespace
+
+
+class RollingHistogram:
+    """Histogramme à bornes fixes des `window` dernières observations.
+
+    Les comptes par intervalle sont tenus à jour à chaque observation
+    (ajout de la nouvelle valeur, retrait de la plus ancienne) : un
+    quantile se lit en parcourant les intervalles, sans trier.
+    """
+
+    def __init__(self, buckets, window):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self._values = deque(maxlen=window)
+
+    def __len__(self):
+        return len(self._values)
+
+    def observe(self, value):
+        if len(self._values) == self._values.maxlen:
+            self.counts[bisect_left(self.buckets, self._values[0])] -= 1
+        self._values.append(value)
+        self.counts[bisect_left(self.buckets, value)] += 1
+
+    def quantile(self, q):
+        """Borne haute de l'intervalle qui contient le quantile q (None sans observation)"""
+        total = len(self._values)
+        if not total:
+            return None
+        rank, cumulative = q * total, 0
+        for index, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return self.buckets[index] if index < len(self.buckets) else max(self._values)
+        return max(self._values)
+
+
+class GenerationPolicy:
+    """Paramètres de génération (max_tokens, température, arrêt) par type de demande.
+
+    Le type est tiré de l'intention détectée (classifieur ou mots-clés du
+    routeur) et de la longueur du message. Pour chaque type, la longueur des
+    réponses est suivie dans un histogramme glissant ; une fois assez de
+    réponses observées, max_tokens suit le quantile haut de ces longueurs
+    (avec une marge) au lieu de réserver le plafond à chaque appel. Une
+    réponse coupée par max_tokens est complétée par l'agent (voir
+    continuation), et sa longueur totale est observée.
+    """
+
+    DEFAULT = "default"
+
+    def __init__(self, policies, intents, ceiling, short_words, buckets, window=200, min_samples=30,
+                 quantile=0.95, headroom=1.25, min_tokens=64):
+        self.policies = policies
+        self.intents = intents
+        self.ceiling = ceiling
+        self.short_words = short_words
+        self.min_samples = min_samples
+        self.quantile = quantile
+        self.headroom = headroom
+        self.min_tokens = min_tokens
+        self._lock = threading.Lock()
+        self._lengths = {name: RollingHistogram(buckets, window) for name in policies}
+        self._max_tokens = {name: self._initial(name) for name in policies}
+        self.counters = {name: {"requests": 0, "truncated": 0} for name in policies}
+
+    def _initial(self, name):
+        return min(self.policies[name].get("max_tokens", self.ceiling), self.ceiling)
+
+    def classify(self, intent=None, route_intent=None, words=()):
+        """Type de la demande : intention du classifieur, puis du routeur, puis longueur du message"""
+        for detected in (intent, route_intent):
+            name = self.intents.get(detected)
+            if name in self.policies:
+                return name
+        if "short" in self.policies and len(words) <= self.short_words:
+            return "short"
+        return self.DEFAULT
+
+    def params(self, name, temperature):
+        """Paramètres Groq du type : max_tokens courant, température, séquences d'arrêt"""
+        policy = self.policies[name]
+        with self._lock:
+            self.counters[name]["requests"] += 1
+            params = {
+                "max_tokens": self._max_tokens[name],
+                "temperature": policy.get("temperature", temperature),
+            }
+        if policy.get("stop"):
+            params["stop"] = policy["stop"]
+        return params
+
+    def observe(self, name, completion_tokens, truncated=False, complete=True):
+        """Enregistrer la longueur d'une réponse (suites comprises) et ajuster max_tokens du type.
+
+        Une réponse restée tronquée compte comme une réponse au plafond :
+        sa vraie longueur est inconnue, et max_tokens ne doit pas rester bloqué dessous.
+        """
+        if not complete:
+            completion_tokens = max(completion_tokens, self.ceiling)
+        with self._lock:
+            lengths = self._lengths[name]
+            lengths.observe(completion_tokens)
+            if truncated:
+                self.counters[name]["truncated"] += 1
+            if len(lengths) >= self.min_samples:
+                target = int(lengths.quantile(self.quantile) * self.headroom)
+                self._max_tokens[name] = max(self.min_tokens, min(target, self.ceiling))
+
+    def stats(self):
+        with self._lock:
+            return {
+                name: {
+                    **self.counters[name],
+                    "samples": len(self._lengths[name]),
+                    "p50": self._lengths[name].quantile(0.5),
+                    "p95": self._lengths[name].quantile(0.95),
+                    "max_tokens": self._max_tokens[name],
+                }
+                for name in self.policies
+            }
+
+
+class ContinuedCompletion:
+    """Complétion reconstituée à partir d'une réponse tronquée et de ses suites"""
+
+    def __init__(self, completions):
+        text = "".join(completion.choices[0].message.content or "" for completion in completions)
+        self.choices = [SimpleNamespace(
+            message=SimpleNamespace(role="assistant", content=text),
+            finish_reason=completions[-1].choices[0].finish_reason
+        )]
+        self.usage = merge_usage([getattr(completion, "usage", None) for completion in completions])
+        self.continuations = len(completions) - 1
+
+
+def merge_usage(usages):
+    """Somme des tokens de plusieurs appels (None si aucun usage connu)"""
+    usages = [usage for usage in usages if usage is not None]
+    if not usages:
+        return None
+    prompt = sum(usage.prompt_tokens or 0 for usage in usages)
+    completion = sum(usage.completion_tokens or 0 for usage in usages)
+    return SimpleNamespace(prompt_tokens=prompt, completion_tokens=completion, total_tokens=prompt + completion)
@@ -0,0 +1,125 @@
+from config import SecurityConfig, WelcomeAgentConfig
+from agents.text import tokenize
+
+
+class KeywordMatcher:
+    """Détecteur multi-motifs précompilé.
+
+    Chaque mot-clé (ou expression de plusieurs mots) est normalisé une fois
+    à la construction et rangé dans un index par nombre de mots. Un texte
+    est normalisé en une seule passe puis ses n-grammes sont cherchés dans
+    l'index : le coût d'un scan dépend de la longueur du message, pas du
+    nombre de mots-clés.
+
+    Les correspondances se font sur des mots entiers. Un mot-clé terminé
+    par « * » correspond à tout mot qui commence par ce préfixe
+    (« hack* » : hack, hacker, hacking). Le pluriel simple (s/x final)
+    est toléré.
+    """
+
+    __slots__ = ("_priority", "_phrases", "_prefixes", "max_words",
+                 "_phrase_starts", "_prefix_lengths", "size")
+
+    def __init__(self, categories):
+        """categories : dictionnaire {catégorie: [mots-clés]}, par ordre de priorité"""
+        self._priority = {name: rank for rank, name in enumerate(categories)}
+        self._phrases = {}
+        self._prefixes = {}
+        self.max_words = 1
+        self._phrase_starts = set()
+        self._prefix_lengths = ()
+
+        for category, keywords in categories.items():
+            for keyword in keywords:
+                prefix = keyword.endswith("*")
+                words = tuple(tokenize(keyword.rstrip("*")))
+                if not words:
+                    continue
+                if prefix and len(words) == 1:
+                    self._prefixes.setdefault(words[0], category)
+                else:
+                    self._phrases.setdefault(words, category)
+                    self.max_words = max(self.max_words, len(words))
+                    if len(words) > 1:
+                        self._phrase_starts.add(words[0])
+
+        self._prefix_lengths = tuple(sorted({len(prefix) for prefix in self._prefixes}))
+        self.size = len(self._phrases) + len(self._prefixes)
+
+    @staticmethod
+    def _singular(word):
+        if len(word) > 3 and word[-1] in "sx":
+            return word[:-1]
+        return None
+
+    def _scan(self, words):
+        """Générer (catégorie, mot-clé) pour chaque correspondance"""
+        phrases = self._phrases
+        prefixes = self._prefixes
+        prefix_lengths = self._prefix_lengths
+        phrase_starts = self._phrase_starts
+        max_words = self.max_words
+        count = len(words)
+
+        for i, word in enumerate(words):
+            category = phrases.get((word,))
+            if category is None:
+                singular = self._singular(word)
+                if singular:
+                    category = phrases.get((singular,))
+            if category is not None:
+                yield category, word
+
+            for end in prefix_lengths:
+                if end > len(word):
+                    break
+                category = prefixes.get(word[:end])
+                if category is not None:
+                    yield category, word[:end] + "*"
+                    break
+
+            # Expressions de plusieurs mots : seulement si le mot peut en commencer une
+            if word not in phrase_starts:
+                continue
+            for size in range(2, min(max_words, count - i) + 1):
+                phrase = tuple(words[i:i + size])
+                category = phrases.get(phrase)
+                if category is None:
+                    singular = self._singular(phrase[-1])
+                    if singular:
+                        category = phrases.get(phrase[:-1] + (singular,))
+                if category is not None:
+                    yield category, " ".join(phrase)
+
+    def categories(self, text=None, words=None):
+        """Ensemble des catégories détectées dans le texte"""
+        if words is None:
+            words = tokenize(text)
+        return {category for category, _ in self._scan(words)}
+
+    def match(self, text=None, words=None):
+        """Retourner (catégorie, mot-clé) de plus haute priorité, ou None"""
+        if words is None:
+            words = tokenize(text)
+        best = None
+        for hit in self._scan(words):
+            if best is None or self._priority[hit[0]] < self._priority[best[0]]:
+                best = hit
+                if self._priority[hit[0]] == 0:
+                    break
+        return best
+
+
+_content_matcher = None
+
+
+def get_content_matcher():
+    """Matcher partagé des listes de contenu de la configuration, construit au premier appel"""
+    global _content_matcher
+    if _content_matcher is None:
+        _content_matcher = KeywordMatcher({
+            "blocked": SecurityConfig.BLOCKED_WORDS,
+            "forbidden": WelcomeAgentConfig.FORBIDDEN_TOPICS,
+            "btp": WelcomeAgentConfig.BTP_KEYWORDS,
+        })
+    return _content_matcher
@@ -0,0 +1,214 @@
+import glob
+import hashlib
+import math
+import os
+import re
+from config import KnowledgeConfig, WelcomeAgentConfig
+from agents.text import tokenize
+from agents.tokens import estimate_tokens
+
+# Mots vides français (après retrait des accents), ignorés à l'indexation
+STOPWORDS = frozenset("""
+a afin ai au aussi aux avec c ce ces cet cette comme d dans de des du elle en est et etre il ils
+j je l la le les leur leurs lui m ma mais me mes moi mon n ne nos notre nous on ont ou par pas
+pour qu que quel quelle quelles quels qui s sa sans se ses si son sont sur ta te tes toi ton tu
+un une vos votre vous y
+""".split())
+
+_HEADING = re.compile(r"^(#{1,3})\s+(.*)$")
+
+
+def terms(text=None, words=None):
+    """Termes indexés : mots sans accents ni mots vides, réduits à leur radical.
+
+    Comme pour le classifieur d'intentions, le radical est le début du mot
+    (5 lettres) après retrait du pluriel : rénovation / rénover, toiture /
+    toitures, construire / construction tombent sur le même terme.
+    """
+    if words is None:
+        words = tokenize(text)
+    result = []
+    for word in words:
+        if word in STOPWORDS or len(word) < 2:
+            continue
+        if len(word) > 3 and word[-1] in "sx":
+            word = word[:-1]
+        result.append(word[:5])
+    return result
+
+
+class Chunk:
+    """Extrait indexé : une section d'un document"""
+
+    __slots__ = ("source", "title", "text", "tokens")
+
+    def __init__(self, source, title, text):
+        self.source = source
+        self.title = title
+        self.text = text
+        self.tokens = estimate_tokens(text) + estimate_tokens(title)
+
+
+def chunk_markdown(source, text, max_words=120):
+    """Découper un document Markdown : une section par titre, les longues sections par paragraphes"""
+    sections = []
+    title, lines = source, []
+    for line in text.splitlines():
+        match = _HEADING.match(line)
+        if match:
+            sections.append((title, "\n".join(lines)))
+            title, lines = match.group(2).strip(), []
+        else:
+            lines.append(line)
+    sections.append((title, "\n".join(lines)))
+
+    chunks = []
+    for title, body in sections:
+        paragraphs = [paragraph.strip() for paragraph in re.split(r"\n\s*\n", body) if paragraph.strip()]
+        current, size = [], 0
+        for paragraph in paragraphs:
+            words = len(paragraph.split())
+            if current and size + words > max_words:
+                chunks.append(Chunk(source, title, "\n".join(current)))
+                current, size = [], 0
+            current.append(paragraph)
+            size += words
+        if current:
+            chunks.append(Chunk(source, title, "\n".join(current)))
+    return chunks
+
+
+class KnowledgeIndex:
+    """Index inversé en mémoire avec classement BM25.
+
+    Les documents sont découpés en extraits au démarrage ; pour chaque terme
+    l'index garde la liste (extrait, fréquence). Une recherche ne parcourt
+    que les listes des termes de la requête, et seuls les meilleurs extraits
+    sont envoyés à Groq : la taille du prompt ne dépend plus de la taille
+    de la base.
+    """
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.chunks = []
+        self._postings = {}
+        self._lengths = []
+        self._idf = {}
+        self._average_length = 0.0
+        self.searches = 0
+
+    def add(self, chunk):
+        index = len(self.chunks)
+        self.chunks.append(chunk)
+        chunk_terms = terms(f"{chunk.title} {chunk.text}")
+        self._lengths.append(len(chunk_terms))
+        counts = {}
+        for term in chunk_terms:
+            counts[term] = counts.get(term, 0) + 1
+        for term, count in counts.items():
+            self._postings.setdefault(term, []).append((index, count))
+
+    def build(self):
+        """Calculer les IDF et la longueur moyenne, une fois tous les extraits ajoutés"""
+        total = len(self.chunks)
+        self._average_length = sum(self._lengths) / total if total else 0.0
+        self._idf = {
+            term: math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self._postings.items()
+        }
+        return self
+
+    def search(self, text=None, words=None, k=4, min_score=0.0):
+        """Extraits les plus pertinents : [(score, extrait)], du meilleur au moins bon"""
+        self.searches += 1
+        scores = {}
+        k1, b, average = self.k1, self.b, self._average_length or 1.0
+        lengths = self._lengths
+        for term in set(terms(text, words)):
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            idf = self._idf[term]
+            for index, frequency in postings:
+                norm = k1 * (1 - b + b * lengths[index] / average)
+                scores[index] = scores.get(index, 0.0) + idf * frequency * (k1 + 1) / (frequency + norm)
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(score, self.chunks[index]) for index, score in best if score >= min_score]
+
+    def fingerprint(self):
+        """Empreinte du contenu indexé (invalide le cache de réponses quand la base change)"""
+        digest = hashlib.sha256()
+        for chunk in self.chunks:
+            digest.update(f"{chunk.source}\0{chunk.title}\0{chunk.text}\0".encode("utf-8"))
+        return digest.hexdigest()[:16]
+
+    def stats(self):
+        return {
+            "chunks": len(self.chunks),
+            "terms": len(self._postings),
+            "tokens": sum(chunk.tokens for chunk in self.chunks),
+            "searches": self.searches,
+        }
+
+    @classmethod
+    def from_directory(cls, directory, extra_documents=(), variables=None, max_words=120, **kwargs):
+        """Indexer les fichiers .md du dossier, plus des documents (source, texte) fournis.
+
+        Les champs {company_name}, {phone}... des documents sont remplacés par `variables`.
+        """
+        documents = list(extra_documents)
+        for path in sorted(glob.glob(os.path.join(directory, "*.md"))) if directory else ():
+            with open(path, encoding="utf-8") as f:
+                documents.append((os.path.splitext(os.path.basename(path))[0], f.read()))
+
+        index = cls(**kwargs)
+        for source, text in documents:
+            if variables:
+                text = text.format_map(variables)
+            for chunk in chunk_markdown(source, text, max_words):
+                index.add(chunk)
+        return index.build()
+
+
+def company_documents(info=None):
+    """Fiche entreprise tirée de la configuration (source unique des faits de base)"""
+    info = info or WelcomeAgentConfig.COMPANY_INFO
+    sections = [f"# {info['name']} ({info['abbreviation']})\n"
+                f"{info['name']} est une entreprise du secteur {info['domain']}. {info['experience']}."]
+    if info["specialties"]:
+        specialties = "\n".join(f"- {specialty}" for specialty in info["specialties"])
+        sections.append(f"# Spécialités et services\nNos spécialités :\n{specialties}")
+    if info["zones"]:
+        sections.append(f"# Zones d'intervention\nNous intervenons principalement à {', '.join(info['zones'])}.")
+    if info["certifications"]:
+        sections.append(f"# Certifications et qualifications\n{info['name']} dispose des certifications "
+                        f"et agréments suivants : {', '.join(info['certifications'])}.")
+    return [("entreprise", "\n\n".join(sections) + "\n")]
+
+
+def build_knowledge_index(directory, info, variables):
+    """Index des documents d'un site et de sa fiche entreprise"""
+    return KnowledgeIndex.from_directory(
+        directory,
+        extra_documents=company_documents(info),
+        variables=variables,
+        max_words=KnowledgeConfig.CHUNK_WORDS,
+        k1=KnowledgeConfig.BM25_K1,
+        b=KnowledgeConfig.BM25_B
+    )
+
+
+_knowledge_index = None
+
+
+def get_knowledge_index():
+    """Index de KnowledgeConfig.DIRECTORY et de la fiche entreprise, construit au premier appel"""
+    global _knowledge_index
+    if _knowledge_index is None:
+        _knowledge_index = build_knowledge_index(
+            KnowledgeConfig.DIRECTORY,
+            WelcomeAgentConfig.COMPANY_INFO,
+            {"company_name": WelcomeAgentConfig.COMPANY_INFO["name"], **WelcomeAgentConfig.CONTACT}
+        )
+    return _knowledge_index
@@ -0,0 +1,184 @@
+import threading
+import time
+from collections import deque
+from agents.keyword_matcher import KeywordMatcher
+
+
+class RouteDecision:
+    """Choix du modèle pour une requête"""
+
+    __slots__ = ("tier", "model", "reason", "intent", "fallbacks")
+
+    def __init__(self, tier, model, reason, intent):
+        self.tier = tier
+        self.model = model
+        self.reason = reason
+        self.intent = intent
+        self.fallbacks = []
+
+    def as_dict(self):
+        return {
+            "tier": self.tier,
+            "model": self.model,
+            "reason": self.reason,
+            "intent": self.intent,
+            "fallbacks": list(self.fallbacks)
+        }
+
+
+class _ModelHealth:
+    """Moyennes mobiles exponentielles (EWMA) de latence et d'erreurs d'un modèle"""
+
+    __slots__ = ("latency", "error_rate", "calls", "errors", "updated")
+
+    def __init__(self):
+        self.latency = None
+        self.error_rate = 0.0
+        self.calls = 0
+        self.errors = 0
+        self.updated = 0.0
+
+
+class ModelRouter:
+    """Routeur de modèles par requête.
+
+    Le niveau (tier) est choisi à partir de signaux locaux peu coûteux :
+    longueur du message, taille de l'historique, intention détectée. La
+    santé de chaque modèle (latence et taux d'erreur en EWMA) permet
+    d'écarter un modèle dégradé et de basculer vers un modèle plus rapide.
+    """
+
+    def __init__(self, models, fallbacks, deadlines, intents, short_words, long_words,
+                 long_history, long_context_tokens, alpha=0.2, max_error_rate=0.5,
+                 probe_interval=30, recent=50):
+        self.models = models
+        self.fallbacks = fallbacks
+        self.deadlines = deadlines
+        self.short_words = short_words
+        self.long_words = long_words
+        self.long_history = long_history
+        self.long_context_tokens = long_context_tokens
+        self.alpha = alpha
+        self.max_error_rate = max_error_rate
+        self.probe_interval = probe_interval
+        self._intents = KeywordMatcher(intents)
+        self._health = {model: _ModelHealth() for model in models.values()}
+        self._tier_of = {model: tier for tier, model in models.items()}
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=recent)
+        self.decisions = {}
+        self.fallback_count = 0
+
+    def for_models(self, models):
+        """Routeur d'autres niveaux de modèles (un site client), qui partage la santé observée"""
+        router = ModelRouter(
+            models, self.fallbacks, self.deadlines, {}, self.short_words, self.long_words,
+            self.long_history, self.long_context_tokens, self.alpha, self.max_error_rate,
+            self.probe_interval, self._recent.maxlen
+        )
+        router._intents = self._intents
+        router._lock = self._lock
+        with self._lock:
+            for model in models.values():
+                self._health.setdefault(model, _ModelHealth())
+        router._health = self._health
+        return router
+
+    def detect_intent(self, words):
+        match = self._intents.match(words=words)
+        return match[0] if match else None
+
+    def _select_tier(self, words, history_turns, prompt_tokens, intent):
+        if prompt_tokens > self.long_context_tokens:
+            return "mixtral", "long_context"
+        if intent == "greeting" and len(words) <= self.short_words:
+            return "fast", "greeting"
+        if intent == "technical":
+            return "balanced", "technical"
+        if len(words) >= self.long_words:
+            return "balanced", "long_message"
+        if history_turns >= self.long_history:
+            return "balanced", "long_history"
+        return "fast", "default"
+
+    def healthy(self, model):
+        health = self._health.get(model)
+        if health is None or health.calls == 0:
+            return True
+        # Sans appel récent, laisser passer une requête pour sonder le modèle
+        if time.monotonic() - health.updated > self.probe_interval:
+            return True
+        deadline = self.deadlines.get(self._tier_of.get(model))
+        if health.error_rate > self.max_error_rate:
+            return False
+        return deadline is None or health.latency is None or health.latency <= deadline
+
+    def choose(self, words, history_turns, prompt_tokens, pinned=None):
+        """Choisir le modèle pour une requête (pinned : modèle imposé pour cette requête)"""
+        intent = self.detect_intent(words)
+        if pinned:
+            decision = RouteDecision(self._tier_of.get(pinned), pinned, "pinned", intent)
+        else:
+            tier, reason = self._select_tier(words, history_turns, prompt_tokens, intent)
+            decision = RouteDecision(tier, self.models[tier], reason, intent)
+
+            # Écarter un modèle dégradé au profit du premier repli en bonne santé
+            if not self.healthy(decision.model):
+                for fallback in self.fallbacks.get(tier, []):
+                    if self.healthy(self.models[fallback]):
+                        decision = RouteDecision(fallback, self.models[fallback], f"{reason}+degraded_{tier}", intent)
+                        break
+
+        with self._lock:
+            key = f"{decision.tier}:{decision.reason}"
+            self.decisions[key] = self.decisions.get(key, 0) + 1
+            self._recent.append(decision)
+        return decision
+
+    def chain(self, decision):
+        """Modèles à essayer dans l'ordre : le modèle choisi puis ses replis"""
+        chain = [(decision.tier, decision.model)]
+        for tier in self.fallbacks.get(decision.tier, []):
+            if self.models[tier] != decision.model:
+                chain.append((tier, self.models[tier]))
+        return chain
+
+    def deadline(self, tier):
+        return self.deadlines.get(tier)
+
+    def record(self, model, latency, ok):
+        """Mettre à jour la santé du modèle après un appel"""
+        with self._lock:
+            health = self._health.setdefault(model, _ModelHealth())
+            health.calls += 1
+            health.updated = time.monotonic()
+            if not ok:
+                health.errors += 1
+            health.error_rate += self.alpha * ((0.0 if ok else 1.0) - health.error_rate)
+            if ok:
+                health.latency = latency if health.latency is None else (
+                    health.latency + self.alpha * (latency - health.latency)
+                )
+
+    def record_fallback(self, decision, tier):
+        with self._lock:
+            decision.fallbacks.append(tier)
+            self.fallback_count += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "decisions": dict(self.decisions),
+                "fallbacks": self.fallback_count,
+                "models": {
+                    model: {
+                        "ewma_latency": round(health.latency, 3) if health.latency is not None else None,
+                        "ewma_error_rate": round(health.error_rate, 3),
+                        "calls": health.calls,
+                        "errors": health.errors,
+                        "healthy": self.healthy(model)
+                    }
+                    for model, health in self._health.items()
+                },
+                "recent": [decision.as_dict() for decision in self._recent]
+            }
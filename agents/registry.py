@@ -0,0 +1,174 @@
+import glob
+import os
+import threading
+import time
+from config import TenantConfig
+from agents.tenant import Tenant, normalize_host
+from logging_setup import get_logger
+
+agent_log = get_logger("agent")
+error_log = get_logger("error")
+
+
+class AgentRegistry:
+    """Agents des sites clients servis par un même worker.
+
+    L'agent du site par défaut (WelcomeAgentConfig) est créé au démarrage
+    et porte les ressources coûteuses : client et pool de connexions Groq,
+    résilience et admission par modèle, sessions, cache, résumés. L'agent
+    d'un autre site est construit à sa première requête en réutilisant ces
+    ressources ; il n'ajoute que ce qui lui est propre (prompt, mots-clés,
+    base de connaissances), quelques dizaines de Ko.
+
+    Les fichiers de DIRECTORY sont relus quand ils changent (au plus toutes
+    les `reload_interval` secondes) : l'agent d'un site modifié est
+    reconstruit à la requête suivante. Les agents inactifs depuis `idle_ttl`
+    secondes sont libérés ; leurs conversations restent dans le store partagé.
+    """
+
+    def __init__(self, factory, directory=None, require_match=False, reload_interval=5,
+                 idle_ttl=1800, max_agents=200):
+        self.factory = factory
+        self.directory = directory
+        self.require_match = require_match
+        self.reload_interval = reload_interval
+        self.idle_ttl = idle_ttl
+        self.max_agents = max_agents
+        self.default = factory()
+        self._tenants = {}
+        self._files = {}
+        self._hosts = {}
+        self._keys = {}
+        self._agents = {}
+        self._lock = threading.Lock()
+        self._checked = 0.0
+        self.counters = {"built": 0, "evicted": 0, "reloaded": 0, "errors": 0, "unmatched": 0}
+        self.refresh(force=True)
+
+    # --- Configuration des sites ---
+
+    def _scan(self):
+        """Relire les fichiers ajoutés ou modifiés ; retourne True si un site a changé"""
+        paths = sorted(glob.glob(os.path.join(self.directory, "*.json"))) if self.directory else []
+        files = {}
+        for path in paths:
+            try:
+                files[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                continue
+
+        changed = False
+        for path in set(self._files) - set(files):
+            tenant_id = os.path.splitext(os.path.basename(path))[0]
+            self._tenants.pop(tenant_id, None)
+            self._agents.pop(tenant_id, None)
+            agent_log.info("tenant_removed", extra={"fields": {"tenant": tenant_id}})
+            changed = True
+        for path, mtime in files.items():
+            if self._files.get(path) == mtime:
+                continue
+            try:
+                tenant = Tenant.from_file(path)
+            except (OSError, ValueError, TypeError, KeyError) as e:
+                # Fichier invalide : garder la version précédente du site jusqu'à la prochaine modification
+                self.counters["errors"] += 1
+                error_log.error("tenant_config_invalid", extra={"fields": {"path": path, "error": str(e)}})
+                continue
+            if tenant.id in self._tenants:
+                self.counters["reloaded"] += 1
+            self._tenants[tenant.id] = tenant
+            self._agents.pop(tenant.id, None)
+            agent_log.info("tenant_loaded", extra={"fields": {"tenant": tenant.id, "hosts": tenant.hosts}})
+            changed = True
+        self._files = files
+        return changed
+
+    def refresh(self, force=False):
+        """Recharger les fichiers modifiés et libérer les agents inactifs (au plus toutes les reload_interval s)"""
+        now = time.monotonic()
+        if not force and now - self._checked < self.reload_interval:
+            return
+        with self._lock:
+            if not force and now - self._checked < self.reload_interval:
+                return
+            self._checked = now
+            if self._scan():
+                self._hosts = {host: tenant.id for tenant in self._tenants.values() for host in tenant.hosts}
+                self._keys = {key: tenant.id for tenant in self._tenants.values() for key in tenant.api_keys}
+            for tenant_id, (_, last_used) in list(self._agents.items()):
+                if now - last_used > self.idle_ttl:
+                    del self._agents[tenant_id]
+                    self.counters["evicted"] += 1
+
+    # --- Résolution ---
+
+    def resolve(self, api_key=None, origin=None, host=None):
+        """Agent du site d'une requête : clé d'API, sinon hôte de l'Origin, sinon en-tête Host.
+
+        Retourne l'agent par défaut si rien ne correspond, ou None avec require_match.
+        """
+        self.refresh()
+        tenant_id = self._keys.get(api_key) if api_key else None
+        if tenant_id is None:
+            tenant_id = self._hosts.get(normalize_host(origin)) or self._hosts.get(normalize_host(host))
+        if tenant_id is None:
+            if self.require_match and self._tenants:
+                self.counters["unmatched"] += 1
+                return None
+            return self.default
+        return self.get(tenant_id)
+
+    def allows_origin(self, origin):
+        """Vrai si l'hôte de l'Origin est déclaré par un site (appel CORS depuis son widget)"""
+        self.refresh()
+        host = normalize_host(origin)
+        return host is not None and host in self._hosts
+
+    def get(self, tenant_id):
+        """Agent d'un site, construit à la première utilisation (agent par défaut si inconnu)"""
+        entry = self._agents.get(tenant_id)
+        if entry is not None:
+            entry[1] = time.monotonic()
+            return entry[0]
+        with self._lock:
+            entry = self._agents.get(tenant_id)
+            if entry is None:
+                tenant = self._tenants.get(tenant_id)
+                if tenant is None:
+                    return self.default
+                if len(self._agents) >= self.max_agents:
+                    # Libérer l'agent utilisé le moins récemment
+                    oldest = min(self._agents, key=lambda key: self._agents[key][1])
+                    del self._agents[oldest]
+                    self.counters["evicted"] += 1
+                started = time.perf_counter()
+                entry = self._agents[tenant_id] = [self.factory(tenant=tenant, shared=self.default), time.monotonic()]
+                self.counters["built"] += 1
+                agent_log.info("tenant_agent_built", extra={"fields": {
+                    "tenant": tenant_id,
+                    "build_ms": round((time.perf_counter() - started) * 1000, 1)
+                }})
+            entry[1] = time.monotonic()
+            return entry[0]
+
+    def stats(self):
+        with self._lock:
+            now = time.monotonic()
+            return {
+                **self.counters,
+                "tenants": sorted(self._tenants),
+                "active": {tenant_id: round(now - last_used, 1) for tenant_id, (_, last_used) in self._agents.items()},
+                "hosts": len(self._hosts),
+            }
+
+
+def create_registry(factory):
+    """Registre configuré par TenantConfig (site par défaut seul si le multi-tenant est désactivé)"""
+    return AgentRegistry(
+        factory,
+        directory=TenantConfig.DIRECTORY if TenantConfig.ENABLED else None,
+        require_match=TenantConfig.REQUIRE_MATCH,
+        reload_interval=TenantConfig.RELOAD_INTERVAL,
+        idle_ttl=TenantConfig.IDLE_TTL,
+        max_agents=TenantConfig.MAX_AGENTS
+    )
@@ -0,0 +1,395 @@
+import asyncio
+import contextvars
+import inspect
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+
+class CircuitOpenError(Exception):
+    """Levée quand le disjoncteur est ouvert : l'appel n'est pas tenté"""
+
+
+def is_retryable(error):
+    """Erreurs transitoires : timeouts, connexion, 408/409/429 et 5xx"""
+    if isinstance(error, (TimeoutError, asyncio.TimeoutError, ConnectionError)):
+        return True
+    status = getattr(error, "status_code", None)
+    if status is None:
+        # Erreurs de connexion / timeout du client Groq (sans réponse HTTP)
+        return type(error).__name__ in ("APIConnectionError", "APITimeoutError")
+    return status in (408, 409, 429) or status >= 500
+
+
+def error_class(error):
+    """Classe d'erreur à faible cardinalité, pour les métriques"""
+    if isinstance(error, CircuitOpenError):
+        return "circuit_open"
+    if isinstance(error, (TimeoutError, asyncio.TimeoutError)) or type(error).__name__ == "APITimeoutError":
+        return "timeout"
+    if isinstance(error, ConnectionError) or type(error).__name__ == "APIConnectionError":
+        return "connection"
+    status = getattr(error, "status_code", None)
+    if status == 429:
+        return "rate_limited"
+    if status is not None:
+        return "server_error" if status >= 500 else "client_error"
+    return "other"
+
+
+def retry_after(error, default=1.0):
+    """Délai demandé par l'en-tête Retry-After d'une réponse d'erreur (secondes)"""
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return max(0.0, float(value)) if value is not None else default
+    except ValueError:
+        return default
+
+
+def discard_result(future):
+    """Fermer la réponse d'une requête perdante : un flux rend sa connexion au pool"""
+    if future.cancelled() or future.exception() is not None:
+        return
+    close = getattr(future.result(), "close", None)
+    if close is None:
+        return
+    result = close()
+    if inspect.isawaitable(result):
+        # Flux asynchrone : fermeture planifiée sur la boucle de la requête
+        asyncio.ensure_future(result)
+
+
+class DeadlineStream:
+    """Flux de réponse borné par le délai global de l'appel.
+
+    Le timeout du client HTTP ne s'applique qu'à chaque lecture : un flux
+    qui arrive goutte à goutte peut durer bien au-delà. Le délai est donc
+    vérifié entre deux fragments ; une fois dépassé, le flux est fermé.
+    """
+
+    def __init__(self, stream, deadline):
+        self._stream = stream
+        self.deadline = deadline
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+    def _check(self):
+        if time.monotonic() > self.deadline:
+            self.close()
+            raise TimeoutError("Délai global dépassé pendant la lecture du flux")
+
+    def __iter__(self):
+        for chunk in self._stream:
+            self._check()
+            yield chunk
+
+    def close(self):
+        close = getattr(self._stream, "close", None)
+        if close is not None:
+            close()
+
+
+class AsyncDeadlineStream(DeadlineStream):
+    """Variante de DeadlineStream pour les flux asynchrones"""
+
+    async def _acheck(self):
+        if time.monotonic() > self.deadline:
+            await self.close()
+            raise TimeoutError("Délai global dépassé pendant la lecture du flux")
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            await self._acheck()
+            yield chunk
+
+    async def close(self):
+        close = getattr(self._stream, "close", None)
+        if close is not None:
+            await close()
+
+
+class CircuitBreaker:
+    """Disjoncteur : après failure_threshold échecs consécutifs, les appels
+    échouent immédiatement pendant reset_timeout secondes, puis un appel
+    d'essai décide de la fermeture."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    return False
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            # Semi-ouvert : un seul appel d'essai à la fois
+            if self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.state = self.CLOSED
+            self._trial_in_flight = False
+
+    def release_trial(self):
+        """Rendre la place de l'appel d'essai sans issue observée (appel annulé ou interrompu)"""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.trips += 1
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class LatencyWindow:
+    """Fenêtre glissante des dernières latences observées"""
+
+    def __init__(self, size=200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q, min_samples=20):
+        with self._lock:
+            if len(self._samples) < min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class ResilientCaller:
+    """Couche de résilience autour d'un appel amont.
+
+    - délai maximal par tentative et délai global
+    - nouvelles tentatives avec backoff exponentiel et jitter (erreurs transitoires)
+    - disjoncteur qui échoue immédiatement tant que l'amont est en panne
+    - hedging optionnel : une seconde requête part si la première dépasse le
+      p95 observé, la première réponse reçue l'emporte
+
+    La requête est une fonction request(timeout) ; pour acall elle retourne
+    une coroutine. Avec stream=True, le flux retourné reste soumis au délai
+    global pendant sa lecture (DeadlineStream).
+    """
+
+    def __init__(self, timeout, max_retries, total_deadline, backoff_base, backoff_max,
+                 breaker, hedging=False, hedge_percentile=0.95, hedge_min_delay=0.5, hedge_workers=32):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.total_deadline = total_deadline
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker
+        self.hedging = hedging
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.latencies = LatencyWindow()
+        self._executor = ThreadPoolExecutor(max_workers=hedge_workers, thread_name_prefix="hedge") if hedging else None
+        self.counters = {"calls": 0, "retries": 0, "failures": 0, "short_circuited": 0, "hedges": 0, "hedge_wins": 0}
+
+    def _backoff(self, attempt):
+        """Backoff exponentiel avec jitter complet"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _hedge_delay(self):
+        if not self.hedging:
+            return None
+        p95 = self.latencies.percentile(self.hedge_percentile)
+        return None if p95 is None else max(self.hedge_min_delay, p95)
+
+    def _admit(self):
+        self.counters["calls"] += 1
+        if not self.breaker.allow():
+            self.counters["short_circuited"] += 1
+            raise CircuitOpenError("Service Groq momentanément indisponible (disjoncteur ouvert)")
+
+    def _on_error(self, error, attempt, deadline, max_retries):
+        """Enregistrer l'échec et retourner le délai avant la prochaine tentative (None = abandon)"""
+        if not is_retryable(error):
+            # L'amont a répondu : l'erreur vient de la requête, pas de sa santé
+            self.breaker.record_success()
+            return None
+        self.counters["failures"] += 1
+        self.breaker.record_failure()
+        if attempt >= max_retries:
+            return None
+        delay = self._backoff(attempt)
+        if time.monotonic() + delay >= deadline or not self.breaker.allow():
+            return None
+        self.counters["retries"] += 1
+        return delay
+
+    def _on_success(self, started):
+        self.latencies.record(time.monotonic() - started)
+        self.breaker.record_success()
+
+    def call(self, request, max_retries=None, stream=False):
+        """Exécuter la requête de façon synchrone"""
+        if max_retries is None:
+            max_retries = self.max_retries
+        deadline = time.monotonic() + self.total_deadline
+        self._admit()
+        try:
+            result = self._call(request, max_retries, deadline)
+            return DeadlineStream(result, deadline) if stream else result
+        except Exception:
+            raise
+        except BaseException:
+            # Interruption (greenlet tué, arrêt du worker) : aucune issue à enregistrer
+            self.breaker.release_trial()
+            raise
+
+    def _call(self, request, max_retries, deadline):
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            timeout = max(0.1, min(self.timeout, deadline - started))
+            try:
+                result = self._attempt(request, timeout)
+            except Exception as e:
+                delay = self._on_error(e, attempt, deadline, max_retries)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+            self._on_success(started)
+            return result
+
+    def _attempt(self, request, timeout):
+        delay = self._hedge_delay()
+        if delay is None or delay >= timeout:
+            return request(timeout)
+        end = time.monotonic() + timeout
+
+        # Contexte de la requête (span, champs de log) recopié dans chaque thread
+        primary = self._executor.submit(contextvars.copy_context().run, request, timeout)
+        done, _ = wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+
+        self.counters["hedges"] += 1
+        hedge = self._executor.submit(contextvars.copy_context().run, request, timeout - delay)
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            # Attente bornée par le délai de la tentative, comme asyncio.wait_for pour acall
+            done, pending = wait(pending, timeout=max(0, end - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                for future in pending:
+                    future.add_done_callback(discard_result)
+                raise TimeoutError("Délai dépassé pour la requête et sa requête de secours")
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        self.counters["hedge_wins"] += 1
+                    # La requête perdante se termine en arrière-plan, sa réponse est fermée
+                    for loser in {primary, hedge} - {future}:
+                        loser.add_done_callback(discard_result)
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    async def acall(self, request, max_retries=None, stream=False):
+        """Exécuter la requête (coroutine) de façon asynchrone"""
+        if max_retries is None:
+            max_retries = self.max_retries
+        deadline = time.monotonic() + self.total_deadline
+        self._admit()
+        try:
+            result = await self._acall(request, max_retries, deadline)
+            return AsyncDeadlineStream(result, deadline) if stream else result
+        except Exception:
+            raise
+        except BaseException:
+            # Annulation (client parti, appel spéculatif abandonné, vol unique sans
+            # attente) : l'amont n'a rien dit de sa santé, l'essai est rendu
+            self.breaker.release_trial()
+            raise
+
+    async def _acall(self, request, max_retries, deadline):
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            timeout = max(0.1, min(self.timeout, deadline - started))
+            try:
+                result = await self._aattempt(request, timeout)
+            except Exception as e:
+                delay = self._on_error(e, attempt, deadline, max_retries)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            self._on_success(started)
+            return result
+
+    async def _aattempt(self, request, timeout):
+        delay = self._hedge_delay()
+        if delay is None or delay >= timeout:
+            return await asyncio.wait_for(request(timeout), timeout)
+
+        primary = asyncio.ensure_future(asyncio.wait_for(request(timeout), timeout))
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+
+        self.counters["hedges"] += 1
+        hedge = asyncio.ensure_future(asyncio.wait_for(request(timeout - delay), timeout - delay))
+        pending = {primary, hedge}
+        winner = None
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.counters["hedge_wins"] += 1
+                        winner = task
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # Annuler la requête perdante ; si elle a abouti entre-temps, fermer sa réponse
+            for task in {primary, hedge} - {winner}:
+                task.cancel()
+                task.add_done_callback(discard_result)
+
+    def stats(self):
+        stats = dict(self.counters)
+        stats["circuit"] = self.breaker.state
+        stats["circuit_trips"] = self.breaker.trips
+        p95 = self.latencies.percentile(0.95)
+        stats["p95_seconds"] = round(p95, 3) if p95 is not None else None
+        return stats
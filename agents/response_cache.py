@@ -0,0 +1,87 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from agents.text import normalize_text
+
+
+def prompt_fingerprint(system_prompt):
+    """Empreinte courte du prompt système"""
+    return hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()[:16]
+
+
+def build_cache_key(model, system_hash, params, history):
+    """Construire la clé de cache d'une complétion.
+
+    La clé combine le modèle, l'empreinte du prompt système, les paramètres
+    de génération et l'historique récent normalisé.
+    """
+    payload = json.dumps(
+        [
+            model,
+            system_hash,
+            sorted(params.items()),
+            [(turn["role"], normalize_text(turn["content"])) for turn in history],
+        ],
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Cache LRU avec expiration (TTL) des réponses de l'agent"""
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Retourner la réponse en cache ou None"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or now - entry[1] > self.ttl:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def contains(self, key):
+        """Réponse présente et valide, sans compter de hit ni la marquer comme utilisée"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and time.monotonic() - entry[1] <= self.ttl
+
+    def set(self, key, response):
+        """Mettre une réponse en cache en évinçant les entrées les moins récentes"""
+        with self._lock:
+            self._entries[key] = (response, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
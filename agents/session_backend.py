@@ -0,0 +1,202 @@
+import atexit
+import queue
+import sqlite3
+import threading
+import time
+
+
+class StoredSession:
+    """Session relue depuis le disque : fenêtre de messages, résumé et révision"""
+
+    __slots__ = ("turns", "summary", "revision")
+
+    def __init__(self, turns, summary, revision):
+        self.turns = turns
+        self.summary = summary
+        self.revision = revision
+
+
+class SQLiteSessionBackend:
+    """Persistance des conversations dans SQLite (mode WAL).
+
+    Une ligne par message, indexée par session. Les écritures passent par
+    une file traitée par un thread dédié (write-behind) : le thread de la
+    requête ne fait qu'empiler. Les lectures se font à la demande, quand
+    une session n'est pas en mémoire ou qu'un autre worker l'a modifiée.
+
+    La révision d'une session compte les messages ajoutés (et les
+    réinitialisations) : un worker dont la copie en mémoire a une révision
+    plus petite que celle du disque recharge la session.
+    """
+
+    # Nettoyage des sessions expirées tous les N lots écrits
+    SWEEP_EVERY = 500
+
+    def __init__(self, path, ttl, queue_size=100000, batch_size=256):
+        self.path = path
+        self.ttl = ttl
+        self.batch_size = batch_size
+        self._local = threading.local()
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._batches = 0
+        # Compteurs modifiés par les threads des requêtes et par le thread d'écriture
+        self._lock = threading.Lock()
+        self.counters = {"written": 0, "dropped": 0, "loads": 0, "errors": 0}
+
+        conn = self._connection()
+        conn.executescript(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, summary TEXT NOT NULL DEFAULT '', "
+            "revision INTEGER NOT NULL DEFAULT 0, updated REAL NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS turns ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL, "
+            "role TEXT NOT NULL, content TEXT NOT NULL, created REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS turns_session ON turns(session_id, id);"
+            "CREATE INDEX IF NOT EXISTS sessions_updated ON sessions(updated);"
+        )
+
+        self._writer = threading.Thread(target=self._write_loop, name="session-writer", daemon=True)
+        self._writer.start()
+        # Vider la file avant l'arrêt du processus
+        atexit.register(self.flush, 5)
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    # --- Lectures (à la demande) ---
+
+    def revision(self, session_id):
+        """Révision de la session sur disque (None si inconnue ou expirée)"""
+        row = self._connection().execute(
+            "SELECT revision FROM sessions WHERE session_id = ? AND updated >= ?",
+            (session_id, time.time() - self.ttl)
+        ).fetchone()
+        return row[0] if row else None
+
+    def load(self, session_id, limit):
+        """Relire le résumé et les `limit` derniers messages de la session"""
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT summary, revision FROM sessions WHERE session_id = ? AND updated >= ?",
+            (session_id, time.time() - self.ttl)
+        ).fetchone()
+        if row is None:
+            return None
+        rows = conn.execute(
+            "SELECT role, content FROM turns WHERE session_id = ? ORDER BY id DESC LIMIT ?",
+            (session_id, limit)
+        ).fetchall()
+        self._count("loads")
+        turns = [{"role": role, "content": content} for role, content in reversed(rows)]
+        return StoredSession(turns, row[0], row[1])
+
+    # --- Écritures (différées) ---
+
+    def _enqueue(self, operation):
+        try:
+            self._queue.put_nowait(operation)
+        except queue.Full:
+            self._count("dropped")
+
+    def append(self, session_id, turns):
+        self._enqueue(("append", session_id, [(turn["role"], turn["content"]) for turn in turns], time.time()))
+
+    def set_summary(self, session_id, summary):
+        self._enqueue(("summary", session_id, summary, time.time()))
+
+    def reset(self, session_id):
+        self._enqueue(("reset", session_id, None, time.time()))
+
+    def _write_loop(self):
+        while True:
+            operations = [self._queue.get()]
+            while len(operations) < self.batch_size:
+                try:
+                    operations.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(operations)
+            except sqlite3.Error:
+                self._count("errors")
+            finally:
+                for _ in operations:
+                    self._queue.task_done()
+
+    def _write(self, operations):
+        """Appliquer un lot d'opérations dans une seule transaction"""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for kind, session_id, payload, now in operations:
+                if kind == "append":
+                    conn.execute(
+                        "INSERT INTO sessions (session_id, revision, updated) VALUES (?, ?, ?) "
+                        "ON CONFLICT(session_id) DO UPDATE SET "
+                        "revision = revision + excluded.revision, updated = excluded.updated",
+                        (session_id, len(payload), now)
+                    )
+                    conn.executemany(
+                        "INSERT INTO turns (session_id, role, content, created) VALUES (?, ?, ?, ?)",
+                        [(session_id, role, content, now) for role, content in payload]
+                    )
+                    self._count("written", len(payload))
+                elif kind == "summary":
+                    conn.execute(
+                        "UPDATE sessions SET summary = ?, updated = ? WHERE session_id = ?",
+                        (payload, now, session_id)
+                    )
+                elif kind == "reset":
+                    conn.execute("DELETE FROM turns WHERE session_id = ?", (session_id,))
+                    conn.execute(
+                        "UPDATE sessions SET summary = '', revision = revision + 1, updated = ? "
+                        "WHERE session_id = ?",
+                        (now, session_id)
+                    )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        self._batches += 1
+        if self._batches % self.SWEEP_EVERY == 0:
+            self._sweep()
+
+    def _sweep(self):
+        """Supprimer les sessions expirées et leurs messages"""
+        conn = self._connection()
+        cutoff = time.time() - self.ttl
+        conn.execute(
+            "DELETE FROM turns WHERE session_id IN (SELECT session_id FROM sessions WHERE updated < ?)",
+            (cutoff,)
+        )
+        conn.execute("DELETE FROM sessions WHERE updated < ?", (cutoff,))
+
+    def flush(self, timeout=None):
+        """Attendre que les écritures en file soient sur disque (False si le délai expire)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+        stats["backend"] = "sqlite"
+        stats["path"] = self.path
+        stats["queued"] = self._queue.qsize()
+        return stats
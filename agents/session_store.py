@@ -0,0 +1,411 @@
+import asyncio
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from agents.tokens import estimate_message_tokens, estimate_tokens
+
+
+class _Session:
+    """Historique d'une session et métadonnées de comptabilité"""
+
+    __slots__ = ("turns", "sizes", "tokens", "size", "token_count",
+                 "summary", "pending", "summarizing", "last_access", "revision", "checked", "model",
+                 "temperature")
+
+    def __init__(self, now, revision=0):
+        self.revision = revision
+        # Dernière comparaison avec la révision du backend
+        self.checked = now
+        self.turns = []
+        self.sizes = []
+        self.tokens = []
+        self.size = 0
+        self.token_count = 0
+        self.summary = ""
+        self.pending = []
+        self.summarizing = False
+        self.last_access = now
+        # Modèle et température choisis pour la session (propres au worker, non persistés)
+        self.model = None
+        self.temperature = None
+
+
+class _Stripe:
+    """Segment du store : un verrou, une LRU et son propre budget"""
+
+    __slots__ = ("lock", "sessions", "turns", "size", "evictions", "expirations")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sessions = OrderedDict()
+        self.turns = 0
+        self.size = 0
+        self.evictions = 0
+        self.expirations = 0
+
+
+def _turn_size(turn):
+    """Estimer l'empreinte mémoire d'un message (octets UTF-8 du contenu)"""
+    return len(turn["content"].encode("utf-8")) + len(turn["role"])
+
+
+class SessionStore:
+    """Store de conversations indexé par session.
+
+    Chaque session est une LRU avec expiration (TTL). Les sessions sont
+    réparties sur plusieurs segments (lock striping) : deux requêtes de
+    sessions différentes ne se bloquent que si elles tombent sur le même
+    segment. Le budget global (sessions, messages, octets) est divisé
+    entre les segments, chacun évinçant ses sessions les moins récentes.
+
+    La fenêtre d'historique d'une session est bornée par un budget de
+    tokens (estimé une seule fois, à l'ajout de chaque message) et par
+    max_history. Les messages qui sortent de la fenêtre sont mis de côté
+    pour être résumés (voir take_pending / set_summary).
+
+    Avec un backend persistant, chaque modification lui est transmise
+    (écriture différée) et une session absente de la mémoire (jamais vue ou
+    évincée) est chargée à sa première utilisation. Une session présente
+    n'est comparée au backend (modification par un autre worker) qu'au plus
+    toutes les `revalidate_interval` secondes : les accès d'un même tour ne
+    lisent pas le disque.
+    """
+
+    # Nombre maximal de messages en attente de résumé par session
+    MAX_PENDING = 50
+
+    def __init__(self, max_history, ttl, max_sessions, max_turns, max_bytes, stripes=16,
+                 max_tokens=None, keep_pending=False, backend=None, revalidate_interval=5.0):
+        self.max_history = max_history
+        self.backend = backend
+        self.revalidate_interval = revalidate_interval
+        self.max_tokens = max_tokens
+        self.keep_pending = keep_pending
+        self.ttl = ttl
+        self._stripes = [_Stripe() for _ in range(max(1, stripes))]
+        count = len(self._stripes)
+        self._max_sessions = max(1, max_sessions // count)
+        self._max_turns = max(max_history, max_turns // count)
+        self._max_bytes = max(1, max_bytes // count)
+
+    def _stripe(self, session_id):
+        return self._stripes[zlib.crc32(session_id.encode("utf-8")) % len(self._stripes)]
+
+    def _drop(self, stripe, session_id):
+        session = stripe.sessions.pop(session_id)
+        stripe.turns -= len(session.turns)
+        stripe.size -= session.size
+
+    def _expire(self, stripe, now):
+        """Retirer les sessions expirées (en tête de LRU, donc les plus anciennes)"""
+        while stripe.sessions:
+            session_id, session = next(iter(stripe.sessions.items()))
+            if now - session.last_access <= self.ttl:
+                break
+            self._drop(stripe, session_id)
+            stripe.expirations += 1
+
+    def _enforce_budget(self, stripe, keep):
+        """Évincer les sessions les moins récentes tant que le segment dépasse son budget"""
+        while stripe.sessions and (
+            len(stripe.sessions) > self._max_sessions
+            or stripe.turns > self._max_turns
+            or stripe.size > self._max_bytes
+        ):
+            session_id = next(iter(stripe.sessions))
+            if session_id == keep:
+                if len(stripe.sessions) == 1:
+                    break
+                stripe.sessions.move_to_end(keep)
+                continue
+            self._drop(stripe, session_id)
+            stripe.evictions += 1
+
+    def _lookup(self, stripe, session_id, now):
+        session = stripe.sessions.get(session_id)
+        if session is None:
+            return None
+        if now - session.last_access > self.ttl:
+            self._drop(stripe, session_id)
+            stripe.expirations += 1
+            return None
+        session.last_access = now
+        stripe.sessions.move_to_end(session_id)
+        return session
+
+    def _overflow(self, session):
+        """Nombre de messages à retirer en tête pour respecter la fenêtre"""
+        overflow = max(0, len(session.turns) - self.max_history)
+        if self.max_tokens is not None:
+            remaining = session.token_count - sum(session.tokens[:overflow])
+            # Toujours conserver au moins le dernier message
+            while overflow < len(session.turns) - 1 and remaining > self.max_tokens:
+                remaining -= session.tokens[overflow]
+                overflow += 1
+        return overflow
+
+    def _trim(self, stripe, session, keep_pending=True):
+        overflow = self._overflow(session)
+        if not overflow:
+            return
+
+        removed_size = sum(session.sizes[:overflow])
+        if self.keep_pending and keep_pending:
+            session.pending.extend(session.turns[:overflow])
+            del session.pending[:-self.MAX_PENDING]
+        session.token_count -= sum(session.tokens[:overflow])
+        del session.turns[:overflow]
+        del session.sizes[:overflow]
+        del session.tokens[:overflow]
+        session.size -= removed_size
+        stripe.turns -= overflow
+        stripe.size -= removed_size
+
+    @staticmethod
+    def _add_turns(stripe, session, turns):
+        for turn in turns:
+            size = _turn_size(turn)
+            tokens = estimate_message_tokens(turn)
+            session.turns.append(turn)
+            session.sizes.append(size)
+            session.tokens.append(tokens)
+            session.size += size
+            session.token_count += tokens
+            stripe.turns += 1
+            stripe.size += size
+
+    def _refresh(self, session_id):
+        """Charger la session depuis le backend si elle manque en mémoire, ou si la copie
+        en mémoire n'a pas été comparée au backend depuis revalidate_interval secondes"""
+        if self.backend is None:
+            return
+        stripe = self._stripe(session_id)
+        now = time.monotonic()
+        with stripe.lock:
+            session = self._lookup(stripe, session_id, now)
+            if session is not None:
+                if now - session.checked < self.revalidate_interval:
+                    return
+                # Marquée avant la lecture : les requêtes concurrentes ne relisent pas
+                session.checked = now
+            known = session.revision if session else None
+
+        # Lectures disque hors verrou : les autres sessions du segment ne sont pas bloquées
+        revision = self.backend.revision(session_id)
+        if revision is None and known is None:
+            # Session inconnue du disque : copie vide en mémoire, les accès suivants ne relisent pas
+            with stripe.lock:
+                if session_id not in stripe.sessions:
+                    stripe.sessions[session_id] = _Session(time.monotonic())
+                    self._enforce_budget(stripe, session_id)
+            return
+        if revision is None or (known is not None and revision <= known):
+            return
+        stored = self.backend.load(session_id, self.max_history)
+        if stored is None:
+            return
+
+        now = time.monotonic()
+        with stripe.lock:
+            session = stripe.sessions.get(session_id)
+            previous = session
+            if session is not None:
+                if session.revision >= stored.revision:
+                    return
+                self._drop(stripe, session_id)
+            session = _Session(now, stored.revision)
+            if previous is not None:
+                session.model = previous.model
+                session.temperature = previous.temperature
+            session.summary = stored.summary
+            session.size = len(stored.summary.encode("utf-8"))
+            stripe.size += session.size
+            stripe.sessions[session_id] = session
+            self._add_turns(stripe, session, stored.turns)
+            # Les messages hors fenêtre sont déjà couverts par le résumé enregistré
+            self._trim(stripe, session, keep_pending=False)
+            self._enforce_budget(stripe, session_id)
+
+    def needs_refresh(self, session_id):
+        """Vrai si le prochain accès à la session lirait le backend"""
+        if self.backend is None:
+            return False
+        stripe = self._stripe(session_id)
+        now = time.monotonic()
+        with stripe.lock:
+            session = stripe.sessions.get(session_id)
+            return (
+                session is None
+                or now - session.last_access > self.ttl
+                or now - session.checked >= self.revalidate_interval
+            )
+
+    async def arefresh(self, session_id):
+        """Variante de _refresh pour la boucle d'événements : la lecture du backend se fait dans un thread.
+
+        À appeler avant les accès synchrones d'un tour (get_history, append, length...),
+        qui trouvent alors la session en mémoire.
+        """
+        if self.needs_refresh(session_id):
+            await asyncio.to_thread(self._refresh, session_id)
+
+    def get_history(self, session_id):
+        """Retourner une copie de l'historique de la session (vide si inconnue ou expirée)"""
+        self._refresh(session_id)
+        stripe = self._stripe(session_id)
+        with stripe.lock:
+            session = self._lookup(stripe, session_id, time.monotonic())
+            return list(session.turns) if session else []
+
+    def get_summary(self, session_id):
+        """Retourner le résumé des messages sortis de la fenêtre ("" si aucun)"""
+        stripe = self._stripe(session_id)
+        with stripe.lock:
+            session = stripe.sessions.get(session_id)
+            return session.summary if session else ""
+
+    def append(self, session_id, *turns):
+        """Ajouter des messages à la session et retourner l'historique fenêtré"""
+        self._refresh(session_id)
+        stripe = self._stripe(session_id)
+        now = time.monotonic()
+        with stripe.lock:
+            self._expire(stripe, now)
+            session = self._lookup(stripe, session_id, now)
+            if session is None:
+                session = _Session(now)
+                stripe.sessions[session_id] = session
+
+            self._add_turns(stripe, session, turns)
+            session.revision += len(turns)
+            if self.backend is not None:
+                self.backend.append(session_id, turns)
+
+            self._trim(stripe, session)
+            self._enforce_budget(stripe, session_id)
+            return list(session.turns)
+
+    def get_model(self, session_id):
+        """Modèle choisi pour la session (None : choix du routeur)"""
+        stripe = self._stripe(session_id)
+        with stripe.lock:
+            session = stripe.sessions.get(session_id)
+            return session.model if session else None
+
+    def set_model(self, session_id, model):
+        """Imposer un modèle aux prochains tours de la session (None pour revenir au routage)"""
+        self._session_for_update(session_id).model = model
+
+    def get_temperature(self, session_id):
+        """Température choisie pour la session (None : celle de l'agent)"""
+        stripe = self._stripe(session_id)
+        with stripe.lock:
+            session = stripe.sessions.get(session_id)
+            return session.temperature if session else None
+
+    def set_temperature(self, session_id, temperature):
+        """Imposer une température aux prochains tours de la session (None pour revenir à celle de l'agent)"""
+        self._session_for_update(session_id).temperature = temperature
+
+    def _session_for_update(self, session_id):
+        """Session à modifier (chargée ou créée si besoin)"""
+        self._refresh(session_id)
+        stripe = self._stripe(session_id)
+        now = time.monotonic()
+        with stripe.lock:
+            session = self._lookup(stripe, session_id, now)
+            if session is None:
+                session = _Session(now)
+                stripe.sessions[session_id] = session
+                self._enforce_budget(stripe, session_id)
+            return session
+
+    def take_pending(self, session_id):
+        """Réserver les messages en attente de résumé.
+
+        Retourne (résumé actuel, messages) et marque la session comme en cours
+        de résumé, ou None s'il n'y a rien à faire ou qu'un résumé est déjà en cours.
+        """
+        stripe = self._stripe(session_id)
+        with stripe.lock:
+            session = stripe.sessions.get(session_id)
+            if session is None or session.summarizing or not session.pending:
+                return None
+            pending = session.pending
+            session.pending = []
+            session.summarizing = True
+            return session.summary, pending
+
+    def restore_pending(self, session_id, turns):
+        """Rendre à la session des messages réservés mais non résumés (résumé reporté)"""
+        stripe = self._stripe(session_id)
+        with stripe.lock:
+            session = stripe.sessions.get(session_id)
+            if session is None:
+                return
+            session.pending[:0] = turns
+            del session.pending[:-self.MAX_PENDING]
+            session.summarizing = False
+
+    def set_summary(self, session_id, summary):
+        """Enregistrer le nouveau résumé et libérer la session pour le prochain résumé"""
+        stripe = self._stripe(session_id)
+        with stripe.lock:
+            session = stripe.sessions.get(session_id)
+            if session is None:
+                return False
+            if summary is not None:
+                size = len(summary.encode("utf-8"))
+                delta = size - len(session.summary.encode("utf-8"))
+                session.summary = summary
+                session.size += delta
+                stripe.size += delta
+                if self.backend is not None:
+                    self.backend.set_summary(session_id, summary)
+            session.summarizing = False
+            return bool(session.pending)
+
+    def reset(self, session_id):
+        """Supprimer l'historique d'une session"""
+        stripe = self._stripe(session_id)
+        with stripe.lock:
+            session = stripe.sessions.get(session_id)
+            if session is not None:
+                self._drop(stripe, session_id)
+            if self.backend is not None:
+                # Garder une session vide : la copie disque n'est peut-être pas encore effacée
+                revision = session.revision if session else (self.backend.revision(session_id) or 0)
+                stripe.sessions[session_id] = _Session(time.monotonic(), revision + 1)
+                self.backend.reset(session_id)
+
+    def length(self, session_id):
+        """Nombre de messages conservés pour la session"""
+        self._refresh(session_id)
+        stripe = self._stripe(session_id)
+        with stripe.lock:
+            session = self._lookup(stripe, session_id, time.monotonic())
+            return len(session.turns) if session else 0
+
+    def window_tokens(self, session_id):
+        """Tokens estimés de la fenêtre courante (résumé compris)"""
+        stripe = self._stripe(session_id)
+        with stripe.lock:
+            session = stripe.sessions.get(session_id)
+            if session is None:
+                return 0
+            return session.token_count + estimate_tokens(session.summary)
+
+    def stats(self):
+        """Statistiques agrégées sur tous les segments"""
+        totals = {"sessions": 0, "turns": 0, "bytes": 0, "evictions": 0, "expirations": 0}
+        for stripe in self._stripes:
+            with stripe.lock:
+                totals["sessions"] += len(stripe.sessions)
+                totals["turns"] += stripe.turns
+                totals["bytes"] += stripe.size
+                totals["evictions"] += stripe.evictions
+                totals["expirations"] += stripe.expirations
+        if self.backend is not None:
+            totals["persistence"] = self.backend.stats()
+        return totals
@@ -0,0 +1,117 @@
+import asyncio
+import threading
+
+
+class _Flight:
+    """Appel en cours partagé par les requêtes identiques"""
+
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _AsyncFlight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Regroupement des appels identiques simultanés (single-flight).
+
+    Le premier appel pour une clé l'exécute ; les appels identiques qui
+    arrivent pendant ce temps attendent son résultat (ou son erreur) au lieu
+    de refaire la requête. Un appelant qui a attendu `timeout` secondes sans
+    résultat fait son propre appel plutôt que d'échouer.
+
+    do et ado retournent (résultat, partagé) ; partagé vaut True pour les
+    appelants qui ont reçu le résultat d'un autre.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._async_flights = {}
+        self._lock = threading.Lock()
+        self.counters = {"leaders": 0, "coalesced": 0, "timeouts": 0, "cancelled": 0}
+
+    def do(self, key, fn, timeout=None):
+        """Exécuter fn() une seule fois pour tous les appelants simultanés de la clé"""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.counters["leaders"] += 1
+            else:
+                self.counters["coalesced"] += 1
+
+        if leader:
+            try:
+                flight.result = fn()
+            except BaseException as e:
+                flight.error = e
+                raise
+            finally:
+                with self._lock:
+                    del self._flights[key]
+                flight.done.set()
+            return flight.result, False
+
+        if not flight.done.wait(timeout):
+            # Appel partagé trop long (suites de réponse, replis) : ne pas l'attendre davantage
+            self.counters["timeouts"] += 1
+            return fn(), False
+        if flight.error is not None:
+            raise flight.error
+        return flight.result, True
+
+    async def ado(self, key, coro_fn, timeout=None):
+        """Variante asynchrone : coro_fn() est exécutée dans une tâche partagée.
+
+        La tâche n'est annulée que lorsque tous ses appelants ont abandonné
+        (délai dépassé ou requête annulée). Un appelant qui n'a pas lancé la
+        tâche fait son propre appel quand le délai est dépassé.
+        """
+        flight = self._async_flights.get(key)
+        shared = flight is not None
+        if shared:
+            self.counters["coalesced"] += 1
+        else:
+            flight = self._async_flights[key] = _AsyncFlight(asyncio.ensure_future(coro_fn()))
+            flight.task.add_done_callback(lambda task: self._forget(key, flight))
+            self.counters["leaders"] += 1
+
+        flight.waiters += 1
+        timed_out = False
+        try:
+            result = await asyncio.wait_for(asyncio.shield(flight.task), timeout)
+        except asyncio.TimeoutError:
+            self.counters["timeouts"] += 1
+            if not shared:
+                raise
+            timed_out = True
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                self.counters["cancelled"] += 1
+                flight.task.cancel()
+        if timed_out:
+            return await coro_fn(), False
+        return result, shared
+
+    def _forget(self, key, flight):
+        if self._async_flights.get(key) is flight:
+            del self._async_flights[key]
+        if not flight.task.cancelled():
+            # Marquer l'exception comme récupérée même si plus personne n'attend
+            flight.task.exception()
+
+    def stats(self):
+        stats = dict(self.counters)
+        stats["in_flight"] = len(self._flights) + len(self._async_flights)
+        return stats
@@ -0,0 +1,86 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import metrics
+
+
+class Speculation:
+    """Appel Groq d'un message lancé avant la fin de ses vérifications.
+
+    turn est un brouillon du tour, construit sur l'historique tel qu'il
+    sera une fois le message ajouté. L'appel n'est utilisé que si
+    l'historique réel et le résumé sont identiques : mêmes messages,
+    même modèle, même clé de cache.
+    """
+
+    __slots__ = ("turn", "model", "history", "summary", "task", "started", "adopted")
+
+    def __init__(self, turn, history, summary):
+        self.turn = turn
+        # Modèle routé (turn.model devient celui du repli si l'appel bascule)
+        self.model = turn.model
+        self.history = history
+        self.summary = summary
+        self.task = None
+        self.started = time.monotonic()
+        # Instant où le tour a retenu l'appel
+        self.adopted = None
+
+    def matches(self, history, summary):
+        return history == self.history and summary == self.summary
+
+
+class Speculator:
+    """Appels spéculatifs du worker : nombre en vol borné, issues comptées.
+
+    Issues : used (réponse utilisée), cancelled (annulé avant ou pendant
+    l'appel Groq, ou en échec : aucune réponse facturée), discarded
+    (réponse reçue puis ignorée, tokens perdus). Le motif d'un abandon est l'étape qui l'a
+    causé : fast_path, redirected, cached, mismatch (historique modifié
+    entre-temps) ou error. head_start cumule l'avance prise par les appels
+    utilisés, c'est-à-dire le temps des vérifications retiré du chemin critique.
+
+    Une place n'est rendue qu'à la fin de l'appel Groq, même retenu :
+    max_in_flight borne les appels spéculatifs réellement en cours.
+    """
+
+    def __init__(self, max_in_flight, workers=0):
+        self.max_in_flight = max_in_flight
+        # Appels synchrones : threads dédiés (le thread de la requête fait les vérifications)
+        self.pool = ThreadPoolExecutor(workers, thread_name_prefix="speculation") if workers else None
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.counters = {"started": 0, "skipped": 0, "used": 0, "cancelled": 0, "discarded": 0}
+        self.reasons = {}
+        self.head_start = 0.0
+
+    def try_start(self):
+        """Réserver une place pour un appel spéculatif (False si toutes sont prises)"""
+        with self._lock:
+            if self.in_flight >= self.max_in_flight:
+                self.counters["skipped"] += 1
+                return False
+            self.in_flight += 1
+            self.counters["started"] += 1
+            return True
+
+    def finish(self, speculation, outcome, reason=None):
+        """Rendre la place d'un appel spéculatif terminé et compter son issue"""
+        with self._lock:
+            self.in_flight -= 1
+            self.counters[outcome] += 1
+            if reason:
+                self.reasons[reason] = self.reasons.get(reason, 0) + 1
+            if outcome == "used":
+                self.head_start += (speculation.adopted or time.monotonic()) - speculation.started
+        metrics.speculative_calls.inc(outcome, reason or "none")
+
+    def stats(self):
+        with self._lock:
+            used = self.counters["used"]
+            return {
+                **self.counters,
+                "in_flight": self.in_flight,
+                "reasons": dict(self.reasons),
+                "avg_head_start_ms": round(self.head_start / used * 1000, 3) if used else None,
+            }
@@ -0,0 +1,78 @@
+from concurrent.futures import ThreadPoolExecutor
+from logging_setup import get_logger
+
+error_log = get_logger("error")
+
+
+class SummaryDeferred(Exception):
+    """Budget Groq réservé aux visiteurs : le résumé est reporté au prochain tour de la session"""
+
+
+SUMMARY_INSTRUCTIONS = (
+    "Tu résumes une conversation entre un visiteur et l'assistant d'une entreprise du BTP. "
+    "Conserve uniquement les informations utiles pour la suite : type de visiteur, projet, "
+    "besoins exprimés, localisation, coordonnées et engagements pris. "
+    "Réponds par un résumé factuel en français, sans introduction."
+)
+
+
+class HistorySummarizer:
+    """Résumé glissant des messages sortis de la fenêtre d'historique.
+
+    Les résumés sont produits dans un pool de threads, hors du chemin de
+    la requête : la requête suivante de la session profite du résumé dès
+    qu'il est disponible. complete(messages, model, max_tokens) fait l'appel
+    Groq (admission, résilience, métriques) ; s'il lève SummaryDeferred, les
+    messages sont rendus à la session et résumés à un prochain tour.
+    """
+
+    def __init__(self, store, complete, model, max_tokens, workers=2):
+        self.store = store
+        self.complete = complete
+        self.model = model
+        self.max_tokens = max_tokens
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="summarizer")
+
+    def schedule(self, session_id):
+        """Planifier le résumé des messages en attente de la session"""
+        job = self.store.take_pending(session_id)
+        if job is not None:
+            self._executor.submit(self._run, session_id, *job)
+
+    def _run(self, session_id, summary, pending):
+        while True:
+            new_summary = None
+            try:
+                new_summary = self.summarize(summary, pending)
+            except SummaryDeferred:
+                self.store.restore_pending(session_id, pending)
+                return
+            except Exception as e:
+                error_log.warning("summary_failed", extra={"fields": {"error_type": type(e).__name__}})
+
+            # D'autres messages ont pu sortir de la fenêtre pendant l'appel
+            if not self.store.set_summary(session_id, new_summary):
+                return
+            job = self.store.take_pending(session_id)
+            if job is None:
+                return
+            summary, pending = job
+
+    def summarize(self, summary, turns):
+        """Intégrer les messages au résumé existant"""
+        transcript = "\n".join(f"{turn['role']}: {turn['content']}" for turn in turns)
+        if summary:
+            transcript = f"Résumé précédent :\n{summary}\n\nNouveaux échanges :\n{transcript}"
+
+        completion = self.complete(
+            [
+                {"role": "system", "content": SUMMARY_INSTRUCTIONS},
+                {"role": "user", "content": transcript}
+            ],
+            self.model,
+            self.max_tokens
+        )
+        return completion.choices[0].message.content.strip()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,117 @@
+import json
+import os
+from config import GroqConfig, KnowledgeConfig, WelcomeAgentConfig
+
+
+def normalize_host(value):
+    """Hôte d'une URL ou d'un en-tête Host, sans schéma, port ni majuscules"""
+    if not value:
+        return None
+    host = value.split("://", 1)[-1].split("/", 1)[0].rsplit("@", 1)[-1]
+    if host.startswith("["):
+        host = host.split("]", 1)[0] + "]"
+    else:
+        host = host.split(":", 1)[0]
+    return host.lower() or None
+
+
+class Tenant:
+    """Site client servi par l'API : entreprise, messages, mots-clés, prompt et modèles.
+
+    Les champs facultatifs absents reprennent les valeurs de
+    WelcomeAgentConfig ; l'entreprise et les coordonnées sont propres à
+    chaque site.
+    """
+
+    DEFAULT_ID = "default"
+
+    FIELDS = (
+        "company_info", "contact", "contact_message", "welcome_messages", "redirect_responses",
+        "forbidden_topics", "btp_keywords", "prompt", "knowledge_dir", "models", "hosts", "api_keys",
+    )
+
+    def __init__(self, tenant_id, company_info, contact, contact_message=None, welcome_messages=None,
+                 redirect_responses=None, forbidden_topics=None, btp_keywords=None, prompt=None,
+                 knowledge_dir=None, models=None, hosts=(), api_keys=(), source=None):
+        self.id = tenant_id
+        self.company_info = {
+            "abbreviation": company_info["name"],
+            "domain": WelcomeAgentConfig.COMPANY_INFO["domain"],
+            "specialties": [],
+            "zones": [],
+            "experience": "",
+            "certifications": [],
+            **company_info
+        }
+        self.contact = dict(contact)
+        self.contact_message = contact_message or WelcomeAgentConfig.CONTACT_MESSAGE
+        self.welcome_messages = {**WelcomeAgentConfig.WELCOME_MESSAGES, **(welcome_messages or {})}
+        self.redirect_responses = list(redirect_responses or WelcomeAgentConfig.REDIRECT_RESPONSES)
+        self.forbidden_topics = forbidden_topics
+        self.btp_keywords = btp_keywords
+        self.prompt = prompt
+        self.knowledge_dir = knowledge_dir
+        self.models = {**GroqConfig.MODELS, **(models or {})}
+        self.hosts = [host for host in map(normalize_host, hosts) if host]
+        self.api_keys = list(api_keys)
+        self.source = source
+
+    @property
+    def builtin(self):
+        """Site par défaut, décrit par WelcomeAgentConfig"""
+        return self.source is None
+
+    @property
+    def custom_keywords(self):
+        return self.forbidden_topics is not None or self.btp_keywords is not None
+
+    @classmethod
+    def default(cls):
+        return cls(
+            cls.DEFAULT_ID,
+            WelcomeAgentConfig.COMPANY_INFO,
+            WelcomeAgentConfig.CONTACT,
+            knowledge_dir=KnowledgeConfig.DIRECTORY
+        )
+
+    @classmethod
+    def from_file(cls, path):
+        """Lire la configuration d'un site (ValueError si le fichier est invalide)"""
+        tenant_id = os.path.splitext(os.path.basename(path))[0]
+        if tenant_id == cls.DEFAULT_ID:
+            raise ValueError(f"{path} : identifiant réservé au site par défaut")
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if not isinstance(data, dict):
+            raise ValueError(f"{path} : objet JSON attendu")
+
+        unknown = set(data) - set(cls.FIELDS)
+        if unknown:
+            raise ValueError(f"{path} : champs inconnus {sorted(unknown)}")
+        if not isinstance(data.get("company_info"), dict) or not data["company_info"].get("name"):
+            raise ValueError(f"{path} : company_info.name requis")
+        contact = data.get("contact")
+        if not isinstance(contact, dict) or not contact.get("phone") or not contact.get("email"):
+            raise ValueError(f"{path} : contact.phone et contact.email requis")
+        unknown_tiers = set(data.get("models") or {}) - set(GroqConfig.MODELS)
+        if unknown_tiers:
+            raise ValueError(f"{path} : niveaux de modèles inconnus {sorted(unknown_tiers)}")
+
+        # Chemin relatif : par rapport au dossier du fichier
+        if data.get("knowledge_dir"):
+            data["knowledge_dir"] = os.path.join(os.path.dirname(os.path.abspath(path)), data["knowledge_dir"])
+        tenant = cls(tenant_id, source=path, **data)
+
+        # Champs des messages et du prompt : uniquement ceux de variables()
+        try:
+            for template in (tenant.prompt, tenant.contact_message, *tenant.welcome_messages.values(),
+                             *tenant.redirect_responses):
+                if template:
+                    template.format_map(tenant.variables())
+        except (KeyError, ValueError, IndexError) as e:
+            raise ValueError(f"{path} : champ de message invalide ({e})")
+        return tenant
+
+    def variables(self):
+        """Champs disponibles dans les messages, le prompt et les documents du site"""
+        return {"company_name": self.company_info["name"], **self.contact}
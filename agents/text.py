@@ -0,0 +1,24 @@
+import re
+import unicodedata
+
+_NON_WORD = re.compile(r"[^\w]+")
+_WORD = re.compile(r"\w+")
+_COMBINING = re.compile(r"[\u0300-\u036f]+")
+_LIGATURES = str.maketrans({"œ": "oe", "Œ": "oe", "æ": "ae", "Æ": "ae"})
+
+
+def fold_text(text):
+    """Retirer les accents et la casse"""
+    if not text.isascii():
+        text = _COMBINING.sub("", unicodedata.normalize("NFKD", text.translate(_LIGATURES)))
+    return text.casefold()
+
+
+def normalize_text(text):
+    """Normaliser un texte pour la comparaison : casse, accents, ponctuation et espaces"""
+    return _NON_WORD.sub(" ", fold_text(text)).strip()
+
+
+def tokenize(text):
+    """Découper un texte normalisé en mots"""
+    return _WORD.findall(fold_text(text))
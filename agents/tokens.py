@@ -0,0 +1,24 @@
+import math
+
+# Surcoût approximatif d'un message dans le format chat (rôle, séparateurs)
+MESSAGE_OVERHEAD = 4
+
+# Nombre moyen de caractères par token pour du français avec un tokenizer BPE
+CHARS_PER_TOKEN = 3.5
+
+
+def estimate_tokens(text):
+    """Estimer le nombre de tokens d'un texte sans tokenizer"""
+    if not text:
+        return 0
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def estimate_message_tokens(message):
+    """Estimer le coût en tokens d'un message {"role", "content"}"""
+    return estimate_tokens(message["content"]) + MESSAGE_OVERHEAD
+
+
+def estimate_messages_tokens(messages):
+    """Estimer le coût en tokens d'une liste de messages"""
+    return sum(estimate_message_tokens(message) for message in messages)
@@ -1,51 +1,375 @@
 from groq import Groq
+import contextvars
 import os
 import random
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 from config import (
     Config, 
     GroqConfig, 
+    AdmissionConfig,
+    BatchConfig,
     WelcomeAgentConfig, 
-    SecurityConfig
+    SecurityConfig,
+    SessionConfig,
+    CacheConfig,
+    RouterConfig,
+    IntentConfig,
+    KnowledgeConfig,
+    GenerationConfig,
+    SpeculationConfig
 )
+from agents.session_store import SessionStore
+from agents.session_backend import SQLiteSessionBackend
+from agents.summarizer import HistorySummarizer, SummaryDeferred
+from agents.keyword_matcher import KeywordMatcher, get_content_matcher
+from agents.text import tokenize
+from agents.response_cache import ResponseCache, build_cache_key, prompt_fingerprint
+from agents.resilience import CircuitBreaker, ResilientCaller, error_class, retry_after
+from agents.admission import AdmissionController, AdmissionRejected
+from agents.model_router import ModelRouter
+from agents.single_flight import SingleFlight
+from agents.speculation import Speculation, Speculator
+from agents.generation_policy import GenerationPolicy, ContinuedCompletion, merge_usage
+from agents.intent_classifier import get_intent_classifier
+from agents.knowledge import get_knowledge_index, build_knowledge_index
+from agents.tenant import Tenant
+from agents.tokens import estimate_messages_tokens, estimate_tokens
+from logging_setup import get_logger, request_id_var
+from tracing import span, record
+import metrics
 
 # Charger les variables d'environnement
 load_dotenv()
 
+api_log = get_logger("api")
+conversation_log = get_logger("conversation")
+error_log = get_logger("error")
+agent_log = get_logger("agent")
+
+class Turn:
+    """État d'un tour de conversation pendant son traitement"""
+    
+    __slots__ = ("session_id", "user_message", "words", "intent", "messages", "response", "route", "model",
+                 "policy", "generation", "cache_key", "usage", "shared", "ticket", "outcome", "speculation",
+                 "start_time")
+    
+    def __init__(self, user_message, session_id):
+        self.session_id = session_id
+        self.user_message = user_message
+        self.words = None
+        self.intent = None
+        self.messages = None
+        self.response = None
+        self.route = None
+        self.model = None
+        self.policy = None
+        self.generation = None
+        self.cache_key = None
+        self.usage = None
+        self.shared = False
+        self.ticket = None
+        self.outcome = None
+        self.speculation = None
+        self.start_time = time.time()
+
+
 class WelcomeAgent:
-    def __init__(self):
-        """Initialiser le client Groq et configurer l'agent"""
-        
-        # Vérification de la clé API
-        if not Config.GROQ_API_KEY:
-            raise ValueError("❌ GROQ_API_KEY non trouvée dans les variables d'environnement")
+    # Ressources du worker réutilisées par les agents des autres sites clients (AgentRegistry)
+    SHARED = ("client", "resilience", "admission", "sessions", "summarizer",
+              "intents", "policy", "cache", "single_flight", "speculator", "batch_pool")
+    
+    def __init__(self, tenant=None, shared=None):
+        """Initialiser le client Groq et configurer l'agent
         
-        print(f"🔑 Initialisation avec la clé API: {Config.GROQ_API_KEY[:20]}...")
+        tenant : site client servi (par défaut celui de WelcomeAgentConfig).
+        shared : agent dont les ressources coûteuses (client et pool de
+        connexions Groq, sessions, cache...) sont réutilisées telles quelles.
+        """
+        self.tenant = tenant or Tenant.default()
+        if shared is None:
+            self._create_shared()
+        else:
+            for name in self.SHARED:
+                setattr(self, name, getattr(shared, name))
+            self._add_models(self.tenant.models.values())
         
-        # Configuration Groq
-        self.client = Groq(api_key=Config.GROQ_API_KEY)
-        self.model = GroqConfig.DEFAULT_MODEL
+        # Routage des requêtes entre les niveaux de modèles du site
+        # (santé des modèles commune à tous les sites)
+        if shared is None:
+            self.router = ModelRouter(
+                models=self.tenant.models,
+                fallbacks=RouterConfig.FALLBACKS,
+                deadlines=RouterConfig.DEADLINES,
+                intents=RouterConfig.INTENTS,
+                short_words=RouterConfig.SHORT_MESSAGE_WORDS,
+                long_words=RouterConfig.LONG_MESSAGE_WORDS,
+                long_history=RouterConfig.LONG_HISTORY_TURNS,
+                long_context_tokens=RouterConfig.LONG_CONTEXT_TOKENS,
+                alpha=RouterConfig.EWMA_ALPHA,
+                max_error_rate=RouterConfig.MAX_ERROR_RATE,
+                probe_interval=RouterConfig.PROBE_INTERVAL
+            ) if RouterConfig.ENABLED else None
+        else:
+            self.router = shared.router.for_models(self.tenant.models) if shared.router else None
+        self.model = self.tenant.models["fast"]
         self.temperature = GroqConfig.TEMPERATURE
         self.max_tokens = GroqConfig.MAX_TOKENS
         self.top_p = GroqConfig.TOP_P
-        
-        # Historique de conversation
-        self.conversation_history = []
         self.max_history = GroqConfig.MAX_CONVERSATION_HISTORY
         
         # Informations de l'entreprise
-        self.company_name = WelcomeAgentConfig.COMPANY_INFO["name"]
-        self.company_specialties = WelcomeAgentConfig.COMPANY_INFO["specialties"]
-        self.company_zones = WelcomeAgentConfig.COMPANY_INFO["zones"]
-        self.company_experience = WelcomeAgentConfig.COMPANY_INFO["experience"]
+        company_info = self.tenant.company_info
+        self.company_name = company_info["name"]
+        self.company_specialties = company_info["specialties"]
+        self.company_zones = company_info["zones"]
+        self.company_experience = company_info["experience"]
+        self.contact = self.tenant.contact
+        
+        # Détecteur de mots-clés (sujets interdits, vocabulaire BTP)
+        self.matcher = self._create_matcher()
+        
+        # Base de connaissances : extraits pertinents ajoutés à chaque requête
+        self.knowledge = self._create_knowledge() if KnowledgeConfig.ENABLED else None
+        
+        # Créer le prompt système : court si les détails viennent de la base
+        if self.knowledge:
+            self.system_prompt = self._create_core_prompt()
+            self.system_prompt_hash = prompt_fingerprint(self.system_prompt + self.knowledge.fingerprint())
+        else:
+            self.system_prompt = self._create_system_prompt()
+            self.system_prompt_hash = prompt_fingerprint(self.system_prompt)
+        
+        agent_log.info("agent_initialized", extra={"fields": {
+            "tenant": self.tenant.id,
+            "company": self.company_name,
+            "model": self.model
+        }})
+
+    def _create_shared(self):
+        """Créer les ressources partagées : client Groq, résilience, sessions, cache..."""
+        
+        # Vérification de la clé API
+        if not Config.GROQ_API_KEY:
+            raise ValueError("❌ GROQ_API_KEY non trouvée dans les variables d'environnement")
+        
+        # Configuration Groq
+        self.client = self._create_client()
+        
+        # Timeouts, retries, disjoncteur et hedging : un jeu par modèle,
+        # pour qu'un modèle en panne n'ouvre pas le disjoncteur des autres
+        self.resilience = {
+            model: self._create_caller() for model in GroqConfig.MODELS.values()
+        }
+        
+        # Contrôle d'admission : budget requêtes/tokens par minute de chaque modèle
+        self.admission = {
+            model: self._create_admission() for model in GroqConfig.MODELS.values()
+        } if AdmissionConfig.ENABLED else None
+        
+        # Historique de conversation, une entrée par session (clé préfixée par le site)
+        self.sessions = SessionStore(
+            max_history=GroqConfig.MAX_CONVERSATION_HISTORY,
+            ttl=SessionConfig.SESSION_TTL,
+            max_sessions=SessionConfig.MAX_SESSIONS,
+            max_turns=SessionConfig.MAX_TOTAL_TURNS,
+            max_bytes=SessionConfig.MAX_TOTAL_BYTES,
+            stripes=SessionConfig.LOCK_STRIPES,
+            max_tokens=GroqConfig.HISTORY_TOKEN_BUDGET,
+            keep_pending=SessionConfig.SUMMARY_ENABLED,
+            backend=self._create_session_backend(),
+            revalidate_interval=SessionConfig.REVALIDATE_INTERVAL
+        )
+        
+        # Résumé des anciens messages, produit en arrière-plan
+        self.summarizer = HistorySummarizer(
+            self.sessions,
+            self._summarize,
+            model=SessionConfig.SUMMARY_MODEL,
+            max_tokens=SessionConfig.SUMMARY_MAX_TOKENS,
+            workers=SessionConfig.SUMMARY_WORKERS
+        ) if SessionConfig.SUMMARY_ENABLED else None
+        
+        # Classifieur d'intentions, entraîné au démarrage sur les exemples annotés
+        self.intents = get_intent_classifier() if IntentConfig.ENABLED else None
+        
+        # max_tokens, température et arrêt par type de demande, ajustés aux longueurs observées
+        self.policy = GenerationPolicy(
+            policies=GenerationConfig.POLICIES,
+            intents=GenerationConfig.INTENTS,
+            ceiling=GroqConfig.MAX_TOKENS,
+            short_words=RouterConfig.SHORT_MESSAGE_WORDS,
+            buckets=GenerationConfig.BUCKETS,
+            window=GenerationConfig.WINDOW,
+            min_samples=GenerationConfig.MIN_SAMPLES,
+            quantile=GenerationConfig.QUANTILE,
+            headroom=GenerationConfig.HEADROOM,
+            min_tokens=GenerationConfig.MIN_MAX_TOKENS
+        ) if GenerationConfig.ENABLED else None
+        
+        # Cache des réponses aux questions fréquentes
+        self.cache = ResponseCache(
+            max_entries=CacheConfig.MAX_ENTRIES,
+            ttl=CacheConfig.TTL
+        ) if CacheConfig.ENABLED else None
+        
+        # Un seul appel Groq pour les requêtes identiques simultanées
+        self.single_flight = SingleFlight() if CacheConfig.SINGLE_FLIGHT_ENABLED else None
+        
+        # Appels Groq lancés pendant les vérifications du message
+        self.speculator = self._create_speculator() if SpeculationConfig.ENABLED else None
+        
+        # Conversations des lots (/api/welcome/batch), tous lots confondus
+        self.batch_pool = ThreadPoolExecutor(BatchConfig.CONCURRENCY, thread_name_prefix="batch")
+    
+    def _add_models(self, models):
+        """Ajouter résilience et budget d'admission des modèles propres à un site"""
+        for model in models:
+            if model not in self.resilience:
+                self.resilience[model] = self._create_caller()
+            if self.admission is not None and model not in self.admission:
+                self.admission[model] = self._create_admission()
+    
+    def _create_matcher(self):
+        """Listes de mots-clés du site (matcher commun si le site garde celles de la configuration)"""
+        if not self.tenant.custom_keywords:
+            return get_content_matcher()
+        return KeywordMatcher({
+            "blocked": SecurityConfig.BLOCKED_WORDS,
+            "forbidden": self.tenant.forbidden_topics if self.tenant.forbidden_topics is not None else WelcomeAgentConfig.FORBIDDEN_TOPICS,
+            "btp": self.tenant.btp_keywords if self.tenant.btp_keywords is not None else WelcomeAgentConfig.BTP_KEYWORDS,
+        })
+    
+    def _create_knowledge(self):
+        """Index de connaissances du site (index commun pour le site par défaut)"""
+        if self.tenant.builtin:
+            return get_knowledge_index()
+        return build_knowledge_index(self.tenant.knowledge_dir, self.tenant.company_info, self.tenant.variables())
+    
+    def _session_key(self, session_id):
+        """Clé de session dans le store partagé : les sites ne voient pas les sessions des autres"""
+        if self.tenant.builtin:
+            return session_id
+        return f"{self.tenant.id}:{session_id}"
+
+    def _create_client(self):
+        """Créer le client Groq utilisé par l'agent (les retries sont gérés par self.resilience)"""
+        return Groq(api_key=Config.GROQ_API_KEY, max_retries=0, timeout=GroqConfig.REQUEST_TIMEOUT)
+
+    def warm_up(self):
+        """Ouvrir la connexion TLS vers Groq avant la première requête.
+
+        Un GET /models (sans consommation de tokens) laisse une connexion
+        keep-alive dans le pool : le premier tour n'a pas à payer la
+        résolution DNS ni la poignée de main TLS.
+        """
+        started = time.perf_counter()
+        try:
+            self.client.models.list(timeout=GroqConfig.PREWARM_TIMEOUT)
+        except Exception as e:
+            agent_log.warning("prewarm_failed", extra={"fields": {"error_type": type(e).__name__}})
+            return {"ok": False, "error_type": type(e).__name__}
+        return {"ok": True, "ms": round((time.perf_counter() - started) * 1000, 1)}
+
+    def is_available(self):
+        """Au moins un modèle a son disjoncteur fermé ou en essai"""
+        return any(caller.breaker.state != CircuitBreaker.OPEN for caller in self.resilience.values())
+
+    def _create_speculator(self):
+        """Appels spéculatifs exécutés par des threads dédiés"""
+        return Speculator(SpeculationConfig.MAX_IN_FLIGHT, workers=SpeculationConfig.MAX_IN_FLIGHT)
+    
+    def _create_session_backend(self):
+        """Persistance des conversations (None : historique en mémoire du worker uniquement)"""
+        if SessionConfig.BACKEND != "sqlite":
+            return None
+        directory = os.path.dirname(SessionConfig.DB_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        return SQLiteSessionBackend(
+            SessionConfig.DB_PATH,
+            ttl=SessionConfig.SESSION_TTL,
+            queue_size=SessionConfig.WRITE_QUEUE_SIZE,
+            batch_size=SessionConfig.WRITE_BATCH_SIZE
+        )
+    
+    def _create_caller(self):
+        """Couche de résilience (timeouts, retries, disjoncteur, hedging) d'un modèle"""
+        return ResilientCaller(
+            timeout=GroqConfig.REQUEST_TIMEOUT,
+            max_retries=GroqConfig.MAX_RETRIES,
+            total_deadline=GroqConfig.TOTAL_DEADLINE,
+            backoff_base=GroqConfig.RETRY_BACKOFF_BASE,
+            backoff_max=GroqConfig.RETRY_BACKOFF_MAX,
+            breaker=CircuitBreaker(
+                GroqConfig.CIRCUIT_FAILURE_THRESHOLD,
+                GroqConfig.CIRCUIT_RESET_TIMEOUT
+            ),
+            hedging=GroqConfig.HEDGING_ENABLED,
+            hedge_percentile=GroqConfig.HEDGE_PERCENTILE,
+            hedge_min_delay=GroqConfig.HEDGE_MIN_DELAY
+        )
+
+    def _create_admission(self):
+        """Budget d'un modèle : quota du compte, moins la marge, partagé entre les workers"""
+        share = AdmissionConfig.HEADROOM / AdmissionConfig.WORKERS
+        return AdmissionController(
+            rpm=AdmissionConfig.RPM_LIMIT * share,
+            tpm=AdmissionConfig.TPM_LIMIT * share,
+            max_in_flight=AdmissionConfig.MAX_IN_FLIGHT,
+            max_queue=AdmissionConfig.MAX_QUEUE,
+            timeout=AdmissionConfig.QUEUE_TIMEOUT,
+            expected_completion=AdmissionConfig.EXPECTED_COMPLETION_TOKENS
+        )
+
+    def _summary_client(self):
+        """Client synchrone utilisé par les threads de résumé"""
+        return self.client
+    
+    def _summarize(self, messages, model, max_tokens):
+        """Appel Groq d'un résumé d'historique (threads du résumeur).
         
-        # Créer le prompt système dynamique
-        self.system_prompt = self._create_system_prompt()
+        Basse priorité : admis seulement si le budget du modèle laisse sa
+        réserve aux visiteurs (sinon SummaryDeferred). Même résilience,
+        santé du routeur et comptage des tokens que les tours.
+        """
+        ticket = None
+        if self.admission is not None:
+            ticket = self.admission[model].try_acquire(
+                estimate_messages_tokens(messages), reserve=AdmissionConfig.BACKGROUND_RESERVE
+            )
+            if ticket is None:
+                metrics.admission.inc(model, "deferred")
+                raise SummaryDeferred(model)
+            self._admitted(model, ticket)
+        client = self._summary_client()
+        
+        def request(timeout):
+            return client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=0.0,
+                max_tokens=max_tokens,
+                stream=False,
+                timeout=timeout
+            )
         
-        print(f"✅ WelcomeAgent initialisé pour {self.company_name}")
-        print(f"🤖 Modèle: {self.model}")
-        print(f"🏗️ Spécialités: {', '.join(self.company_specialties[:3])}...")
+        started = self._upstream_started(model)
+        completion = None
+        try:
+            completion = self.resilience[model].call(request)
+        except Exception as e:
+            self._upstream_finished(model, started, e)
+            raise
+        finally:
+            self._release(model, ticket, getattr(completion, "usage", None))
+        self._upstream_finished(model, started)
+        usage = getattr(completion, "usage", None)
+        if usage is not None:
+            metrics.tokens.inc(model, "prompt", amount=usage.prompt_tokens or 0)
+            metrics.tokens.inc(model, "completion", amount=usage.completion_tokens or 0)
+        return completion
 
     def _create_system_prompt(self):
         """Créer le prompt système personnalisé avec les informations de l'entreprise"""
@@ -73,7 +397,7 @@ TES MISSIONS PRINCIPALES :
 2. Présenter les services et l'expertise de {self.company_name}
 3. Identifier le type de visiteur (client, employeur, confrère)
 4. Répondre aux questions techniques de base sur le BTP
-5. Orienter vers les bons contacts pour devis et projets (Avec le numéro de téléphone suivant: +237 691 733 730 ou à via l'address email: noujiengenering@gmail.com)
+5. Orienter vers les bons contacts pour devis et projets (Avec le numéro de téléphone suivant: {self.contact["phone"]} ou à via l'address email: {self.contact["email"]})
 6. Expliquer nos processus de travail et notre approche qualité
 
 SERVICES À PROMOUVOIR :
@@ -104,107 +428,811 @@ Nous intervenons principalement sur : {zones_text}
 
 Commence toujours par identifier le type de visiteur pour personnaliser tes réponses et représenter au mieux {self.company_name}."""
 
-    def _should_redirect(self, message):
+    def _create_core_prompt(self):
+        """Prompt système réduit : identité, ton et règles ; les faits viennent des extraits"""
+        if self.tenant.prompt:
+            return self.tenant.prompt.format_map(self.tenant.variables())
+        zones = f", intervenant principalement à {', '.join(self.company_zones)}" if self.company_zones else ""
+        return f"""Tu es WelcomeAgent, l'assistant IA officiel de {self.company_name}, entreprise de BTP (Bâtiment et Travaux Publics){zones}.
+
+TON : professionnel, chaleureux et concret, en français correct. Représente fièrement {self.company_name}.
+
+MISSIONS : accueillir les visiteurs, identifier leur profil (client, employeur, confrère), présenter nos services et nos processus, et les orienter vers nos contacts pour devis et projets (téléphone : {self.contact["phone"]}, email : {self.contact["email"]}).
+
+RÈGLES :
+- Reste TOUJOURS dans le domaine du BTP ; redirige poliment les questions hors sujet
+- Appuie-toi sur les informations de l'entreprise fournies avec la question ; si elles ne couvrent pas la demande, dis-le et propose de contacter l'équipe
+- N'invente JAMAIS de prix, de délais, de références ou de réalisations
+- Encourage les demandes de devis gratuits et dirige vers un expert pour les questions techniques complexes"""
+
+    def _retrieve_knowledge(self, words, history):
+        """Extraits de la base pertinents pour le message (et la question précédente)"""
+        query = list(words)
+        for message in reversed(history[:-1]):
+            if message["role"] == "user":
+                query.extend(tokenize(message["content"]))
+                break
+        
+        snippets, budget = [], KnowledgeConfig.MAX_TOKENS
+        for _, chunk in self.knowledge.search(words=query, k=KnowledgeConfig.TOP_K, min_score=KnowledgeConfig.MIN_SCORE):
+            if snippets and chunk.tokens > budget:
+                break
+            snippets.append(f"## {chunk.title}\n{chunk.text}")
+            budget -= chunk.tokens
+        return "\n\n".join(snippets)
+
+    def _should_redirect(self, message, words=None):
         """Vérifier si le message contient des sujets à rediriger"""
-        message_lower = message.lower()
+        if words is None:
+            words = tokenize(message)
+        categories = self.matcher.categories(words=words)
         
-        for topic in WelcomeAgentConfig.FORBIDDEN_TOPICS:
-            if topic in message_lower:
-                return True
+        if "forbidden" in categories:
+            return True
         
         # Vérifier si c'est vraiment lié au BTP
-        btp_keywords = [
-            'construction', 'bâtiment', 'maison', 'rénovation', 'travaux',
-            'maçonnerie', 'charpente', 'couverture', 'béton', 'pierre',
-            'devis', 'projet', 'btp', 'entrepreneur', 'artisan'
+        return "btp" not in categories and len(words) > 5
+
+    def _build_messages(self, history, summary="", knowledge=""):
+        """Préparer la liste de messages envoyée à Groq (prompt système, extraits, historique)"""
+        messages = [
+            {"role": "system", "content": self.system_prompt}
         ]
+        if knowledge:
+            messages.append({
+                "role": "system",
+                "content": f"Informations sur {self.company_name} utiles pour répondre :\n\n{knowledge}"
+            })
+        if summary:
+            messages.append({
+                "role": "system",
+                "content": f"Résumé de la conversation précédente : {summary}"
+            })
+        messages.extend(history)
+        return messages
+    
+    def _generation_params(self, model=None):
+        """Paramètres de génération communs aux appels Groq"""
+        return {
+            "model": model or self.model,
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens,
+            "top_p": self.top_p,
+            "frequency_penalty": GroqConfig.FREQUENCY_PENALTY,
+            "presence_penalty": GroqConfig.PRESENCE_PENALTY
+        }
+    
+    def _turn_params(self, turn, model=None):
+        """Paramètres effectifs d'un appel du tour : communs, puis ceux de son type de demande"""
+        params = self._generation_params(model or turn.model)
+        if turn.generation:
+            params.update(turn.generation)
+        return params
+    
+    def _error_response(self):
+        """Message d'erreur personnalisé pour l'entreprise"""
+        return f"Désolé, je rencontre un problème technique temporaire. Pour toute urgence, n'hésitez pas à contacter directement {self.company_name}. Vous pouvez également réessayer dans quelques instants."
+
+    def _prepare_turn(self, user_message, session_id, speculation=None):
+        """Préparer un tour de conversation.
         
-        has_btp_keyword = any(keyword in message_lower for keyword in btp_keywords)
+        turn.response est renseigné quand aucun appel Groq n'est nécessaire
+        (redirection ou réponse en cache) ; sinon turn.messages contient les
+        messages à envoyer et turn.model le modèle choisi. turn.speculation
+        est renseigné si l'appel spéculatif correspond exactement au tour.
+        """
+        session_id = self._session_key(session_id)
+        turn = Turn(user_message, session_id)
+        turn.words = speculation.turn.words if speculation else tokenize(user_message)
         
-        return not has_btp_keyword and len(message.split()) > 5
-
-    def process_message(self, user_message):
-        """Traiter un message utilisateur et retourner la réponse de l'agent"""
-        try:
-            # Vérifier si c'est un sujet à rediriger
-            if self._should_redirect(user_message):
-                return random.choice(WelcomeAgentConfig.REDIRECT_RESPONSES).format(
-                    company_name=self.company_name
-                )
-            
-            # Ajouter le message utilisateur à l'historique
-            self.conversation_history.append({
+        # Salutation, profil du visiteur, demande de contact, hors sujet : réponse modèle
+        with span("intent"):
+            answered = self._answer_intent(turn)
+        if answered:
+            return turn
+        
+        # Vérifier si c'est un sujet à rediriger
+        with span("redirect"):
+            redirect = self._should_redirect(user_message, turn.words)
+        if redirect:
+            turn.response = random.choice(self.tenant.redirect_responses).format_map(self.tenant.variables())
+            self._observe_turn(turn, "redirected")
+            return turn
+        
+        # Ajouter le message utilisateur à l'historique (fenêtre bornée en tokens)
+        with span("history"):
+            history = self.sessions.append(session_id, {
                 "role": "user",
                 "content": user_message
             })
             
-            # Limiter l'historique pour éviter les tokens excessifs
-            if len(self.conversation_history) > self.max_history:
-                self.conversation_history = self.conversation_history[-self.max_history:]
-            
-            # Préparer les messages pour Groq
-            messages = [
-                {"role": "system", "content": self.system_prompt}
-            ]
-            
-            # Ajouter l'historique de conversation
-            messages.extend(self.conversation_history)
-            
-            print(f"🤖 Envoi à Groq: {len(messages)} messages, modèle {self.model}")
+            # Résumer hors requête les messages sortis de la fenêtre
+            if self.summarizer:
+                self.summarizer.schedule(session_id)
+        
+        summary = self.sessions.get_summary(session_id)
+        if speculation is not None and speculation.matches(history, summary):
+            # Messages, modèle et paramètres déjà préparés pour l'appel spéculatif
+            draft = speculation.turn
+            turn.messages, turn.route, turn.model = draft.messages, draft.route, speculation.model
+            turn.policy, turn.generation = draft.policy, draft.generation
+            turn.speculation = speculation
+        else:
+            self._plan_turn(turn, history, summary)
+        
+        with span("cache"):
+            self._cache_lookup(turn)
+        return turn
+    
+    def _plan_turn(self, turn, history, summary):
+        """Construire les messages du tour et choisir son modèle"""
+        # Préparer les messages pour Groq, avec les extraits utiles de la base
+        with span("knowledge"):
+            knowledge = self._retrieve_knowledge(turn.words, history) if self.knowledge else ""
+        with span("messages"):
+            turn.messages = self._build_messages(history, summary, knowledge)
+        
+        # Choisir le modèle de cette requête (celui de la session s'il a été imposé)
+        with span("route"):
+            pinned = self.sessions.get_model(turn.session_id)
+            if self.router:
+                turn.route = self.router.choose(
+                    turn.words,
+                    len(history),
+                    estimate_messages_tokens(turn.messages),
+                    pinned=pinned
+                )
+                turn.model = turn.route.model
+            else:
+                turn.model = pinned or self.model
             
-            # Appel à l'API Groq avec timeout
-            start_time = time.time()
+            # Paramètres de génération du type de demande, puis température imposée à la session
+            temperature = self.sessions.get_temperature(turn.session_id)
+            if self.policy:
+                turn.policy = self.policy.classify(turn.intent, turn.route.intent if turn.route else None, turn.words)
+                turn.generation = self.policy.params(turn.policy, self.temperature)
+            if temperature is not None:
+                turn.generation = {**(turn.generation or {}), "temperature": temperature}
+    
+    def _speculate(self, user_message, session_id):
+        """Lancer l'appel Groq du message avant ses vérifications (None si la spéculation ne s'applique pas)"""
+        if self.speculator is None:
+            return None
+        words = tokenize(user_message)
+        if len(words) < SpeculationConfig.MIN_WORDS:
+            return None
+        
+        with span("speculate"):
+            # Brouillon du tour : historique tel qu'il sera une fois le message ajouté
+            session_id = self._session_key(session_id)
+            draft = Turn(user_message, session_id)
+            draft.words = words
+            history = self.sessions.get_history(session_id)
+            history.append({"role": "user", "content": user_message})
+            summary = self.sessions.get_summary(session_id)
+            self._plan_turn(draft, history, summary)
             
-            completion = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=self.temperature,
-                max_tokens=self.max_tokens,
-                top_p=self.top_p,
-                frequency_penalty=GroqConfig.FREQUENCY_PENALTY,
-                presence_penalty=GroqConfig.PRESENCE_PENALTY,
-                stream=False
+            # Réponse déjà en cache : rien à anticiper
+            cache_key = self._cache_key(draft)
+            if cache_key is not None and self.cache.contains(cache_key):
+                return None
+            if not self.speculator.try_start():
+                return None
+            speculation = Speculation(draft, history, summary)
+            speculation.task = self._dispatch(draft)
+        return speculation
+    
+    def _dispatch(self, draft):
+        """Démarrer l'appel spéculatif dans un thread dédié"""
+        # copy_context : identifiant de requête et trace suivent l'appel
+        return self.speculator.pool.submit(contextvars.copy_context().run, self._shared_upstream, draft)
+    
+    def _settle_speculation(self, speculation, turn):
+        """Retenir l'appel spéculatif si le tour part vers Groq avec les mêmes messages, sinon l'abandonner"""
+        if turn.speculation is not None and turn.response is None:
+            # Place rendue quand l'appel se termine : il est encore en vol une fois retenu
+            speculation.adopted = time.monotonic()
+            speculation.task.add_done_callback(lambda task: self.speculator.finish(speculation, "used"))
+            return
+        turn.speculation = None
+        self._abandon(speculation, turn.outcome if turn.response is not None else "mismatch")
+    
+    def _abandon(self, speculation, reason):
+        """Annuler l'appel spéculatif, ou ignorer sa réponse s'il est déjà parti"""
+        if speculation.task.cancel():
+            self.speculator.finish(speculation, "cancelled", reason)
+        else:
+            speculation.task.add_done_callback(lambda task: self._discarded(speculation, reason, task))
+    
+    def _discarded(self, speculation, reason, task):
+        """Appel spéculatif terminé sans être utilisé : ses tokens restent comptés"""
+        if task.cancelled() or task.exception() is not None:
+            self.speculator.finish(speculation, "cancelled", reason)
+            return
+        draft = speculation.turn
+        draft.usage = getattr(task.result(), "usage", None)
+        self._record_usage(draft)
+        self.speculator.finish(speculation, "discarded", reason)
+    
+    def _intent_response(self, intent, session_id):
+        """Réponse modèle d'une intention, ou None si l'intention doit passer par Groq"""
+        if intent == "off_topic":
+            return random.choice(self.tenant.redirect_responses).format_map(self.tenant.variables())
+        if intent == "contact":
+            return self.tenant.contact_message.format_map(self.tenant.variables())
+        if intent == "greeting":
+            # Une salutation en cours de conversation n'appelle pas un nouvel accueil
+            if self.sessions.length(session_id):
+                return None
+            intent = "default"
+        template = self.tenant.welcome_messages.get(intent)
+        return template.format_map(self.tenant.variables()) if template else None
+    
+    def _answer_intent(self, turn):
+        """Répondre sans appel Groq quand le classifieur reconnaît une intention simple"""
+        if self.intents is None or not turn.words or len(turn.words) > IntentConfig.MAX_WORDS:
+            return False
+        intent, confidence = self.intents.predict(words=turn.words)
+        if confidence < IntentConfig.THRESHOLD:
+            return False
+        turn.intent = intent
+        response = self._intent_response(intent, turn.session_id)
+        if response is None:
+            return False
+        
+        # Les messages hors sujet restent hors de l'historique, comme les redirections
+        if intent != "off_topic":
+            self.sessions.append(turn.session_id, {"role": "user", "content": turn.user_message})
+            self.sessions.append(turn.session_id, {"role": "assistant", "content": response})
+        
+        turn.response = response
+        metrics.fast_path.inc(intent)
+        self._observe_turn(turn, "fast_path")
+        return True
+    
+    def _cache_key(self, turn):
+        """Clé de cache du tour (None si le cache est désactivé ou contourné)"""
+        if self.cache is None:
+            return None
+        # Paramètres stables du type de demande : max_tokens, ajusté en continu par la
+        # politique de génération, rendrait les réponses en cache inaccessibles à chaque ajustement
+        params = self._generation_params(turn.model)
+        params.update({key: value for key, value in (turn.generation or {}).items() if key != "max_tokens"})
+        if CacheConfig.BYPASS_ON_TEMPERATURE and params["temperature"] > 0:
+            return None
+        
+        model = params.pop("model")
+        return build_cache_key(
+            model,
+            self.system_prompt_hash,
+            params,
+            turn.messages[1:][-CacheConfig.KEY_TURNS:]
+        )
+    
+    def _cache_lookup(self, turn):
+        """Chercher une réponse en cache pour ce tour.
+        
+        En cas de succès la réponse est placée dans turn.response et ajoutée
+        à l'historique ; turn.cache_key reste None si le cache est désactivé.
+        """
+        turn.cache_key = self._cache_key(turn)
+        if turn.cache_key is None:
+            return
+        
+        cached = self.cache.get(turn.cache_key)
+        if cached is not None:
+            api_log.info("cache_hit", extra={"fields": {"model": turn.model}})
+            self.sessions.append(turn.session_id, {
+                "role": "assistant",
+                "content": cached
+            })
+            turn.response = cached
+            self._observe_turn(turn, "cached")
+    
+    def _upstream_chain(self, turn):
+        """Modèles à essayer pour ce tour : (niveau, modèle, délai, retries)"""
+        if turn.route is None:
+            return [(None, turn.model, None, None)]
+        chain = self.router.chain(turn.route)
+        attempts = []
+        for index, (tier, model) in enumerate(chain):
+            if index == len(chain) - 1:
+                # Dernier recours : délais et retries complets
+                attempts.append((tier, model, None, None))
+            else:
+                # Un repli existe : basculer dès le premier échec ou dépassement
+                attempts.append((tier, model, self.router.deadline(tier), 0))
+        return attempts
+    
+    def _request(self, turn, model, stream, deadline):
+        """Fonction d'appel Groq passée à la couche de résilience"""
+        params = self._turn_params(turn, model)
+        # Identifiant de la requête transmis à Groq (corrélation avec ses propres logs)
+        request_id = request_id_var.get()
+        headers = {"X-Request-Id": request_id} if request_id else None
+        
+        def request(timeout):
+            return self.client.chat.completions.create(
+                messages=turn.messages,
+                stream=stream,
+                timeout=min(timeout, deadline) if deadline else timeout,
+                extra_headers=headers,
+                **params
             )
-            
-            response_time = time.time() - start_time
-            print(f"⚡ Réponse Groq reçue en {response_time:.2f}s")
-            
-            # Extraire la réponse
-            agent_response = completion.choices[0].message.content
-            
-            # Ajouter la réponse à l'historique
-            self.conversation_history.append({
-                "role": "assistant", 
+        return request
+    
+    def _call_upstream(self, turn, stream=False):
+        """Appeler Groq avec le modèle routé, et basculer vers un repli en cas d'échec"""
+        attempts = self._upstream_chain(turn)
+        for index, (tier, model, deadline, retries) in enumerate(attempts):
+            try:
+                ticket = self._admit(turn, model)
+            except AdmissionRejected:
+                # Budget du modèle épuisé : passer au repli, ou refuser la requête
+                if index == len(attempts) - 1:
+                    raise
+                continue
+            started = self._upstream_started(model)
+            try:
+                with span("groq"):
+                    result = self.resilience[model].call(
+                        self._request(turn, model, stream, deadline),
+                        max_retries=retries,
+                        stream=stream
+                    )
+            except Exception as e:
+                self._release(model, ticket)
+                self._upstream_finished(model, started, e)
+                if index == len(attempts) - 1:
+                    raise
+                api_log.warning("model_fallback", extra={"fields": {
+                    "from_model": model, "to_model": attempts[index + 1][1], "error_type": type(e).__name__
+                }})
+                self.router.record_fallback(turn.route, attempts[index + 1][0])
+                continue
+            self._upstream_finished(model, started)
+            turn.model = model
+            self._hold(turn, model, ticket, stream, result)
+            return result
+    
+    def _continuation(self, turn, text, finish_reason, continuations):
+        """Tour qui demande la suite d'une réponse coupée par max_tokens.
+        
+        None si la réponse est complète ou si GenerationConfig.MAX_CONTINUATIONS
+        suites ont déjà été demandées.
+        """
+        if finish_reason != "length" or not text or continuations >= GenerationConfig.MAX_CONTINUATIONS:
+            return None
+        # Réponse partielle en dernier message assistant : Groq la reprend là où elle s'est arrêtée
+        follow = Turn(turn.user_message, turn.session_id)
+        follow.messages = turn.messages + [{"role": "assistant", "content": text}]
+        follow.model = turn.model
+        follow.generation = {**(turn.generation or {}), "max_tokens": self.max_tokens}
+        api_log.info("continuation", extra={"fields": {
+            "model": turn.model, "policy": turn.policy, "continuation": continuations + 1
+        }})
+        return follow
+    
+    def _generate(self, turn):
+        """Appeler Groq, puis demander la suite d'une réponse tronquée"""
+        completions = [self._call_upstream(turn)]
+        while True:
+            follow = self._continuation(
+                turn,
+                "".join(completion.choices[0].message.content or "" for completion in completions),
+                completions[-1].choices[0].finish_reason,
+                len(completions) - 1
+            )
+            if follow is None:
+                break
+            try:
+                with span("continue"):
+                    completions.append(self._call_upstream(follow))
+            except Exception as e:
+                self._continuation_failed(turn, e)
+                break
+        return completions[0] if len(completions) == 1 else ContinuedCompletion(completions)
+    
+    def _continuation_failed(self, turn, error):
+        """Suite indisponible : la réponse partielle est gardée telle quelle"""
+        api_log.warning("continuation_failed", extra={"fields": {
+            "model": turn.model, "error_type": type(error).__name__
+        }})
+    
+    def _admit(self, turn, model):
+        """Réserver le budget du modèle pour ce tour (None si le contrôle est désactivé)"""
+        if self.admission is None:
+            return None
+        try:
+            with span("admission"):
+                ticket = self.admission[model].acquire(estimate_messages_tokens(turn.messages))
+        except AdmissionRejected as e:
+            metrics.admission.inc(model, e.reason)
+            raise
+        self._admitted(model, ticket)
+        return ticket
+    
+    def _admitted(self, model, ticket):
+        metrics.admission.inc(model, "queued" if ticket.queued else "admitted")
+        if ticket.queued:
+            metrics.admission_wait.observe(ticket.waited, model)
+    
+    def _hold(self, turn, model, ticket, stream, result):
+        """Rendre le budget après l'appel, ou à la fin du flux (usage dans le dernier fragment)"""
+        if stream:
+            turn.ticket = (model, ticket)
+        else:
+            self._release(model, ticket, getattr(result, "usage", None))
+    
+    def _release(self, model, ticket, usage=None):
+        """Libérer la place du tour et corriger le budget avec l'usage réel"""
+        if ticket is None:
+            return
+        self.admission[model].release(
+            ticket,
+            getattr(usage, "prompt_tokens", None),
+            getattr(usage, "completion_tokens", None)
+        )
+    
+    def _flight_key(self, turn):
+        """Clé de la requête Groq exacte du tour (modèle, paramètres, prompt et historique complet)"""
+        params = self._turn_params(turn)
+        model = params.pop("model")
+        return build_cache_key(model, self.system_prompt_hash, params, turn.messages[1:])
+    
+    @staticmethod
+    def _flight_timeout():
+        """Attente maximale d'un appel partagé : le premier appel et chacune de ses suites"""
+        return GroqConfig.TOTAL_DEADLINE * (1 + GenerationConfig.MAX_CONTINUATIONS)
+    
+    def _shared_upstream(self, turn):
+        """Appeler Groq, en partageant l'appel avec les tours identiques en cours"""
+        if self.single_flight is None:
+            return self._generate(turn)
+        
+        def call():
+            completion = self._generate(turn)
+            return completion, turn.model
+        
+        (completion, turn.model), turn.shared = self.single_flight.do(
+            self._flight_key(turn), call, timeout=self._flight_timeout()
+        )
+        if turn.shared:
+            metrics.coalesced.inc()
+        return completion
+    
+    def _upstream_started(self, model):
+        metrics.upstream_in_flight.inc(model)
+        return time.monotonic()
+    
+    def _upstream_finished(self, model, started, error=None):
+        """Enregistrer la durée et l'issue d'un appel Groq (santé du routeur, métriques)"""
+        elapsed = time.monotonic() - started
+        metrics.upstream_in_flight.dec(model)
+        metrics.upstream_duration.observe(elapsed, model, "ok" if error is None else "error")
+        if error is not None:
+            metrics.upstream_errors.inc(model, error_class(error))
+            if self.admission and error_class(error) == "rate_limited":
+                # Quota atteint malgré le budget (autres clients du compte) : suspendre les envois
+                self.admission[model].pause(retry_after(error))
+        if self.router:
+            self.router.record(model, elapsed, ok=error is None)
+    
+    def _observe_turn(self, turn, outcome):
+        """Compter l'issue du tour et sa durée de bout en bout"""
+        turn.outcome = outcome
+        metrics.turns.inc(outcome)
+        metrics.turn_duration.observe(time.time() - turn.start_time, turn.model or "none")
+    
+    def _record_usage(self, turn):
+        """Comptabiliser les tokens consommés par le tour"""
+        usage = turn.usage
+        # Les tokens d'un appel partagé ne sont comptés qu'une fois
+        if usage is None or turn.shared:
+            return
+        metrics.tokens.inc(turn.model, "prompt", amount=usage.prompt_tokens or 0)
+        metrics.tokens.inc(turn.model, "completion", amount=usage.completion_tokens or 0)
+        metrics.completion_tokens.observe(usage.completion_tokens or 0, turn.model)
+    
+    def _observe_generation(self, turn, text, finish_reason, continuations):
+        """Longueur de la réponse (suites comprises), pour la politique de génération de son type"""
+        complete = finish_reason != "length"
+        if continuations or not complete:
+            metrics.truncated_responses.inc(turn.policy or "none", "continued" if complete else "cut")
+        # Réponse d'un appel partagé : observée une seule fois
+        if self.policy is None or turn.policy is None or turn.shared:
+            return
+        usage = turn.usage
+        tokens = usage.completion_tokens if usage is not None and usage.completion_tokens is not None else estimate_tokens(text)
+        self.policy.observe(turn.policy, tokens, truncated=bool(continuations) or not complete, complete=complete)
+    
+    def _complete_turn(self, turn, completion):
+        """Extraire la réponse d'une complétion Groq et l'ajouter à l'historique"""
+        response_time = time.time() - turn.start_time
+        
+        # Extraire la réponse
+        agent_response = completion.choices[0].message.content
+        
+        # Ajouter la réponse à l'historique
+        self.sessions.append(turn.session_id, {
+            "role": "assistant", 
+            "content": agent_response
+        })
+        
+        # Réponse restée tronquée après ses suites : pas mise en cache
+        finish_reason = getattr(completion.choices[0], "finish_reason", None)
+        if turn.cache_key and agent_response and finish_reason != "length":
+            self.cache.set(turn.cache_key, agent_response)
+        
+        # Log de l'appel et des tokens utilisés
+        turn.usage = getattr(completion, 'usage', None)
+        self._record_usage(turn)
+        self._observe_generation(
+            turn,
+            agent_response or "",
+            finish_reason,
+            getattr(completion, "continuations", 0)
+        )
+        self._observe_turn(turn, "completed")
+        api_log.info("completion", extra={"fields": {
+            "model": turn.model,
+            "latency_ms": round(response_time * 1000, 1),
+            "total_tokens": turn.usage.total_tokens if turn.usage else None
+        }})
+        conversation_log.info("turn", extra={"fields": {
+            "session_id": turn.session_id,
+            "user": turn.user_message,
+            "assistant": agent_response
+        }})
+        
+        return agent_response
+    
+    def _record_stream(self, turn, parts, outcome="completed", finish_reason=None, continuations=0):
+        """Ajouter à l'historique la réponse assemblée d'un flux"""
+        self._record_usage(turn)
+        if outcome == "completed":
+            self._observe_generation(turn, "".join(parts), finish_reason, continuations)
+        self._observe_turn(turn, outcome)
+        api_log.info("stream_completion", extra={"fields": {
+            "model": turn.model,
+            "latency_ms": round((time.time() - turn.start_time) * 1000, 1),
+            "chunks": len(parts)
+        }})
+        if parts:
+            agent_response = "".join(parts)
+            conversation_log.info("turn", extra={"fields": {
+                "session_id": turn.session_id,
+                "user": turn.user_message,
+                "assistant": agent_response
+            }})
+            self.sessions.append(turn.session_id, {
+                "role": "assistant",
                 "content": agent_response
             })
+            # Flux interrompu ou resté tronqué : pas mis en cache
+            if turn.cache_key and outcome == "completed" and finish_reason != "length":
+                self.cache.set(turn.cache_key, agent_response)
+
+    def respond(self, user_message, session_id="default"):
+        """Traiter un message ; contrairement à process_message, les erreurs sont levées"""
+        speculation = self._speculate(user_message, session_id)
+        try:
+            turn = self._prepare_turn(user_message, session_id, speculation)
+        except BaseException:
+            if speculation is not None:
+                self._abandon(speculation, "error")
+            raise
+        if speculation is not None:
+            self._settle_speculation(speculation, turn)
+        if turn.response is not None:
+            return turn.response
+        
+        # Appel à l'API Groq avec timeout (déjà en cours si l'appel spéculatif est retenu)
+        if turn.speculation is not None:
+            completion = self._speculative_result(turn, turn.speculation.task.result())
+        else:
+            completion = self._shared_upstream(turn)
+        
+        with span("complete"):
+            return self._complete_turn(turn, completion)
+    
+    def _speculative_result(self, turn, completion):
+        """Reprendre dans le tour le modèle effectivement utilisé par l'appel spéculatif"""
+        draft = turn.speculation.turn
+        turn.model, turn.shared = draft.model, draft.shared
+        return completion
+
+    def process_message(self, user_message, session_id="default"):
+        """Traiter un message utilisateur et retourner la réponse de l'agent"""
+        try:
+            return self.respond(user_message, session_id)
             
-            # Log des tokens utilisés
-            if hasattr(completion, 'usage'):
-                print(f"📊 Tokens utilisés: {completion.usage.total_tokens}")
-            
-            return agent_response
+        except AdmissionRejected:
+            metrics.turns.inc("shed")
+            raise
+        except Exception as e:
+            error_log.error("process_message_failed", exc_info=e, extra={"fields": {"error_type": type(e).__name__}})
+            metrics.turns.inc("error")
             
+            return self._error_response()
+    
+    def _run_conversation(self, messages, session_id):
+        """Envoyer les messages d'une conversation dans l'ordre ; retourne (réponses, erreur)"""
+        responses = []
+        try:
+            for message in messages:
+                responses.append(self.respond(message, session_id))
+        except AdmissionRejected as e:
+            metrics.turns.inc("shed")
+            return responses, e
         except Exception as e:
-            print(f"Erreur dans WelcomeAgent.process_message: {str(e)}")
-            print(f"Type d'erreur: {type(e)}")
+            error_log.error("batch_conversation_failed", exc_info=e, extra={"fields": {
+                "session_id": session_id, "error_type": type(e).__name__
+            }})
+            metrics.turns.inc("error")
+            return responses, e
+        return responses, None
+
+    def process_batch(self, conversations):
+        """Traiter des conversations indépendantes en parallèle.
+        
+        conversations : objets avec .messages et .session_id. Les conversations
+        passent par le pool borné du worker (partagé par tous les lots) et les
+        résultats sont produits au fil de l'eau : (conversation, réponses, erreur).
+        """
+        futures = {
+            # copy_context : l'identifiant de requête suit la conversation dans le pool
+            self.batch_pool.submit(contextvars.copy_context().run, self._run_conversation, item.messages, item.session_id): item
+            for item in conversations
+        }
+        try:
+            for future in as_completed(futures):
+                responses, error = future.result()
+                yield futures[future], responses, error
+        finally:
+            # Client parti : ne pas traiter les conversations pas encore commencées
+            for future in futures:
+                future.cancel()
+
+    def stream_message(self, user_message, session_id="default"):
+        """Variante de process_message qui produit la réponse par fragments (deltas).
+        
+        La réponse assemblée est ajoutée à l'historique une fois le flux terminé.
+        """
+        turn = self._prepare_turn(user_message, session_id)
+        if turn.response is not None:
+            yield turn.response
+            return
+        
+        parts = []
+        outcome = "completed"
+        finish_reason = None
+        continuations, usages = 0, []
+        
+        try:
+            stream = self._call_upstream(turn, stream=True)
             
-            # Message d'erreur personnalisé pour l'entreprise
-            return f"Désolé, je rencontre un problème technique temporaire. Pour toute urgence, n'hésitez pas à contacter directement {self.company_name}. Vous pouvez également réessayer dans quelques instants."
+            while True:
+                for chunk in stream:
+                    self._stream_usage(turn, chunk)
+                    if not chunk.choices:
+                        continue
+                    finish_reason = chunk.choices[0].finish_reason or finish_reason
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        if not parts:
+                            self._first_chunk(turn)
+                        parts.append(delta)
+                        yield delta
+                
+                # Réponse coupée par max_tokens : enchaîner sur le flux de sa suite
+                follow = self._continuation(turn, "".join(parts), finish_reason, continuations)
+                if follow is None:
+                    break
+                self._release(*turn.ticket, turn.usage)
+                usages.append(turn.usage)
+                turn.ticket = turn.usage = None
+                continuations += 1
+                try:
+                    stream = self._call_upstream(follow, stream=True)
+                except Exception as e:
+                    self._continuation_failed(turn, e)
+                    break
+                turn.ticket = follow.ticket
+                finish_reason = None
+                    
+        except AdmissionRejected:
+            metrics.turns.inc("shed")
+            raise
+        except Exception as e:
+            error_log.error("stream_message_failed", exc_info=e, extra={"fields": {"error_type": type(e).__name__}})
+            if not parts:
+                metrics.turns.inc("error")
+                yield self._error_response()
+                return
+            outcome = "error"
+        finally:
+            # Place rendue même si le client abandonne le flux
+            if turn.ticket:
+                self._release(*turn.ticket, turn.usage)
+            if usages:
+                turn.usage = merge_usage(usages + [turn.usage])
+        
+        self._record_stream(turn, parts, outcome, finish_reason, continuations)
+    
+    def _first_chunk(self, turn):
+        """Mesurer le délai avant le premier fragment d'un flux"""
+        elapsed = time.time() - turn.start_time
+        metrics.first_chunk.observe(elapsed, turn.model)
+        record("first_chunk", elapsed)
+        api_log.info("stream_first_chunk", extra={"fields": {
+            "model": turn.model,
+            "ttfb_ms": round(elapsed * 1000, 1)
+        }})
     
-    def reset_conversation(self):
-        """Réinitialiser l'historique de conversation"""
-        self.conversation_history = []
+    def _stream_usage(self, turn, chunk):
+        """Relever les tokens consommés, envoyés par Groq dans le dernier fragment"""
+        usage = getattr(getattr(chunk, "x_groq", None), "usage", None)
+        if usage is not None:
+            turn.usage = usage
+    
+    def reset_conversation(self, session_id="default"):
+        """Réinitialiser l'historique de conversation d'une session"""
+        session_id = self._session_key(session_id)
+        self.sessions.reset(session_id)
         
-        welcome_msg = WelcomeAgentConfig.WELCOME_MESSAGES["default"].format(
-            company_name=self.company_name
-        )
+        welcome_msg = self.tenant.welcome_messages["default"].format_map(self.tenant.variables())
         
-        print("🔄 Conversation réinitialisée")
+        agent_log.info("conversation_reset", extra={"fields": {"session_id": session_id}})
         return welcome_msg
     
-    def get_conversation_length(self):
-        """Obtenir le nombre de messages dans la conversation"""
-        return len(self.conversation_history)
+    def get_conversation_length(self, session_id="default"):
+        """Obtenir le nombre de messages dans la conversation d'une session"""
+        return self.sessions.length(self._session_key(session_id))
+    
+    def get_session_stats(self):
+        """Obtenir l'occupation du store de sessions"""
+        return self.sessions.stats()
+    
+    def get_resilience_stats(self):
+        """Obtenir l'état des disjoncteurs et les compteurs de retries/hedging par modèle"""
+        return {model: caller.stats() for model, caller in self.resilience.items()}
+    
+    def get_router_stats(self):
+        """Obtenir les décisions de routage et la santé des modèles"""
+        return self.router.stats() if self.router else {"enabled": False}
+    
+    def get_cache_stats(self):
+        """Obtenir les compteurs du cache de réponses"""
+        return self.cache.stats() if self.cache else {"enabled": False}
+    
+    def get_admission_stats(self):
+        """Obtenir le budget restant et la file d'attente de chaque modèle"""
+        if self.admission is None:
+            return {"enabled": False}
+        return {model: controller.stats() for model, controller in self.admission.items()}
+    
+    def get_knowledge_stats(self):
+        """Taille de l'index de connaissances et nombre de recherches"""
+        if self.knowledge is None:
+            return {"enabled": False}
+        return {"enabled": True, "prompt_tokens": estimate_tokens(self.system_prompt), **self.knowledge.stats()}
+    
+    def get_generation_stats(self):
+        """Paramètres de génération et longueurs observées par type de demande"""
+        if self.policy is None:
+            return {"enabled": False}
+        return {"enabled": True, "policies": self.policy.stats()}
+    
+    def get_speculation_stats(self):
+        """Statistiques des appels spéculatifs"""
+        if self.speculator is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.speculator.stats()}
+    
+    def get_single_flight_stats(self):
+        """Obtenir les compteurs des appels Groq partagés"""
+        return self.single_flight.stats() if self.single_flight else {"enabled": False}
     
     def get_company_info(self):
         """Obtenir les informations de l'entreprise"""
@@ -215,22 +1243,22 @@ Commence toujours par identifier le type de visiteur pour personnaliser tes rép
             "experience": self.company_experience
         }
     
-    def switch_model(self, model_name):
-        """Changer de modèle Groq"""
-        if model_name in GroqConfig.MODELS.values():
-            self.model = model_name
-            print(f"🔄 Modèle changé vers: {model_name}")
+    def switch_model(self, model_name, session_id="default"):
+        """Changer de modèle Groq pour une session (les autres sessions restent routées)"""
+        if model_name in self.tenant.models.values():
+            self.sessions.set_model(self._session_key(session_id), model_name)
+            agent_log.info("model_switched", extra={"fields": {"session_id": session_id, "model": model_name}})
             return True
         else:
-            print(f"❌ Modèle non reconnu: {model_name}")
+            agent_log.warning("unknown_model", extra={"fields": {"model": model_name}})
             return False
     
-    def adjust_creativity(self, temperature):
-        """Ajuster la créativité de l'agent (0.0 à 1.0)"""
+    def adjust_creativity(self, temperature, session_id="default"):
+        """Ajuster la créativité (0.0 à 1.0) pour une session (les autres sessions gardent la leur)"""
         if 0.0 <= temperature <= 1.0:
-            self.temperature = temperature
-            print(f"🎨 Créativité ajustée à: {temperature}")
+            self.sessions.set_temperature(self._session_key(session_id), temperature)
+            agent_log.info("temperature_adjusted", extra={"fields": {"session_id": session_id, "temperature": temperature}})
             return True
         else:
-            print(f"❌ Température invalide: {temperature} (doit être entre 0.0 et 1.0)")
+            agent_log.warning("invalid_temperature", extra={"fields": {"temperature": temperature}})
             return False
\ No newline at end of file
@@ -0,0 +1,500 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, APIRouter, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse, Response
+from dotenv import load_dotenv
+from agents.async_welcome_agent import AsyncWelcomeAgent
+from agents.registry import create_registry
+from agents.admission import AdmissionRejected
+from agents.keyword_matcher import get_content_matcher
+from agents.intent_classifier import get_intent_classifier
+from agents.knowledge import get_knowledge_index
+from config import (
+    Config, load_config, GroqConfig, SessionConfig, MetricsConfig, IntentConfig, KnowledgeConfig,
+    WelcomeAgentConfig, BatchConfig, TracingConfig, TenantConfig
+)
+from security import (
+    check_rate_limit, check_batch_rate_limit, check_batch_token, check_admin_token, admin_enabled,
+    validate_message, client_ip_from, rate_limiter
+)
+from batch import BatchError, parse_batch, item_result, ndjson
+from logging_setup import setup_logging, shutdown_logging, get_logger, new_request_id, logging_stats
+from tracing import span, start_trace, finish_trace, profiler, ProfilerBusy, folded
+import metrics
+
+load_dotenv()
+
+request_log = get_logger("request")
+error_log = get_logger("error")
+
+router = APIRouter()
+
+# Routes de sonde : exclues de la mesure de la première requête
+PROBE_ROUTES = ("/api/health", "/api/health/ready")
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """Créer les agents (et le pool de connexions partagé) au démarrage du worker, le fermer à l'arrêt"""
+    started = time.perf_counter()
+    setup_logging()
+    metrics.setup_metrics()
+    # Agent du site par défaut (ressources partagées) et sites clients de TenantConfig.DIRECTORY
+    app.state.registry = create_registry(AsyncWelcomeAgent)
+    app.state.agent = app.state.registry.default
+    init_seconds = time.perf_counter() - started
+
+    prewarm = await app.state.agent.awarm_up() if GroqConfig.PREWARM else None
+    if prewarm and prewarm["ok"]:
+        metrics.worker_startup.observe(prewarm["ms"] / 1000, "prewarm")
+    metrics.worker_startup.observe(init_seconds, "init")
+    app.state.startup = {
+        "init_ms": round(init_seconds * 1000, 1),
+        "prewarm": prewarm,
+        "first_request_ms": None
+    }
+    request_log.info("worker_ready", extra={"fields": {"init_ms": app.state.startup["init_ms"], "prewarm": prewarm}})
+    yield
+    await app.state.agent.aclose()
+    shutdown_logging()
+
+
+async def request_context(request: Request, call_next):
+    """Attribuer un identifiant à la requête, la journaliser et la mesurer"""
+    request_id = new_request_id(request.headers.get("X-Request-Id"))
+    # La trace est un objet partagé : les étapes chronométrées dans la route y sont visibles
+    trace = start_trace(request_id)
+    start = time.perf_counter()
+    metrics.http_in_flight.inc()
+    try:
+        response = await call_next(request)
+    finally:
+        metrics.http_in_flight.dec()
+    response.headers["X-Request-Id"] = request_id
+    # Identifiant de session renvoyé au client (nouveau ou prolongé)
+    session_id = getattr(request.state, "session_id", None)
+    if session_id:
+        response.headers[SessionConfig.SESSION_HEADER] = session_id
+        response.set_cookie(
+            SessionConfig.SESSION_COOKIE, session_id,
+            max_age=SessionConfig.SESSION_TTL,
+            secure=SessionConfig.COOKIE_SECURE,
+            httponly=True,
+            samesite=SessionConfig.COOKIE_SAMESITE.lower()
+        )
+    timing = finish_trace(trace, request.method, request.url.path, response.status_code)
+    if timing:
+        response.headers["Server-Timing"] = timing
+    if request.method != "OPTIONS":
+        duration = time.perf_counter() - start
+        route = request.scope.get("route")
+        route = route.path if route is not None else "unmatched"
+        metrics.http_requests.inc(route, request.method, response.status_code)
+        metrics.http_duration.observe(duration, route)
+        startup = getattr(request.app.state, "startup", None)
+        if startup and startup["first_request_ms"] is None and route not in PROBE_ROUTES:
+            # Latence de la première requête servie par ce worker (après un scale-up)
+            startup["first_request_ms"] = round(duration * 1000, 2)
+            metrics.worker_startup.observe(duration, "first_request")
+        request_log.info("request", extra={"fields": {
+            "method": request.method,
+            "path": request.url.path,
+            "status": response.status_code,
+            "duration_ms": round(duration * 1000, 2)
+        }})
+    return response
+
+
+def get_client_ip(request):
+    """Obtenir l'IP du client pour le rate limiting"""
+    return client_ip_from(
+        request.headers.get("X-Forwarded-For"),
+        request.client.host if request.client else None
+    )
+
+
+def get_agent(request):
+    """Agent du site client : clé d'API, sinon hôte de l'Origin, sinon en-tête Host (None si inconnu)"""
+    return request.app.state.registry.resolve(
+        request.headers.get(TenantConfig.API_KEY_HEADER),
+        request.headers.get("Origin"),
+        request.headers.get("Host")
+    )
+
+
+def tenant_not_found():
+    return JSONResponse({"error": "Site inconnu"}, status_code=404)
+
+
+def get_session_id(request, data=None, create=True):
+    """Extraire l'identifiant de session (en-tête, corps JSON, query string ou cookie).
+
+    Sans identifiant, un nouveau est créé ; request_context le renvoie au
+    client (en-tête et cookie) pour que la requête suivante retrouve la
+    même conversation.
+    """
+    session_id = request.headers.get(SessionConfig.SESSION_HEADER)
+    if not session_id and isinstance(data, dict):
+        session_id = data.get("session_id")
+    if not session_id:
+        session_id = request.query_params.get("session_id")
+    if not session_id:
+        session_id = request.cookies.get(SessionConfig.SESSION_COOKIE)
+
+    if not session_id or not isinstance(session_id, str) or len(session_id) > 128:
+        if not create:
+            return None
+        session_id = uuid.uuid4().hex
+    request.state.session_id = session_id
+    return session_id
+
+
+async def read_json(request):
+    """Lire le corps JSON de la requête (None s'il est absent ou invalide)"""
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+def rate_limited_response():
+    return JSONResponse({
+        "error": "Trop de requêtes. Veuillez patienter avant de réessayer.",
+        "rate_limit_exceeded": True
+    }, status_code=429)
+
+
+async def parse_chat_request(request):
+    """Extraire et valider le message et la session de la requête.
+
+    Retourne (message, session_id, None) ou (None, None, réponse d'erreur).
+    """
+    with span("parse"):
+        data = await read_json(request)
+
+    if not isinstance(data, dict) or "message" not in data:
+        metrics.validation_failures.inc("missing_message")
+        return None, None, JSONResponse({"error": "Message requis"}, status_code=400)
+
+    user_message = data["message"]
+    with span("validate"):
+        is_valid, error_msg = validate_message(user_message)
+    if not is_valid:
+        return None, None, JSONResponse({"error": error_msg}, status_code=400)
+
+    return user_message, get_session_id(request, data), None
+
+
+def sse_event(data, event=None):
+    """Formater un événement Server-Sent Events"""
+    payload = json.dumps(data, ensure_ascii=False)
+    if event:
+        return f"event: {event}\ndata: {payload}\n\n"
+    return f"data: {payload}\n\n"
+
+
+@router.post("/api/welcome")
+async def chat_with_welcome_agent(request: Request):
+    agent = get_agent(request)
+    if agent is None:
+        return tenant_not_found()
+    if not check_rate_limit(get_client_ip(request)):
+        return rate_limited_response()
+
+    user_message, session_id, error = await parse_chat_request(request)
+    if error:
+        return error
+
+    response = await agent.process_message(user_message, session_id)
+    with span("serialize"):
+        return JSONResponse({
+            "response": response,
+            "session_id": session_id,
+            "timestamp": time.time()
+        })
+
+
+@router.post("/api/welcome/stream")
+async def stream_with_welcome_agent(request: Request):
+    """Variante de /api/welcome qui transmet la réponse au fil de la génération (SSE)"""
+    agent = get_agent(request)
+    if agent is None:
+        return tenant_not_found()
+    if not check_rate_limit(get_client_ip(request)):
+        return rate_limited_response()
+
+    user_message, session_id, error = await parse_chat_request(request)
+    if error:
+        return error
+
+    stream = agent.stream_message(user_message, session_id)
+    # Démarrer le tour avant d'envoyer les en-têtes : un refus d'admission devient un 503
+    first = await anext(stream, None)
+
+    async def generate():
+        try:
+            if first is not None:
+                yield sse_event({"delta": first})
+            async for delta in stream:
+                yield sse_event({"delta": delta})
+        except Exception as e:
+            error_log.error("stream_with_welcome_agent_failed", exc_info=e)
+            yield sse_event({
+                "error": "Erreur interne du serveur. Veuillez réessayer.",
+                "error_type": "server_error"
+            }, event="error")
+            return
+        finally:
+            await stream.aclose()
+        yield sse_event({"session_id": session_id, "timestamp": time.time()}, event="done")
+
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.post("/api/welcome/batch")
+async def batch_with_welcome_agent(request: Request):
+    """Traiter un lot de conversations indépendantes ; un résultat NDJSON par conversation terminée"""
+    if not BatchConfig.ENABLED:
+        return JSONResponse({"error": "Not found"}, status_code=404)
+    agent = get_agent(request)
+    if agent is None:
+        return tenant_not_found()
+    if not check_batch_token(request.headers.get("Authorization")):
+        return JSONResponse({"error": "Jeton invalide"}, status_code=401)
+
+    try:
+        conversations, rejected = parse_batch(await read_json(request))
+    except BatchError as e:
+        return JSONResponse({"error": e.message}, status_code=e.status)
+
+    # Un jeton de rate limiting par message du lot
+    allowed, retry_after = check_batch_rate_limit(
+        get_client_ip(request), sum(len(item.messages) for item in conversations)
+    )
+    if not allowed:
+        return JSONResponse({
+            "error": "Trop de requêtes. Veuillez patienter avant de réessayer.",
+            "rate_limit_exceeded": True
+        }, status_code=429, headers={"Retry-After": str(max(1, int(retry_after + 0.999)))})
+
+    async def generate():
+        started = time.perf_counter()
+        counts = {}
+        for item in rejected:
+            line = item_result(item)
+            counts[line["status"]] = counts.get(line["status"], 0) + 1
+            yield ndjson(line)
+        async for item, responses, error in agent.process_batch(conversations):
+            line = item_result(item, responses, error)
+            counts[line["status"]] = counts.get(line["status"], 0) + 1
+            yield ndjson(line)
+        yield ndjson({
+            "done": True,
+            "conversations": len(conversations) + len(rejected),
+            "statuses": counts,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1)
+        })
+
+    return StreamingResponse(
+        generate(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/api/health")
+async def health_check(request: Request):
+    """Liveness : le processus répond"""
+    return {
+        "status": "OK",
+        "message": "WelcomeAgent backend is running!",
+        "ready": hasattr(request.app.state, "startup"),
+        "config": {
+            "model": GroqConfig.DEFAULT_MODEL,
+            "company": WelcomeAgentConfig.COMPANY_INFO["name"],
+            "version": "1.0.0"
+        }
+    }
+
+
+@router.get("/api/health/ready")
+async def readiness_check(request: Request):
+    """Readiness : worker initialisé et au moins un modèle Groq disponible (503 sinon)"""
+    agent = getattr(request.app.state, "agent", None)
+    available = agent is not None and agent.is_available()
+    return JSONResponse({
+        "status": "ready" if available else "unavailable",
+        "ready": available,
+        "pid": os.getpid(),
+        "startup": getattr(request.app.state, "startup", None)
+    }, status_code=200 if available else 503)
+
+
+@router.post("/api/reset")
+async def reset_conversation(request: Request):
+    """Réinitialiser la conversation"""
+    agent = get_agent(request)
+    if agent is None:
+        return tenant_not_found()
+    if not check_rate_limit(get_client_ip(request)):
+        return JSONResponse({"error": "Trop de requêtes. Veuillez patienter."}, status_code=429)
+
+    session_id = get_session_id(request, await read_json(request))
+    await agent.aload_session(session_id)
+    message = agent.reset_conversation(session_id)
+    return {
+        "response": message,
+        "session_id": session_id,
+        "conversation_reset": True
+    }
+
+
+@router.get("/api/stats")
+async def get_stats(request: Request):
+    """Obtenir des statistiques sur la conversation"""
+    agent = request.app.state.agent
+    session_id = get_session_id(request, create=False)
+    if session_id:
+        await agent.aload_session(session_id)
+    return {
+        "session_id": session_id,
+        "conversation_length": agent.get_conversation_length(session_id) if session_id else 0,
+        "sessions": agent.get_session_stats(),
+        "cache": agent.get_cache_stats(),
+        "resilience": agent.get_resilience_stats(),
+        "router": agent.get_router_stats(),
+        "single_flight": agent.get_single_flight_stats(),
+        "admission": agent.get_admission_stats(),
+        "knowledge": agent.get_knowledge_stats(),
+        "speculation": agent.get_speculation_stats(),
+        "generation": agent.get_generation_stats(),
+        "tenants": request.app.state.registry.stats(),
+        "logging": logging_stats(),
+        "rate_limiter": rate_limiter.stats(),
+        "model_used": agent.model,
+        "company_info": {
+            "name": agent.company_name,
+            "specialties": agent.company_specialties
+        }
+    }
+
+
+@router.get("/api/metrics")
+async def get_metrics():
+    """Métriques au format texte Prometheus"""
+    if not MetricsConfig.ENABLED:
+        return JSONResponse({"error": "Not found"}, status_code=404)
+    return Response(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@router.post("/api/admin/profile")
+async def profile_worker(request: Request):
+    """Profiler le worker qui reçoit la requête pendant N secondes (piles agrégées)"""
+    if not admin_enabled():
+        return JSONResponse({"error": "Not found"}, status_code=404)
+    if not check_admin_token(request.headers.get("Authorization")):
+        return JSONResponse({"error": "Jeton invalide"}, status_code=401)
+
+    try:
+        seconds = float(request.query_params.get("seconds", 10))
+        interval = float(request.query_params.get("interval_ms", TracingConfig.PROFILE_INTERVAL_MS)) / 1000
+    except ValueError:
+        return JSONResponse({"error": "Paramètres invalides"}, status_code=400)
+    if not 0 < seconds <= TracingConfig.PROFILE_MAX_SECONDS or not 0.001 <= interval <= 1:
+        return JSONResponse({
+            "error": f"Durée entre 0 et {TracingConfig.PROFILE_MAX_SECONDS} s, intervalle entre 1 et 1000 ms"
+        }, status_code=400)
+
+    # Échantillonnage dans un thread : la boucle d'événements (profilée) continue de servir
+    try:
+        report = await asyncio.to_thread(profiler.profile, seconds, interval, TracingConfig.PROFILE_MAX_STACKS)
+    except ProfilerBusy as e:
+        return JSONResponse({"error": str(e)}, status_code=409)
+    request_log.info("profile", extra={"fields": {"seconds": report["seconds"], "samples": report["samples"]}})
+
+    if request.query_params.get("format") == "folded":
+        return Response(folded(report), media_type="text/plain")
+    return report
+
+
+async def handle_server_error(request, exc):
+    error_log.error("unhandled_exception", exc_info=exc, extra={"fields": {"path": request.url.path}})
+    return JSONResponse({
+        "error": "Erreur interne du serveur. Veuillez réessayer.",
+        "error_type": "server_error"
+    }, status_code=500)
+
+
+async def handle_overloaded(request, exc):
+    """503 + Retry-After : budget Groq épuisé, la requête est refusée tout de suite"""
+    return JSONResponse({
+        "error": "Service très sollicité. Veuillez réessayer dans quelques instants.",
+        "error_type": "overloaded",
+        "retry_after": exc.retry_after
+    }, status_code=503, headers={"Retry-After": str(exc.retry_after)})
+
+
+class TenantCORSMiddleware(CORSMiddleware):
+    """CORS dont les origines autorisées comprennent les hôtes des sites clients, relus à chaque requête"""
+
+    def __init__(self, app, tenant_origin, **options):
+        super().__init__(app, **options)
+        self.tenant_origin = tenant_origin
+
+    def is_allowed_origin(self, origin):
+        return super().is_allowed_origin(origin) or self.tenant_origin(origin)
+
+
+def create_app():
+    """Construire l'application ASGI (l'agent est créé par lifespan, dans chaque worker)"""
+    if not load_config():
+        raise RuntimeError("Configuration invalide, voir les messages ci-dessus")
+
+    app = FastAPI(title="WelcomeAgent", lifespan=lifespan)
+    def tenant_origin(origin):
+        registry = getattr(app.state, "registry", None)
+        return registry is not None and registry.allows_origin(origin)
+
+    app.add_middleware(
+        TenantCORSMiddleware,
+        tenant_origin=tenant_origin,
+        allow_origins=Config.CORS_ORIGINS,
+        allow_methods=["GET", "POST", "OPTIONS"],
+        allow_headers=[
+            "Content-Type", "Authorization", "X-Request-Id", SessionConfig.SESSION_HEADER, TenantConfig.API_KEY_HEADER
+        ],
+        expose_headers=["X-Request-Id", "Server-Timing", SessionConfig.SESSION_HEADER],
+        allow_credentials=True,
+        max_age=86400
+    )
+    app.middleware("http")(request_context)
+    app.add_exception_handler(AdmissionRejected, handle_overloaded)
+    app.add_exception_handler(Exception, handle_server_error)
+    app.include_router(router)
+
+    # Structures en lecture seule construites une fois, avant le premier tour
+    get_content_matcher()
+    if IntentConfig.ENABLED:
+        get_intent_classifier()
+    if KnowledgeConfig.ENABLED:
+        get_knowledge_index()
+    return app
+
+
+app = create_app()
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    print("Démarrage du serveur WelcomeAgent (ASGI)...")
+    uvicorn.run(app, host=Config.FLASK_HOST, port=Config.FLASK_PORT)
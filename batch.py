@@ -0,0 +1,97 @@
+import json
+import uuid
+from config import BatchConfig
+from security import validate_message
+from agents.admission import AdmissionRejected
+import metrics
+
+
+class BatchError(Exception):
+    """Lot refusé dans son ensemble (corps invalide, lot trop grand)"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+class BatchItem:
+    """Conversation d'un lot : messages envoyés dans l'ordre, dans une même session"""
+
+    __slots__ = ("index", "id", "session_id", "messages", "error")
+
+    def __init__(self, index, item_id=None, session_id=None, messages=None, error=None):
+        self.index = index
+        self.id = item_id
+        self.session_id = session_id
+        self.messages = messages
+        self.error = error
+
+
+def _parse_item(index, entry):
+    """Conversation d'un lot : {"message": ...} ou {"messages": [...]}, id et session_id facultatifs"""
+    if isinstance(entry, str):
+        entry = {"message": entry}
+    if not isinstance(entry, dict):
+        return BatchItem(index, error="Conversation invalide")
+
+    item_id = entry.get("id")
+    messages = entry.get("messages", [entry["message"]] if "message" in entry else None)
+    if not isinstance(messages, list) or not messages:
+        return BatchItem(index, item_id, error="Message requis")
+    if len(messages) > BatchConfig.MAX_MESSAGES_PER_CONVERSATION:
+        return BatchItem(index, item_id, error="Conversation trop longue")
+    for message in messages:
+        is_valid, error_msg = validate_message(message) if isinstance(message, str) else (False, "Message invalide")
+        if not is_valid:
+            return BatchItem(index, item_id, error=error_msg)
+
+    session_id = entry.get("session_id")
+    if not session_id or not isinstance(session_id, str) or len(session_id) > 128:
+        session_id = uuid.uuid4().hex
+    return BatchItem(index, item_id, session_id, messages)
+
+
+def parse_batch(data):
+    """Valider le corps d'une requête de lot : retourne (conversations valides, conversations rejetées)"""
+    conversations = data.get("conversations") if isinstance(data, dict) else None
+    if not isinstance(conversations, list) or not conversations:
+        raise BatchError("Liste de conversations requise")
+    if len(conversations) > BatchConfig.MAX_CONVERSATIONS:
+        raise BatchError(f"Lot trop volumineux ({BatchConfig.MAX_CONVERSATIONS} conversations maximum)", 413)
+
+    items, rejected = [], []
+    for index, entry in enumerate(conversations):
+        item = _parse_item(index, entry)
+        (rejected if item.error else items).append(item)
+
+    if sum(len(item.messages) for item in items) > BatchConfig.MAX_MESSAGES:
+        raise BatchError(f"Lot trop volumineux ({BatchConfig.MAX_MESSAGES} messages maximum)", 413)
+    return items, rejected
+
+
+def item_result(item, responses=None, error=None):
+    """Résultat d'une conversation (une ligne NDJSON) ; les erreurs restent propres à la conversation"""
+    line = {"index": item.index, "id": item.id, "session_id": item.session_id}
+    if responses:
+        line["responses"] = responses
+    error = error or item.error
+    if error is None:
+        status = "ok"
+    elif isinstance(error, str):
+        status = "validation"
+        line["error"] = error
+    elif isinstance(error, AdmissionRejected):
+        status = "overloaded"
+        line["error"] = "Service très sollicité. Veuillez réessayer dans quelques instants."
+        line["retry_after"] = error.retry_after
+    else:
+        status = "error"
+        line["error"] = "Erreur interne du serveur. Veuillez réessayer."
+    line["status"] = status
+    metrics.batch_items.inc(status)
+    return line
+
+
+def ndjson(data):
+    return json.dumps(data, ensure_ascii=False) + "\n"
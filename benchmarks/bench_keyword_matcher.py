@@ -0,0 +1,72 @@
+"""Micro-benchmark du détecteur de mots-clés.
+
+Compare le scan naïf (une recherche de sous-chaîne par mot-clé) au
+KeywordMatcher précompilé quand les listes de mots-clés grandissent.
+
+Usage : python -m benchmarks.bench_keyword_matcher [--sizes 15 100 1000 10000]
+"""
+import argparse
+import random
+import timeit
+from agents.keyword_matcher import KeywordMatcher
+from config import WelcomeAgentConfig
+
+MESSAGES = [
+    "Bonjour, je voudrais un devis pour la construction d'une maison à Yaoundé.",
+    "Quels sont vos délais pour une rénovation complète de toiture ?",
+    "Est-ce que vous faites aussi la charpente et la couverture en tuiles ?",
+    "Je cherche un partenaire pour sous-traiter le gros œuvre d'un immeuble R+4.",
+    "Pouvez-vous me conseiller sur le choix entre béton armé et parpaings ?",
+    "Quelle est votre opinion sur les prochaines élections présidentielles ?",
+    "Bonjour",
+    "Je suis architecte et je souhaiterais échanger sur une collaboration possible.",
+]
+
+SYLLABLES = ["ba", "ti", "ment", "con", "struc", "tion", "ré", "no", "va", "mur",
+             "dal", "le", "pou", "tre", "fer", "rail", "lage", "cré", "pi", "sol"]
+
+
+def synthetic_keywords(count, seed=42):
+    """Générer des mots-clés plausibles (et absents des messages de test)"""
+    rng = random.Random(seed)
+    keywords = set()
+    while len(keywords) < count:
+        word = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(3, 5)))
+        if rng.random() < 0.2:
+            word += " " + "".join(rng.choice(SYLLABLES) for _ in range(2))
+        keywords.add(word)
+    return list(keywords)
+
+
+def naive_scan(keywords):
+    def scan(message):
+        message_lower = message.lower()
+        return any(keyword in message_lower for keyword in keywords)
+    return scan
+
+
+def bench(func, number):
+    total = min(timeit.repeat(lambda: [func(m) for m in MESSAGES], number=number, repeat=5))
+    return total / (number * len(MESSAGES)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[15, 100, 1000, 5000, 20000])
+    parser.add_argument("--number", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'mots-clés':>10} {'naïf (µs)':>12} {'matcher (µs)':>14} {'compilation (ms)':>18}")
+    for size in args.sizes:
+        keywords = WelcomeAgentConfig.BTP_KEYWORDS + synthetic_keywords(size)
+        start = timeit.default_timer()
+        matcher = KeywordMatcher({"btp": keywords})
+        build_ms = (timeit.default_timer() - start) * 1e3
+
+        naive_us = bench(naive_scan(keywords), max(1, args.number * 15 // size))
+        matcher_us = bench(lambda m: matcher.categories(m), args.number)
+        print(f"{size:>10} {naive_us:>12.2f} {matcher_us:>14.2f} {build_ms:>18.2f}")
+
+
+if __name__ == "__main__":
+    main()
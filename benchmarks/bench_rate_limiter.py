@@ -0,0 +1,53 @@
+"""Micro-benchmark du limiteur de débit.
+
+Mesure le coût d'une vérification quand des dizaines de milliers de
+clients sont suivis, pour chaque backend.
+
+Usage : python -m benchmarks.bench_rate_limiter [--clients 10000 50000]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from rate_limiter import MemoryBackend, RateLimiter, SQLiteBackend
+
+
+def make_backend(name, clients, directory):
+    if name == "sqlite":
+        return SQLiteBackend(os.path.join(directory, f"bench_{clients}.db"), idle_ttl=3600)
+    return MemoryBackend(max_clients=clients * 2, idle_ttl=3600)
+
+
+def bench(limiter, clients, checks):
+    keys = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(clients)]
+    # Remplir la table des clients suivis
+    for key in keys:
+        limiter.check(key)
+
+    rng = random.Random(1)
+    sample = [rng.choice(keys) for _ in range(checks)]
+    start = time.perf_counter()
+    for key in sample:
+        limiter.check(key)
+    return (time.perf_counter() - start) / checks * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--checks", type=int, default=20000)
+    parser.add_argument("--backends", nargs="+", default=["memory", "sqlite"])
+    args = parser.parse_args()
+
+    print(f"{'backend':>8} {'clients':>9} {'µs/vérification':>16}")
+    with tempfile.TemporaryDirectory() as directory:
+        for name in args.backends:
+            for clients in args.clients:
+                limiter = RateLimiter(make_backend(name, clients, directory), per_minute=30)
+                per_check = bench(limiter, clients, args.checks)
+                print(f"{name:>8} {clients:>9} {per_check:>16.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""Serveur local imitant l'API chat-completions de Groq.
+
+Latence avant le premier token, débit de tokens, flux SSE et injection
+d'erreurs configurables : l'application s'y connecte via GROQ_BASE_URL,
+sans consommer de quota.
+
+Usage : python -m benchmarks.fake_groq --port 8790 --latency lognormal:0.4,0.5 --tokens-per-second 400
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from agents.tokens import estimate_messages_tokens
+
+WORDS = (
+    "Nous réalisons vos travaux de construction, de rénovation et de gros œuvre "
+    "avec des équipes qualifiées. Contactez-nous pour un devis gratuit adapté à votre projet "
+    "de maison, d'immeuble ou de voirie, nous intervenons rapidement sur vos chantiers."
+).split()
+
+
+def parse_distribution(spec):
+    """Distribution de latence (secondes) : const:0.3, uniform:0.1,0.5 ou lognormal:mediane,sigma"""
+    kind, _, args = spec.partition(":")
+    values = [float(value) for value in args.split(",")] if args else []
+    if kind == "const":
+        return lambda rng: values[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "lognormal":
+        median, sigma = values
+        return lambda rng: median * rng.lognormvariate(0.0, sigma)
+    raise argparse.ArgumentTypeError(f"distribution inconnue : {spec}")
+
+
+class Behaviour:
+    """Comportement simulé du serveur (partagé par les threads de requête)"""
+
+    def __init__(self, latency, tokens_per_second, completion_tokens, error_rate, error_statuses,
+                 hang_rate, hang_seconds, seed=None):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.completion_tokens = completion_tokens
+        self.error_rate = error_rate
+        self.error_statuses = error_statuses
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counters = {"requests": 0, "streams": 0, "errors": 0, "hangs": 0}
+
+    def draw(self):
+        """Tirer le scénario d'une requête : (erreur, blocage, latence, nombre de tokens)"""
+        with self._lock:
+            rng = self._rng
+            self.counters["requests"] += 1
+            error = rng.choice(self.error_statuses) if rng.random() < self.error_rate else None
+            hang = rng.random() < self.hang_rate
+            latency = max(0.0, self.latency(rng))
+            tokens = max(1, int(rng.uniform(0.5, 1.5) * self.completion_tokens))
+            if error:
+                self.counters["errors"] += 1
+            if hang:
+                self.counters["hangs"] += 1
+            return error, hang, latency, tokens
+
+
+class FakeGroqHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    behaviour = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/stats":
+            self._send_json(200, self.behaviour.counters)
+        elif self.path.endswith("/models"):
+            # Utilisé par le pré-chauffage des workers
+            self._send_json(200, {"object": "list", "data": [
+                {"id": "fake", "object": "model", "created": 0, "owned_by": "fake"}
+            ]})
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": {"message": "invalid json", "type": "invalid_request_error"}})
+            return
+        if not self.path.endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+
+        behaviour = self.behaviour
+        error, hang, latency, tokens = behaviour.draw()
+        if hang:
+            time.sleep(behaviour.hang_seconds)
+        time.sleep(latency)
+        if error:
+            headers = {"Retry-After": "1"} if error == 429 else None
+            self._send_json(error, {"error": {"message": f"injected {error}", "type": "fake_error"}}, headers)
+            return
+
+        max_tokens = payload.get("max_tokens") or tokens
+        finish_reason = "length" if tokens > max_tokens else "stop"
+        words = [WORDS[i % len(WORDS)] for i in range(min(tokens, max_tokens))]
+        usage = {
+            "prompt_tokens": estimate_messages_tokens(payload.get("messages", [])),
+            "completion_tokens": len(words),
+            "total_tokens": 0
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        model = payload.get("model", "fake")
+
+        if payload.get("stream"):
+            self._stream(completion_id, model, words, finish_reason, usage)
+            return
+
+        if behaviour.tokens_per_second:
+            time.sleep(len(words) / behaviour.tokens_per_second)
+        self._send_json(200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": " ".join(words)},
+                "logprobs": None,
+                "finish_reason": finish_reason
+            }],
+            "usage": usage
+        })
+
+    def _stream(self, completion_id, model, words, finish_reason, usage):
+        with self.behaviour._lock:
+            self.behaviour.counters["streams"] += 1
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def chunk(delta, finish=None, extra=None):
+            data = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "logprobs": None, "finish_reason": finish}]
+            }
+            if extra:
+                data.update(extra)
+            self.wfile.write(f"data: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        interval = 1.0 / self.behaviour.tokens_per_second if self.behaviour.tokens_per_second else 0.0
+        try:
+            chunk({"role": "assistant", "content": ""})
+            for index, word in enumerate(words):
+                chunk({"content": word if index == 0 else f" {word}"})
+                if interval:
+                    time.sleep(interval)
+            chunk({}, finish_reason, {"x_groq": {"id": completion_id, "usage": usage}})
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # Le client a abandonné le flux
+            pass
+
+
+def create_server(host, port, behaviour):
+    handler = type("Handler", (FakeGroqHandler,), {"behaviour": behaviour})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8790)
+    parser.add_argument("--latency", type=parse_distribution, default=parse_distribution("lognormal:0.3,0.5"),
+                        help="délai avant le premier token (const:, uniform:, lognormal:)")
+    parser.add_argument("--tokens-per-second", type=float, default=500.0)
+    parser.add_argument("--completion-tokens", type=int, default=120, help="longueur moyenne des réponses")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, nargs="+", default=[500, 503, 429])
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="part des requêtes qui ne répondent pas à temps")
+    parser.add_argument("--hang-seconds", type=float, default=60.0)
+    parser.add_argument("--seed", type=int)
+    return parser
+
+
+def behaviour_from_args(args):
+    return Behaviour(
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens,
+        error_rate=args.error_rate,
+        error_statuses=args.error_status,
+        hang_rate=args.hang_rate,
+        hang_seconds=args.hang_seconds,
+        seed=args.seed
+    )
+
+
+def main():
+    args = build_parser().parse_args()
+    server = create_server(args.host, args.port, behaviour_from_args(args))
+    print(f"Faux Groq sur http://{args.host}:{args.port} (GROQ_BASE_URL)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+"""Micro-benchmarks du chemin critique d'une requête, dans le processus.
+
+Mesure ce qui s'exécute à chaque requête, sans réseau (client Groq
+factice) : rate limiting avec de grandes tables de clients, validation
+et détection des sujets à rediriger sur des messages réels quand les
+listes de mots-clés grandissent, construction des messages envoyés à
+Groq, tour complet de l'agent et sérialisation JSON des réponses.
+
+Les résultats (µs par opération, meilleure série et médiane) peuvent être
+écrits en JSON ; --baseline compare l'exécution à un fichier précédent et
+--compare compare deux fichiers sans rien mesurer. Le code de sortie vaut
+1 si même la meilleure série d'un cas est plus lente de --threshold % que la
+médiane de référence : un écart de médianes plus petit que la dispersion
+d'une exécution est du bruit. Une exécution --quick ne conclut jamais.
+
+Usage :
+  python -m benchmarks.hot_path --json avant.json
+  python -m benchmarks.hot_path --json apres.json --baseline avant.json
+  python -m benchmarks.hot_path --compare avant.json apres.json --threshold 15
+  python -m benchmarks.hot_path --only validate redirect --quick
+"""
+import os
+
+# Avant les imports de l'application : pas de clé réelle, pas de fichier de log
+os.environ.setdefault("GROQ_API_KEY", "gsk_fake_benchmark_key")
+os.environ.setdefault("LOG_FILE", "")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("RESPONSE_CACHE_ENABLED", "false")
+os.environ.setdefault("ADMISSION_ENABLED", "false")
+os.environ.setdefault("HISTORY_SUMMARY_ENABLED", "false")
+os.environ.setdefault("SPECULATION_ENABLED", "false")
+
+import argparse
+import contextlib
+import io
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import timeit
+from types import SimpleNamespace
+from flask import Flask, jsonify
+from config import SecurityConfig, WelcomeAgentConfig
+from agents.keyword_matcher import KeywordMatcher
+from agents.text import tokenize
+from agents.welcome_agent import WelcomeAgent
+from batch import ndjson
+from benchmarks.bench_keyword_matcher import synthetic_keywords
+from benchmarks.load_test import DEFAULT_TRAFFIC, ROOT
+from rate_limiter import MemoryBackend, RateLimiter
+import security
+
+
+class StubCompletions:
+    """chat.completions factice : réponse fixe, mêmes arguments que le client Groq"""
+
+    RESPONSE = (
+        "Nous réalisons vos travaux de construction et de rénovation. "
+        "Contactez-nous pour un devis gratuit adapté à votre projet."
+    )
+
+    def create(self, messages, model, stream=False, timeout=None, extra_headers=None, **params):
+        usage = SimpleNamespace(prompt_tokens=sum(len(m["content"]) // 4 for m in messages),
+                                completion_tokens=24, total_tokens=0)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(role="assistant", content=self.RESPONSE),
+                                     finish_reason="stop")],
+            usage=usage,
+        )
+
+
+class StubClient:
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=StubCompletions())
+
+
+class StubAgent(WelcomeAgent):
+    """WelcomeAgent complet dont seul le client Groq est remplacé"""
+
+    def _create_client(self):
+        return StubClient()
+
+
+def load_messages(path=DEFAULT_TRAFFIC):
+    """Messages de visiteurs réels du fichier de trafic des tests de charge"""
+    with open(path, encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    return [entry["message"] for entry in entries if entry.get("message")]
+
+
+def measure(func, number, repeat):
+    """µs par appel de func : (meilleure série, médiane des séries)"""
+    runs = timeit.repeat(func, number=number, repeat=repeat)
+    return min(runs) / number * 1e6, statistics.median(runs) / number * 1e6
+
+
+def calibrate(func, target=0.05):
+    """Nombre d'appels pour qu'une série dure environ `target` secondes"""
+    number = 1
+    while True:
+        elapsed = timeit.timeit(func, number=number)
+        if elapsed >= target / 10 or number >= 1_000_000:
+            return max(1, int(number * target / max(elapsed, 1e-9)))
+        number *= 10
+
+
+def growing_matcher(size):
+    """Matcher des listes de la configuration, chacune allongée de `size` mots-clés absents des messages"""
+    extra = synthetic_keywords(size) if size else []
+    return KeywordMatcher({
+        "blocked": SecurityConfig.BLOCKED_WORDS + extra,
+        "forbidden": WelcomeAgentConfig.FORBIDDEN_TOPICS + extra,
+        "btp": WelcomeAgentConfig.BTP_KEYWORDS + extra,
+    })
+
+
+def history_of(turns, messages):
+    history = []
+    for index in range(turns):
+        history.append({"role": "user", "content": messages[index % len(messages)]})
+        history.append({"role": "assistant", "content": StubCompletions.RESPONSE})
+    return history
+
+
+def cases(agent, messages, args):
+    """Cas mesurés : (nom, paramètres, fonction sans argument, opérations par appel)"""
+    # Rate limiting : table pré-remplie de `clients` adresses, vérifications tirées dans la table
+    for clients in args.clients:
+        limiter = RateLimiter(MemoryBackend(max_clients=clients * 2, idle_ttl=3600), per_minute=10 ** 9)
+        keys = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(clients)]
+        for key in keys:
+            limiter.check(key)
+        sample = keys[::max(1, clients // 1000)]
+
+        def check(limiter=limiter, sample=sample):
+            security.rate_limiter = limiter
+            for key in sample:
+                security.check_rate_limit(key)
+        yield "check_rate_limit", {"clients": clients}, check, len(sample)
+
+    # Validation et redirection : mêmes messages, listes de mots-clés de plus en plus longues
+    for size in args.keywords:
+        matcher = growing_matcher(size)
+
+        def validate(matcher=matcher):
+            security.content_matcher = matcher
+            for message in messages:
+                security.validate_message(message)
+        yield "validate_message", {"extra_keywords": size}, validate, len(messages)
+
+        def redirect(matcher=matcher):
+            agent.matcher = matcher
+            for message in messages:
+                agent._should_redirect(message)
+        yield "should_redirect", {"extra_keywords": size}, redirect, len(messages)
+
+    # Messages envoyés à Groq : prompt système, extraits de la base, résumé, historique
+    knowledge = agent._retrieve_knowledge(tokenize(messages[0]), []) if agent.knowledge else ""
+    for turns in args.history:
+        history = history_of(turns, messages)
+        yield "build_messages", {"history_turns": turns}, \
+            lambda history=history: agent._build_messages(history, "Résumé de la conversation.", knowledge), 1
+
+    # Tour complet de l'agent (intention, redirection, historique, extraits, routage, appel factice)
+    agent.matcher = growing_matcher(0)
+    security.content_matcher = agent.matcher
+    counter = iter(range(10 ** 9))
+
+    def respond():
+        session = f"bench-{next(counter) % 64}"
+        for message in messages[:8]:
+            agent.respond(message, session)
+    yield "agent_respond", {"messages": 8}, respond, 8
+
+    # Sérialisation des réponses
+    payload = {"response": StubCompletions.RESPONSE * 3, "session_id": "5f0c1b2e9a7d4c3b8e6f1a2d3c4b5a69",
+               "timestamp": time.time()}
+    # Contexte d'application ouvert comme pendant une requête Flask
+    with Flask(__name__).app_context():
+        yield "serialize_jsonify", {}, lambda: jsonify(payload), 1
+    yield "serialize_ndjson", {}, lambda: ndjson(payload), 1
+    try:
+        from fastapi.responses import JSONResponse
+    except ImportError:
+        return
+    yield "serialize_jsonresponse", {}, lambda: JSONResponse(payload), 1
+
+
+def case_key(name, params):
+    if not params:
+        return name
+    return f"{name}[{','.join(f'{key}={value}' for key, value in params.items())}]"
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    messages = load_messages(args.traffic)
+    # Affichages de démarrage de l'agent hors de la sortie du benchmark
+    with contextlib.redirect_stdout(io.StringIO()):
+        agent = StubAgent()
+    saved = security.rate_limiter, security.content_matcher
+
+    results = []
+    print(f"{'cas':<44} {'µs/op (min)':>12} {'médiane':>10}")
+    try:
+        for name, params, func, operations in cases(agent, messages, args):
+            key = case_key(name, params)
+            if args.only and not any(pattern in key for pattern in args.only):
+                continue
+            func()
+            number = calibrate(func, args.target)
+            best, median = measure(func, number, args.repeat)
+            row = {
+                "case": key, "name": name, "params": params,
+                "us_per_op": round(best / operations, 4),
+                "median_us_per_op": round(median / operations, 4),
+                "calls": number, "repeat": args.repeat,
+            }
+            results.append(row)
+            print(f"{key:<44} {row['us_per_op']:>12.3f} {row['median_us_per_op']:>10.3f}")
+    finally:
+        security.rate_limiter, security.content_matcher = saved
+
+    return {
+        "meta": {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.time(),
+            "quick": args.quick,
+        },
+        "results": results,
+    }
+
+
+def compare(baseline, current, threshold):
+    """Afficher les écarts de médiane entre deux exécutions ; retourne les cas ralentis au-delà du seuil.
+
+    Un cas n'est une régression que si sa meilleure série dépasse la médiane
+    de référence de plus du seuil ; une médiane au-delà du seuil sans cela
+    est marquée comme bruit.
+    """
+    before = {row["case"]: row for row in baseline["results"]}
+    regressions = []
+    print(f"{'cas (médianes µs/op)':<44} {'avant':>10} {'après':>10} {'écart':>9}")
+    for row in current["results"]:
+        old = before.get(row["case"])
+        if old is None:
+            print(f"{row['case']:<44} {'-':>10} {row['median_us_per_op']:>10.3f} {'nouveau':>9}")
+            continue
+        reference = old["median_us_per_op"]
+        change = (row["median_us_per_op"] / reference - 1) * 100 if reference else 0.0
+        floor = (row["us_per_op"] / reference - 1) * 100 if reference else 0.0
+        flag = ""
+        if change > threshold:
+            if floor > threshold:
+                regressions.append(row["case"])
+                flag = "  <- régression"
+            else:
+                flag = "  (bruit)"
+        print(f"{row['case']:<44} {reference:>10.3f} {row['median_us_per_op']:>10.3f} {change:>+8.1f}%{flag}")
+    print(f"révisions : {baseline['meta'].get('revision')} -> {current['meta'].get('revision')}")
+    return regressions
+
+
+def gate(baseline, current, threshold):
+    """Code de sortie de la comparaison (0 si l'une des exécutions est --quick)"""
+    regressions = compare(baseline, current, threshold)
+    if baseline["meta"].get("quick") or current["meta"].get("quick"):
+        print("exécution --quick : comparaison indicative, sans code d'échec")
+        return 0
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--keywords", type=int, nargs="+", default=[0, 1000, 10000],
+                        help="mots-clés ajoutés à chaque liste")
+    parser.add_argument("--history", type=int, nargs="+", default=[0, 10, 40], help="tours d'historique")
+    parser.add_argument("--traffic", default=DEFAULT_TRAFFIC, help="fichier de trafic (messages mesurés)")
+    parser.add_argument("--only", nargs="+", help="ne mesurer que les cas dont le nom contient ces motifs")
+    parser.add_argument("--repeat", type=int, default=15, help="séries par cas")
+    parser.add_argument("--target", type=float, default=0.05, help="durée visée d'une série (secondes)")
+    parser.add_argument("--quick", action="store_true", help="séries courtes (contrôle rapide, sans code d'échec)")
+    parser.add_argument("--json", help="écrire les résultats dans ce fichier")
+    parser.add_argument("--baseline", help="comparer l'exécution à ce fichier de résultats")
+    parser.add_argument("--compare", nargs=2, metavar=("AVANT", "APRES"),
+                        help="comparer deux fichiers de résultats sans rien mesurer")
+    parser.add_argument("--threshold", type=float, default=10.0, help="ralentissement toléré (%%)")
+    args = parser.parse_args()
+
+    if args.compare:
+        files = []
+        for path in args.compare:
+            with open(path, encoding="utf-8") as f:
+                files.append(json.load(f))
+        sys.exit(gate(*files, args.threshold))
+
+    if args.quick:
+        args.repeat, args.target = 3, 0.01
+    report = run(args)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print()
+        sys.exit(gate(baseline, report, args.threshold))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+"""Test de charge de l'API contre le faux serveur Groq.
+
+Rejoue un fichier de trafic (une requête JSON par ligne : session, endpoint,
+message, think_ms) avec N visiteurs simultanés, et mesure débit et latences
+p50/p95/p99 par endpoint pour chaque nombre de workers et de threads.
+
+Usage :
+  python -m benchmarks.load_test --server gunicorn --workers 1 2 4 --threads 4 8
+  python -m benchmarks.load_test --server uvicorn --workers 1 2
+  python -m benchmarks.load_test --url http://127.0.0.1:10000   (serveur déjà lancé)
+"""
+import argparse
+import json
+import os
+import queue
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+import httpx
+from benchmarks.fake_groq import build_parser as fake_groq_parser, behaviour_from_args, create_server
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_TRAFFIC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "traffic.jsonl")
+
+
+def load_traffic(path):
+    """Requêtes du fichier de trafic regroupées par session, dans l'ordre"""
+    sessions = OrderedDict()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                sessions.setdefault(entry["session"], []).append(entry)
+    return list(sessions.values())
+
+
+def percentile(samples, q):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class Visitor:
+    """Rejoue les requêtes d'une session ; chaque visiteur a sa propre IP (X-Forwarded-For)"""
+
+    def __init__(self, base_url, requests_, session_id, ip, think, timeout):
+        self.base_url = base_url
+        self.requests = requests_
+        self.session_id = session_id
+        self.ip = ip
+        self.think = think
+        self.timeout = timeout
+
+    def run(self, http, results):
+        headers = {"X-Forwarded-For": self.ip, "X-Session-Id": self.session_id}
+        for entry in self.requests:
+            if self.think and entry.get("think_ms"):
+                time.sleep(entry["think_ms"] / 1000)
+            endpoint = entry["endpoint"]
+            body = {"session_id": self.session_id}
+            if "message" in entry:
+                body["message"] = entry["message"]
+
+            started = time.perf_counter()
+            first_byte = None
+            try:
+                with http.stream("POST", self.base_url + endpoint, json=body, headers=headers,
+                                 timeout=self.timeout) as response:
+                    for _ in response.iter_raw():
+                        if first_byte is None:
+                            first_byte = time.perf_counter() - started
+                status = response.status_code
+            except httpx.HTTPError:
+                status = 0
+            results.append((endpoint, status, time.perf_counter() - started, first_byte))
+
+
+def run_load(base_url, sessions, concurrency, repeat=1, think=False, timeout=60):
+    """Rejouer le trafic avec `concurrency` visiteurs simultanés ; retourne (résultats, durée)"""
+    visitors = queue.Queue()
+    for round_ in range(repeat):
+        for index, entries in enumerate(sessions):
+            number = round_ * len(sessions) + index
+            visitors.put(Visitor(
+                base_url, entries,
+                session_id=f"{entries[0]['session']}-{round_}",
+                ip=f"10.{number >> 16 & 255}.{number >> 8 & 255}.{number & 255}",
+                think=think,
+                timeout=timeout
+            ))
+
+    results = []
+
+    def worker():
+        with httpx.Client() as http:
+            while True:
+                try:
+                    visitor = visitors.get_nowait()
+                except queue.Empty:
+                    return
+                visitor.run(http, results)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, time.perf_counter() - started
+
+
+def summarize(results, elapsed):
+    """Débit et percentiles par endpoint"""
+    by_endpoint = OrderedDict()
+    for endpoint, status, latency, first_byte in results:
+        by_endpoint.setdefault(endpoint, []).append((status, latency, first_byte))
+
+    summary = {}
+    for endpoint, samples in by_endpoint.items():
+        latencies = [latency for status, latency, _ in samples if 200 <= status < 300]
+        first_bytes = [first_byte for _, _, first_byte in samples if first_byte is not None]
+        summary[endpoint] = {
+            "requests": len(samples),
+            "errors": sum(1 for status, _, _ in samples if not 200 <= status < 500 and status != 503),
+            "shed": sum(1 for status, _, _ in samples if status == 503),
+            "rejected": sum(1 for status, _, _ in samples if 400 <= status < 500),
+            "rps": round(len(samples) / elapsed, 2),
+            "p50_ms": _ms(percentile(latencies, 0.50)),
+            "p95_ms": _ms(percentile(latencies, 0.95)),
+            "p99_ms": _ms(percentile(latencies, 0.99)),
+            "ttfb_p50_ms": _ms(percentile(first_bytes, 0.50)),
+        }
+    return summary
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+def print_summary(label, summary, elapsed):
+    print(f"\n== {label} ({elapsed:.1f} s)")
+    print(f"{'endpoint':<22} {'req':>6} {'err':>5} {'4xx':>5} {'503':>5} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'ttfb50':>8}")
+    for endpoint, row in summary.items():
+        cells = [row["p50_ms"], row["p95_ms"], row["p99_ms"], row["ttfb_p50_ms"]]
+        cells = " ".join(f"{'-' if cell is None else cell:>8}" for cell in cells)
+        print(f"{endpoint:<22} {row['requests']:>6} {row['errors']:>5} {row['rejected']:>5} {row['shed']:>5} {row['rps']:>8} {cells}")
+
+
+def server_command(server, port, workers, threads):
+    if server == "gunicorn":
+        return [shutil.which("gunicorn") or "gunicorn", "-c", "gunicorn.conf.py", "main:app", "-b", f"127.0.0.1:{port}",
+                "-w", str(workers), "-k", "gthread", "--threads", str(threads)]
+    if server == "uvicorn":
+        return [sys.executable, "-m", "uvicorn", "asgi:app", "--host", "127.0.0.1", "--port", str(port),
+                "--workers", str(workers), "--no-access-log"]
+    raise ValueError(f"serveur inconnu : {server}")
+
+
+def start_app(server, workers, threads, groq_url, cache, metrics_dir, **extra_env):
+    """Lancer l'application pointée sur le faux Groq et attendre qu'elle soit prête"""
+    port = free_port()
+    env = dict(
+        os.environ,
+        GROQ_API_KEY=os.environ.get("GROQ_API_KEY", "gsk_fake_benchmark_key"),
+        GROQ_BASE_URL=groq_url,
+        LOG_FILE="",
+        LOG_LEVEL="WARNING",
+        METRICS_MULTIPROC_DIR=metrics_dir,
+        RESPONSE_CACHE_ENABLED="true" if cache else "false",
+        **extra_env
+    )
+    process = subprocess.Popen(server_command(server, port, workers, threads), cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{server} s'est arrêté au démarrage (code {process.returncode})")
+        try:
+            if httpx.get(base_url + "/api/health/ready", timeout=1).is_success:
+                return process, base_url
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"{server} ne répond pas sur {base_url}")
+
+
+def stop_app(process):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--traffic", default=DEFAULT_TRAFFIC)
+    parser.add_argument("--url", help="serveur déjà lancé (sinon --server est démarré pour chaque configuration)")
+    parser.add_argument("--server", choices=["gunicorn", "uvicorn"], default="gunicorn")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2])
+    parser.add_argument("--threads", type=int, nargs="+", default=[4])
+    parser.add_argument("--concurrency", type=int, default=32, help="visiteurs simultanés")
+    parser.add_argument("--repeat", type=int, default=10, help="passes sur le fichier de trafic")
+    parser.add_argument("--think", action="store_true", help="respecter les pauses think_ms entre messages")
+    parser.add_argument("--cache", action="store_true", help="laisser le cache de réponses actif")
+    parser.add_argument("--admission", action="store_true",
+                        help="laisser le contrôle d'admission actif (quotas GROQ_RPM_LIMIT / GROQ_TPM_LIMIT)")
+    parser.add_argument("--json", help="écrire les résultats dans ce fichier")
+    parser.add_argument("--groq", nargs=argparse.REMAINDER, default=[],
+                        help="options du faux Groq (voir python -m benchmarks.fake_groq -h)")
+    args = parser.parse_args()
+
+    sessions = load_traffic(args.traffic)
+    report = []
+
+    if args.url:
+        results, elapsed = run_load(args.url, sessions, args.concurrency, args.repeat, args.think)
+        summary = summarize(results, elapsed)
+        print_summary(args.url, summary, elapsed)
+        report.append({"url": args.url, "concurrency": args.concurrency, "endpoints": summary})
+    else:
+        groq_args = fake_groq_parser().parse_args(args.groq)
+        fake = create_server("127.0.0.1", free_port(), behaviour_from_args(groq_args))
+        threading.Thread(target=fake.serve_forever, daemon=True).start()
+        groq_url = f"http://127.0.0.1:{fake.server_address[1]}"
+
+        threads_options = args.threads if args.server == "gunicorn" else [1]
+        try:
+            for workers in args.workers:
+                for threads in threads_options:
+                    with tempfile.TemporaryDirectory() as metrics_dir:
+                        process, base_url = start_app(
+                            args.server, workers, threads, groq_url, args.cache, metrics_dir,
+                            ADMISSION_ENABLED="true" if args.admission else "false",
+                            WEB_CONCURRENCY=str(workers)
+                        )
+                        try:
+                            results, elapsed = run_load(base_url, sessions, args.concurrency, args.repeat, args.think)
+                        finally:
+                            stop_app(process)
+                    label = f"{args.server} workers={workers}" + (f" threads={threads}" if args.server == "gunicorn" else "")
+                    summary = summarize(results, elapsed)
+                    print_summary(label, summary, elapsed)
+                    report.append({
+                        "server": args.server, "workers": workers, "threads": threads,
+                        "concurrency": args.concurrency, "endpoints": summary
+                    })
+        finally:
+            fake.shutdown()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
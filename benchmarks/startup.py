@@ -0,0 +1,123 @@
+"""Mesure du démarrage à froid de l'API contre le faux Groq.
+
+Pour chaque lancement : temps d'import de l'application, délai jusqu'à ce
+que /api/health/ready réponde 200, latence de la première requête
+/api/welcome puis médiane des suivantes. --compare relance avec et sans
+pré-chauffage de la connexion Groq (GROQ_PREWARM).
+
+Usage :
+  python -m benchmarks.startup --server gunicorn --workers 2 --runs 3
+  python -m benchmarks.startup --server uvicorn --compare --groq --latency const:0.05
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import httpx
+from benchmarks.fake_groq import build_parser as fake_groq_parser, behaviour_from_args, create_server
+from benchmarks.load_test import ROOT, free_port, server_command, stop_app
+
+
+def import_time(module, env):
+    """Durée d'import du module (création de l'application comprise), dans un processus neuf"""
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, check=True,
+                            capture_output=True, text=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def cold_start(server, workers, threads, env, requests_after=5, timeout=60):
+    """Lancer le serveur et mesurer (prêt, première requête, requêtes suivantes) en secondes"""
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    process = subprocess.Popen(server_command(server, port, workers, threads), cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        ready = None
+        deadline = time.monotonic() + timeout
+        while ready is None and time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"{server} s'est arrêté au démarrage (code {process.returncode})")
+            try:
+                if httpx.get(base_url + "/api/health/ready", timeout=1).is_success:
+                    ready = time.perf_counter() - started
+            except httpx.HTTPError:
+                time.sleep(0.05)
+        if ready is None:
+            raise RuntimeError(f"{server} n'est pas prêt après {timeout} s")
+
+        latencies = []
+        with httpx.Client(timeout=timeout) as http:
+            for index in range(1 + requests_after):
+                body = {"message": f"Quels travaux de rénovation réalisez-vous ? ({index})", "session_id": f"cold-{index}"}
+                request_started = time.perf_counter()
+                http.post(base_url + "/api/welcome", json=body,
+                          headers={"X-Forwarded-For": f"10.9.0.{index}"}).raise_for_status()
+                latencies.append(time.perf_counter() - request_started)
+        return ready, latencies[0], statistics.median(latencies[1:]) if latencies[1:] else None
+    finally:
+        stop_app(process)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--server", choices=["gunicorn", "uvicorn"], default="gunicorn")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--compare", action="store_true", help="mesurer aussi sans pré-chauffage")
+    parser.add_argument("--json", help="écrire les résultats dans ce fichier")
+    parser.add_argument("--groq", nargs=argparse.REMAINDER, default=[],
+                        help="options du faux Groq (voir python -m benchmarks.fake_groq -h)")
+    args = parser.parse_args()
+
+    groq_args = fake_groq_parser().parse_args(args.groq)
+    fake = create_server("127.0.0.1", free_port(), behaviour_from_args(groq_args))
+    threading.Thread(target=fake.serve_forever, daemon=True).start()
+
+    module = "main" if args.server == "gunicorn" else "asgi"
+    report = []
+    try:
+        for prewarm in ([True, False] if args.compare else [True]):
+            with tempfile.TemporaryDirectory() as metrics_dir:
+                env = dict(
+                    os.environ,
+                    GROQ_API_KEY=os.environ.get("GROQ_API_KEY", "gsk_fake_benchmark_key"),
+                    GROQ_BASE_URL=f"http://127.0.0.1:{fake.server_address[1]}",
+                    GROQ_PREWARM="true" if prewarm else "false",
+                    ADMISSION_ENABLED="false",
+                    LOG_FILE="",
+                    LOG_LEVEL="WARNING",
+                    METRICS_MULTIPROC_DIR=metrics_dir,
+                    RESPONSE_CACHE_ENABLED="false",
+                )
+                imports = [import_time(module, env) for _ in range(args.runs)]
+                runs = [cold_start(args.server, args.workers, args.threads, env) for _ in range(args.runs)]
+
+            row = {
+                "server": args.server, "workers": args.workers, "prewarm": prewarm,
+                "import_ms": round(statistics.median(imports) * 1000, 1),
+                "ready_ms": round(statistics.median(run[0] for run in runs) * 1000, 1),
+                "first_request_ms": round(statistics.median(run[1] for run in runs) * 1000, 1),
+                "warm_request_ms": round(statistics.median(run[2] for run in runs) * 1000, 1),
+            }
+            report.append(row)
+            print(f"{args.server} workers={args.workers} prewarm={'oui' if prewarm else 'non'} : "
+                  f"import {row['import_ms']} ms, prêt {row['ready_ms']} ms, "
+                  f"1re requête {row['first_request_ms']} ms, suivantes {row['warm_request_ms']} ms")
+    finally:
+        fake.shutdown()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -45,11 +45,204 @@ class GroqConfig:
     PRESENCE_PENALTY = 0.0    
     
     # Limites de conversation
-    MAX_CONVERSATION_HISTORY = 10    
+    MAX_CONVERSATION_HISTORY = 40    
+    HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", 1500))
     
     # Timeout et retry
-    REQUEST_TIMEOUT = 30      
+    REQUEST_TIMEOUT = 30      # Délai maximal par tentative (secondes)
     MAX_RETRIES = 3          
+    TOTAL_DEADLINE = 45       # Délai maximal toutes tentatives confondues
+    RETRY_BACKOFF_BASE = 0.5
+    RETRY_BACKOFF_MAX = 4.0
+    
+    # Disjoncteur : échecs consécutifs avant ouverture, durée d'ouverture
+    CIRCUIT_FAILURE_THRESHOLD = 5
+    CIRCUIT_RESET_TIMEOUT = 30
+    
+    # Hedging : seconde requête si la première dépasse le p95 observé
+    HEDGING_ENABLED = os.getenv("GROQ_HEDGING", "false").lower() == "true"
+    HEDGE_PERCENTILE = 0.95
+    HEDGE_MIN_DELAY = 1.0
+    
+    # Pool de connexions HTTP partagé (client asynchrone)
+    MAX_CONNECTIONS = int(os.getenv("GROQ_MAX_CONNECTIONS", 500))
+    MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("GROQ_MAX_KEEPALIVE_CONNECTIONS", 100))
+    
+    # Ouverture de la connexion TLS au démarrage de chaque worker (GET /models)
+    PREWARM = os.getenv("GROQ_PREWARM", "true").lower() == "true"
+    PREWARM_TIMEOUT = float(os.getenv("GROQ_PREWARM_TIMEOUT", 5))
+
+class AdmissionConfig:
+    """Contrôle d'admission devant les appels Groq (quotas du compte, par modèle)"""
+    
+    ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+    
+    # Quotas Groq du compte (requêtes et tokens par minute), partagés entre les workers
+    RPM_LIMIT = int(os.getenv("GROQ_RPM_LIMIT", 30))
+    TPM_LIMIT = int(os.getenv("GROQ_TPM_LIMIT", 6000))
+    WORKERS = max(1, int(os.getenv("WEB_CONCURRENCY", 1)))
+    # Marge sous le quota (les estimations de tokens ne sont pas exactes)
+    HEADROOM = float(os.getenv("ADMISSION_HEADROOM", 0.9))
+    
+    # Appels simultanés par worker et par modèle, profondeur de la file d'attente
+    MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", 32))
+    MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", 64))
+    # Attente maximale dans la file (secondes), au-delà la requête est refusée (503)
+    QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", 10))
+    
+    # Longueur de réponse supposée avant les premières mesures (tokens)
+    EXPECTED_COMPLETION_TOKENS = 256
+    
+    # Part du budget par minute que les résumés d'historique (basse priorité) laissent aux visiteurs
+    BACKGROUND_RESERVE = float(os.getenv("ADMISSION_BACKGROUND_RESERVE", 0.25))
+
+class RouterConfig:
+    """Configuration du routage des requêtes entre les modèles Groq"""
+    
+    ENABLED = os.getenv("MODEL_ROUTER_ENABLED", "true").lower() == "true"
+    
+    # Replis vers des modèles plus rapides (par niveau) ; le niveau le plus rapide
+    # se replie sur le suivant, jamais sur mixtral, le plus lent
+    FALLBACKS = {
+        "balanced": ["fast"],
+        "mixtral": ["fast"],
+        "fast": ["balanced"],
+    }
+    
+    # Délai (secondes) au-delà duquel un modèle est considéré dégradé
+    DEADLINES = {
+        "fast": 6,
+        "mixtral": 10,
+        "balanced": 12,
+    }
+    
+    # Signaux locaux
+    SHORT_MESSAGE_WORDS = 8
+    LONG_MESSAGE_WORDS = 60
+    LONG_HISTORY_TURNS = 12
+    LONG_CONTEXT_TOKENS = 6000      # Au-delà, contexte 8k trop juste pour llama3
+    
+    # Santé des modèles (EWMA)
+    EWMA_ALPHA = 0.2
+    MAX_ERROR_RATE = 0.5
+    PROBE_INTERVAL = 30             # Sonder un modèle dégradé après N secondes
+    
+    # Intentions détectées par mots-clés
+    INTENTS = {
+        "greeting": ["bonjour", "bonsoir", "salut", "hello", "coucou", "merci", "au revoir"],
+        "technical": [
+            "dimensionnement", "fondation", "béton armé", "ferraillage", "norme",
+            "étude de sol", "calcul", "structure", "étanchéité", "portance", "plan"
+        ],
+    }
+
+class SessionConfig:
+    """Configuration du stockage des conversations par session"""
+    
+    # Durée de vie d'une session inactive (secondes)
+    SESSION_TTL = int(os.getenv("SESSION_TTL", 1800))
+    
+    # Budget mémoire global, réparti entre les segments du store
+    MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", 10000))
+    MAX_TOTAL_TURNS = int(os.getenv("MAX_TOTAL_TURNS", 100000))
+    MAX_TOTAL_BYTES = int(os.getenv("MAX_TOTAL_BYTES", 64 * 1024 * 1024))
+    
+    # Nombre de verrous (lock striping)
+    LOCK_STRIPES = 16
+    
+    # En-tête HTTP portant l'identifiant de session
+    SESSION_HEADER = "X-Session-Id"
+    
+    # Cookie renvoyant l'identifiant au client quand il n'en fournit pas (widget sans stockage)
+    SESSION_COOKIE = os.getenv("SESSION_COOKIE", "session_id")
+    # Le widget est servi depuis un autre site : SameSite=None, qui exige Secure (HTTPS)
+    COOKIE_SAMESITE = os.getenv("SESSION_COOKIE_SAMESITE", "None")
+    COOKIE_SECURE = os.getenv("SESSION_COOKIE_SECURE", "true").lower() == "true"
+    
+    # "memory" (par worker) ou "sqlite" (partagé par les workers, conservé aux redémarrages)
+    BACKEND = os.getenv("SESSION_BACKEND", "memory")
+    DB_PATH = os.getenv("SESSION_DB_PATH", "data/sessions.db")
+    WRITE_QUEUE_SIZE = 100000
+    # Délai entre deux comparaisons d'une session en mémoire avec le backend (secondes)
+    REVALIDATE_INTERVAL = float(os.getenv("SESSION_REVALIDATE_INTERVAL", 5))
+    WRITE_BATCH_SIZE = 256
+    
+    # Résumé glissant des messages sortis de la fenêtre d'historique
+    SUMMARY_ENABLED = os.getenv("HISTORY_SUMMARY_ENABLED", "true").lower() == "true"
+    SUMMARY_MODEL = GroqConfig.MODELS["fast"]
+    SUMMARY_MAX_TOKENS = 200
+    SUMMARY_WORKERS = 2
+
+class CacheConfig:
+    """Configuration du cache de réponses"""
+    
+    ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+    
+    # Taille maximale (nombre de réponses) et durée de vie (secondes)
+    MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 2000))
+    TTL = int(os.getenv("RESPONSE_CACHE_TTL", 3600))
+    
+    # Nombre de messages récents pris en compte dans la clé
+    KEY_TURNS = 4
+    
+    # Ne pas utiliser le cache quand la température est > 0 (réponses exactes)
+    BYPASS_ON_TEMPERATURE = os.getenv("RESPONSE_CACHE_EXACT", "false").lower() == "true"
+    
+    # Requêtes identiques simultanées : un seul appel Groq partagé
+    SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+
+class BatchConfig:
+    """Configuration du traitement par lots (/api/welcome/batch)"""
+    
+    # Jeton exigé dans l'en-tête Authorization: Bearer
+    API_KEY = os.getenv("BATCH_API_KEY", "")
+    
+    # Sans jeton configuré, la route reste fermée : son budget de rate limiting
+    # est bien plus large que celui de /api/welcome
+    ENABLED = bool(API_KEY) and os.getenv("BATCH_ENABLED", "true").lower() == "true"
+    
+    # Taille maximale d'un lot
+    MAX_CONVERSATIONS = int(os.getenv("BATCH_MAX_CONVERSATIONS", 200))
+    MAX_MESSAGES = int(os.getenv("BATCH_MAX_MESSAGES", 500))
+    MAX_MESSAGES_PER_CONVERSATION = 20
+    
+    # Conversations traitées simultanément par worker (tous lots confondus)
+    CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 8))
+    
+    # Rate limiting des lots : un jeton par message, budget séparé de /api/welcome
+    RATE_LIMIT_PER_MINUTE = int(os.getenv("BATCH_RATE_LIMIT_PER_MINUTE", 600))
+    RATE_LIMIT_BURST = None
+
+class MetricsConfig:
+    """Configuration des métriques exposées sur /api/metrics"""
+    
+    ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    
+    # Dossier partagé par les workers gunicorn (un fichier par worker, agrégés
+    # à la lecture) ; sans dossier, seules les métriques du processus sont exposées
+    MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR")
+    FLUSH_INTERVAL = 5
+    
+    # Bornes des histogrammes
+    LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0)
+    TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+    SPAN_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class TracingConfig:
+    """Configuration du traçage des requêtes (étapes chronométrées) et du profilage"""
+    
+    ENABLED = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+    
+    # En-tête Server-Timing (durée de chaque étape, visible dans les outils du navigateur)
+    SERVER_TIMING = os.getenv("SERVER_TIMING", "true").lower() == "true"
+    
+    # Requêtes plus lentes journalisées avec le détail de leurs étapes
+    SLOW_REQUEST_MS = int(os.getenv("SLOW_REQUEST_MS", 2000))
+    
+    # Profilage à la demande (/api/admin/profile)
+    PROFILE_MAX_SECONDS = 60
+    PROFILE_INTERVAL_MS = 5
+    PROFILE_MAX_STACKS = 200
 
 class WelcomeAgentConfig:
     """Configuration professionnelle de l'assistant WelcomeAgent pour N.E.GROUP (Secteur BTP)."""
@@ -80,7 +273,7 @@ class WelcomeAgentConfig:
     
     WELCOME_MESSAGES = {
             "default": (
-                  "Bonjour et bienvenue chez Nouji Engineering Group Sarl ! "
+                  "Bonjour et bienvenue chez {company_name} ! "
                   "Je suis WelcomeAgent, votre assistant virtuel dédié au secteur du BTP. "
                   "Comment puis-je vous accompagner aujourd’hui ?"
             ),
@@ -110,6 +303,25 @@ class WelcomeAgentConfig:
             "questions hors BTP"
       ]
     
+    # Mots-clés indiquant un message lié au BTP
+    BTP_KEYWORDS = [
+            "construction", "bâtiment", "maison", "rénovation", "travaux",
+            "maçonnerie", "charpente", "couverture", "béton", "pierre",
+            "devis", "projet", "btp", "entrepreneur", "artisan"
+      ]
+    
+    # Coordonnées communiquées aux visiteurs
+    CONTACT = {
+            "phone": "+237 691 733 730",
+            "email": "noujiengenering@gmail.com"
+      }
+    
+    CONTACT_MESSAGE = (
+            "Pour un devis gratuit ou toute autre demande, contactez {company_name} "
+            "au {phone} ou par email à {email}. Décrivez-nous votre projet (type de travaux, "
+            "localisation, délais) et un de nos experts vous répondra rapidement."
+      )
+    
     # Réponses de redirection
     REDIRECT_RESPONSES = [
             "Je suis spécialisé dans le domaine du BTP. Souhaitez-vous en savoir plus sur nos services ou obtenir un devis ?",
@@ -117,12 +329,138 @@ class WelcomeAgentConfig:
             "Concentrons-nous sur ce que nous maîtrisons : le BTP. Avez-vous un chantier en vue ou des travaux à planifier ?"    
       ]
 
+class IntentConfig:
+    """Configuration du classifieur d'intentions (réponses sans appel Groq)"""
+    
+    ENABLED = os.getenv("INTENT_FAST_PATH_ENABLED", "true").lower() == "true"
+    
+    # Exemples annotés, un objet JSON {"text", "intent"} par ligne
+    DATA_FILE = os.getenv(
+        "INTENT_DATA_FILE",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "intents.jsonl")
+    )
+    EPOCHS = 30
+    
+    # En dessous de ce seuil de confiance, le message part vers Groq
+    THRESHOLD = float(os.getenv("INTENT_THRESHOLD", 0.7))
+    
+    # Les messages plus longs contiennent presque toujours une vraie question
+    MAX_WORDS = 20
+
+class KnowledgeConfig:
+    """Configuration de la base de connaissances (extraits injectés dans le prompt)"""
+    
+    ENABLED = os.getenv("KNOWLEDGE_ENABLED", "true").lower() == "true"
+    
+    # Documents Markdown indexés au démarrage (une section par titre)
+    DIRECTORY = os.getenv(
+        "KNOWLEDGE_DIR",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "knowledge")
+    )
+    CHUNK_WORDS = 120
+    
+    # Extraits ajoutés à chaque requête : nombre, budget en tokens, score minimal
+    TOP_K = int(os.getenv("KNOWLEDGE_TOP_K", 4))
+    MAX_TOKENS = int(os.getenv("KNOWLEDGE_MAX_TOKENS", 400))
+    MIN_SCORE = 1.0
+    
+    # Paramètres BM25
+    BM25_K1 = 1.2
+    BM25_B = 0.75
+
+class GenerationConfig:
+    """Paramètres de génération adaptés à chaque type de demande"""
+    
+    ENABLED = os.getenv("GENERATION_POLICY_ENABLED", "true").lower() == "true"
+    
+    # Par type de demande : max_tokens de départ, température et séquences d'arrêt
+    # (température absente : celle de l'agent ; max_tokens plafonné à GroqConfig.MAX_TOKENS)
+    POLICIES = {
+        "greeting": {"max_tokens": 160, "temperature": 0.7, "stop": ["\n\n"]},
+        "short": {"max_tokens": 320},
+        "visitor": {"max_tokens": 400},
+        "technical": {"max_tokens": 1024, "temperature": 0.3},
+        "default": {"max_tokens": 640},
+    }
+    
+    # Intentions du classifieur (et du routeur) associées à un type
+    INTENTS = {
+        "greeting": "greeting",
+        "contact": "short",
+        "client": "visitor",
+        "employer": "visitor",
+        "colleague": "visitor",
+        "technical": "technical",
+    }
+    
+    # Une fois MIN_SAMPLES réponses observées pour un type :
+    # max_tokens = quantile QUANTILE des WINDOW dernières longueurs x HEADROOM
+    WINDOW = 200
+    BUCKETS = tuple(range(32, 4097, 32))
+    MIN_SAMPLES = 30
+    QUANTILE = 0.95
+    HEADROOM = 1.25
+    MIN_MAX_TOKENS = 64
+    
+    # Réponse tronquée (finish_reason == "length") : suites demandées au plus
+    MAX_CONTINUATIONS = int(os.getenv("GENERATION_MAX_CONTINUATIONS", 2))
+
+class SpeculationConfig:
+    """Appel Groq spéculatif, lancé pendant les vérifications du message"""
+    
+    # L'appel part avant le classifieur d'intentions et la détection des sujets
+    # à rediriger ; il est annulé (ou sa réponse ignorée) si l'une d'elles répond
+    ENABLED = os.getenv("SPECULATION_ENABLED", "false").lower() == "true"
+    
+    # Messages plus courts : souvent une salutation répondue sans appel Groq
+    MIN_WORDS = int(os.getenv("SPECULATION_MIN_WORDS", 4))
+    
+    # Appels spéculatifs simultanés par worker (au-delà, le tour attend ses vérifications)
+    MAX_IN_FLIGHT = int(os.getenv("SPECULATION_MAX_IN_FLIGHT", 16))
+
+class TenantConfig:
+    """Configuration des sites clients servis par le même déploiement (multi-tenant)"""
+    
+    ENABLED = os.getenv("TENANTS_ENABLED", "true").lower() == "true"
+    
+    # Un fichier JSON par site client (nom du fichier = identifiant du site)
+    DIRECTORY = os.getenv(
+        "TENANTS_DIR",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "tenants")
+    )
+    
+    # Site d'une requête : clé d'API, sinon hôte de l'en-tête Origin, sinon en-tête Host
+    API_KEY_HEADER = "X-Api-Key"
+    
+    # Sans correspondance : site par défaut (WelcomeAgentConfig), ou 404 si REQUIRE_MATCH
+    REQUIRE_MATCH = os.getenv("TENANTS_REQUIRE_MATCH", "false").lower() == "true"
+    
+    # Relecture des fichiers modifiés, éviction des agents inactifs (secondes)
+    RELOAD_INTERVAL = 5
+    IDLE_TTL = int(os.getenv("TENANTS_IDLE_TTL", 1800))
+    MAX_AGENTS = 200
+
 class LoggingConfig:
     """Configuration pour les logs"""
     
-    LOG_LEVEL = "INFO"
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
     LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-    LOG_FILE = "logs/welcome_agent.log"
+    LOG_FILE = os.getenv("LOG_FILE", "logs/welcome_agent.log")
+    
+    # Rotation du fichier de logs
+    LOG_MAX_BYTES = 10 * 1024 * 1024
+    LOG_BACKUP_COUNT = 5
+    
+    # File d'attente vers le thread d'écriture (enregistrements abandonnés si pleine)
+    QUEUE_SIZE = 10000
+    
+    # Échantillonnage par catégorie (1.0 = tout garder, warnings et erreurs toujours gardés)
+    SAMPLING = {
+        "request": 1.0,
+        "api": 1.0,
+        "conversation": 1.0,
+        "agent": 1.0,
+    }
     
     # Logs spécifiques
     LOG_CONVERSATIONS = True     
@@ -134,14 +472,26 @@ class SecurityConfig:
     
     # Rate limiting (requêtes par minute)
     RATE_LIMIT_PER_MINUTE = 30
+    RATE_LIMIT_BURST = None          # Taille du seau (par défaut RATE_LIMIT_PER_MINUTE)
+    
+    # "memory" (par worker) ou "sqlite" (partagé par les workers de la machine)
+    RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+    RATE_LIMIT_DB_PATH = os.getenv("RATE_LIMIT_DB_PATH")
+    
+    # Jeton des routes d'administration (profilage) ; sans jeton, elles sont désactivées
+    ADMIN_API_KEY = os.getenv("ADMIN_API_KEY")
+    
+    # Éviction des clients inactifs
+    RATE_LIMIT_MAX_CLIENTS = 100000
+    RATE_LIMIT_IDLE_TTL = 120
     
     # Filtres de contenu
     MAX_MESSAGE_LENGTH = 1000    
     MIN_MESSAGE_LENGTH = 1       
     
-    # Mots interdits (spam/abus)
+    # Mots interdits (spam/abus), « * » final = préfixe (hack* : hacker, hacking...)
     BLOCKED_WORDS = [
-        "spam", "hack", "malware", "injures"
+        "spam*", "hack*", "malware*", "injure*"
     ]
 
 # Fonction utilitaire pour charger la config
@@ -159,6 +509,18 @@ def load_config():
 __all__ = [
     'Config',
     'GroqConfig', 
+    'AdmissionConfig',
+    'SessionConfig',
+    'CacheConfig',
+    'BatchConfig',
+    'RouterConfig',
+    'IntentConfig',
+    'KnowledgeConfig',
+    'GenerationConfig',
+    'SpeculationConfig',
+    'TenantConfig',
+    'MetricsConfig',
+    'TracingConfig',
     'WelcomeAgentConfig',
     'LoggingConfig',
     'SecurityConfig',
@@ -0,0 +1,33 @@
+"""Configuration gunicorn : gunicorn -c gunicorn.conf.py main:app
+
+L'application est chargée une fois dans le maître (preload_app) puis les
+workers sont forkés ; chaque worker crée ensuite son agent, ses threads et
+sa connexion à Groq dans post_worker_init, avant de recevoir du trafic.
+"""
+import glob
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', os.getenv('FLASK_PORT', '10000'))}"
+workers = int(os.getenv("WEB_CONCURRENCY", 2))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", 8))
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() == "true"
+
+# Plus long que GroqConfig.TOTAL_DEADLINE (les flux SSE occupent un thread)
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 60))
+graceful_timeout = 30
+keepalive = 5
+
+
+def on_starting(server):
+    """Repartir d'un dossier de métriques vide (instantanés des workers précédents)"""
+    directory = os.getenv("METRICS_MULTIPROC_DIR")
+    if directory and os.path.isdir(directory):
+        for path in glob.glob(os.path.join(directory, "*.json")):
+            os.remove(path)
+
+
+def post_worker_init(worker):
+    """Initialiser le worker (agent, pool HTTP, TLS vers Groq) avant sa première requête"""
+    from main import init_worker
+    init_worker()
@@ -0,0 +1,173 @@
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import uuid
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from config import LoggingConfig
+
+# Identifiant de la requête en cours, propagé dans tous les logs
+request_id_var = contextvars.ContextVar("request_id", default=None)
+
+ROOT_LOGGER = "welcome_agent"
+
+# Catégories désactivables depuis LoggingConfig
+_CATEGORY_SWITCHES = {
+    "conversation": "LOG_CONVERSATIONS",
+    "api": "LOG_API_CALLS",
+    "error": "LOG_ERRORS",
+}
+
+_listener = None
+_queue_handler = None
+# Processus qui a démarré le thread d'écriture (un worker forké doit relancer le sien)
+_listener_pid = None
+
+
+def new_request_id(incoming=None):
+    """Définir l'identifiant de la requête courante (reprend celui du client s'il est valide)"""
+    request_id = incoming if incoming and len(incoming) <= 64 else uuid.uuid4().hex[:16]
+    request_id_var.set(request_id)
+    return request_id
+
+
+def get_logger(category):
+    """Logger d'une catégorie : request, api, conversation, agent, error..."""
+    return logging.getLogger(f"{ROOT_LOGGER}.{category}")
+
+
+class JSONFormatter(logging.Formatter):
+    """Une ligne JSON par enregistrement"""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "category": record.name.rsplit(".", 1)[-1],
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+            "pid": record.process,
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif getattr(record, "exc_text", None):
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class ContextFilter(logging.Filter):
+    """Applique les interrupteurs et l'échantillonnage par catégorie, et attache
+    l'identifiant de requête. S'exécute dans le thread appelant, avant la file."""
+
+    def __init__(self, sampling, disabled):
+        super().__init__()
+        self.sampling = sampling
+        self.disabled = disabled
+
+    def filter(self, record):
+        category = record.name.rsplit(".", 1)[-1]
+        if category in self.disabled:
+            return False
+        rate = self.sampling.get(category, 1.0)
+        if rate < 1.0 and record.levelno < logging.WARNING and random.random() >= rate:
+            return False
+        record.request_id = request_id_var.get()
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler qui abandonne l'enregistrement si la file est pleine,
+    plutôt que de bloquer le thread de la requête"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Formater le message ici (les arguments peuvent changer ensuite),
+        # le JSON est produit par le thread d'écriture
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging():
+    """Configurer la chaîne de logs : file mémoire + thread d'écriture (stdout, fichier tournant)"""
+    global _listener, _queue_handler, _listener_pid
+    if _listener is not None and _listener_pid == os.getpid():
+        return _queue_handler
+
+    root = logging.getLogger(ROOT_LOGGER)
+    if _queue_handler is not None:
+        # Worker forké après setup_logging : le thread d'écriture du parent
+        # n'existe pas ici, repartir d'une file neuve
+        root.removeHandler(_queue_handler)
+
+    formatter = JSONFormatter()
+    handlers = []
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(formatter)
+    handlers.append(stream_handler)
+
+    if LoggingConfig.LOG_FILE:
+        directory = os.path.dirname(LoggingConfig.LOG_FILE)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        file_handler = RotatingFileHandler(
+            LoggingConfig.LOG_FILE,
+            maxBytes=LoggingConfig.LOG_MAX_BYTES,
+            backupCount=LoggingConfig.LOG_BACKUP_COUNT,
+            encoding="utf-8"
+        )
+        file_handler.setFormatter(formatter)
+        handlers.append(file_handler)
+
+    log_queue = queue.Queue(maxsize=LoggingConfig.QUEUE_SIZE)
+    _queue_handler = NonBlockingQueueHandler(log_queue)
+    _queue_handler.addFilter(ContextFilter(
+        LoggingConfig.SAMPLING,
+        {category for category, switch in _CATEGORY_SWITCHES.items() if not getattr(LoggingConfig, switch)}
+    ))
+
+    root.setLevel(LoggingConfig.LOG_LEVEL)
+    root.addHandler(_queue_handler)
+    root.propagate = False
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    if _listener_pid is None:
+        atexit.register(shutdown_logging)
+    _listener_pid = os.getpid()
+    return _queue_handler
+
+
+def shutdown_logging():
+    """Vider la file et arrêter le thread d'écriture"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def logging_stats():
+    return {
+        "queued": _queue_handler.queue.qsize() if _queue_handler else 0,
+        "dropped": _queue_handler.dropped if _queue_handler else 0,
+    }
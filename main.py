@@ -1,104 +1,283 @@
-from flask import Flask, request, jsonify, make_response
+from flask import (
+      Flask, Blueprint, request, jsonify, make_response, Response, stream_with_context, g, abort, has_request_context
+)
 from flask_cors import CORS
 import os
+import threading
 from dotenv import load_dotenv
 from agents.welcome_agent import WelcomeAgent
-from config import Config, load_config, SecurityConfig
+from agents.registry import create_registry
+from agents.admission import AdmissionRejected
+from agents.keyword_matcher import get_content_matcher
+from agents.intent_classifier import get_intent_classifier
+from agents.knowledge import get_knowledge_index
+from config import (
+      Config, load_config, GroqConfig, SessionConfig, MetricsConfig, IntentConfig, KnowledgeConfig,
+      WelcomeAgentConfig, BatchConfig, TracingConfig, TenantConfig
+)
+from security import (
+      check_rate_limit, check_batch_rate_limit, check_batch_token, check_admin_token, admin_enabled,
+      validate_message, client_ip_from, rate_limiter
+)
+from batch import BatchError, parse_batch, item_result, ndjson
+from logging_setup import setup_logging, get_logger, new_request_id, logging_stats
+from tracing import span, start_trace, finish_trace, profiler, ProfilerBusy, folded
+import metrics
 import time
-from collections import defaultdict
+import uuid
+import json
 
 load_dotenv()
 
-if not load_config():
-      exit(1)
+request_log = get_logger("request")
+error_log = get_logger("error")
 
-app = Flask(__name__)
+api = Blueprint("api", __name__)
 
-print("CORS origins autorisés :", Config.CORS_ORIGINS)
-
-# Configuration CORS simplifiée et plus permissive
-CORS(app, 
-     origins=Config.CORS_ORIGINS,
-     methods=["GET", "POST", "OPTIONS"],
-     allow_headers=["Content-Type", "Authorization"],
-     supports_credentials=True,
-     send_wildcard=False
+# Liveness : ne déclenche pas l'initialisation du worker
+LIVENESS_ENDPOINTS = ("api.health_check",)
+# Sondes : exclues de la mesure de la première requête
+PROBE_ENDPOINTS = LIVENESS_ENDPOINTS + ("api.readiness_check",)
+# Routes servies par l'agent du site client de la requête (les autres : site par défaut)
+TENANT_ENDPOINTS = (
+      "api.chat_with_welcome_agent", "api.stream_with_welcome_agent",
+      "api.batch_with_welcome_agent", "api.reset_conversation"
 )
 
+# --- Cycle de vie du worker ---
+# Avec gunicorn --preload, create_app() s'exécute une seule fois dans le processus
+# maître, puis les workers sont forkés. Ce qui ne survit pas à un fork (threads
+# d'écriture, pools de connexions HTTP, connexions SQLite) est créé par
+# init_worker(), une fois par processus : depuis le hook post_worker_init de
+# gunicorn.conf.py, ou à défaut à la première requête.
+
+_registry = None
+_worker_lock = threading.Lock()
+worker_state = {"pid": None, "init_ms": None, "prewarm": None, "first_request_ms": None}
+
+def init_worker():
+      """Créer les ressources du processus courant : logs, métriques, agents et connexion Groq"""
+      global _registry
+      with _worker_lock:
+            if worker_state['pid'] == os.getpid():
+                  return _registry
+            
+            started = time.perf_counter()
+            # Logs structurés écrits par un thread dédié (le thread de requête ne fait qu'empiler)
+            setup_logging()
+            # Métriques exposées sur /api/metrics (agrégées entre workers si METRICS_MULTIPROC_DIR)
+            metrics.setup_metrics()
+            # Agent du site par défaut (ressources partagées) et sites clients de TenantConfig.DIRECTORY
+            _registry = create_registry(WelcomeAgent)
+            init_seconds = time.perf_counter() - started
+            
+            prewarm = _registry.default.warm_up() if GroqConfig.PREWARM else None
+            if prewarm and prewarm['ok']:
+                  metrics.worker_startup.observe(prewarm['ms'] / 1000, "prewarm")
+            metrics.worker_startup.observe(init_seconds, "init")
+            
+            worker_state.update(
+                  pid=os.getpid(),
+                  init_ms=round(init_seconds * 1000, 1),
+                  prewarm=prewarm,
+                  first_request_ms=None
+            )
+            request_log.info("worker_ready", extra={"fields": {
+                  "init_ms": worker_state['init_ms'],
+                  "prewarm": prewarm
+            }})
+            return _registry
+
+def get_registry():
+      """Registre d'agents du worker courant (initialisé au premier appel si le hook ne l'a pas fait)"""
+      if worker_state['pid'] != os.getpid():
+            return init_worker()
+      return _registry
+
+def get_agent():
+      """Agent du site client de la requête courante (site par défaut hors des routes de conversation)"""
+      agent = g.get('agent') if has_request_context() else None
+      return agent or get_registry().default
+
+def worker_ready():
+      return worker_state['pid'] == os.getpid()
+
+@api.before_app_request
+def start_request():
+      """Attribuer un identifiant à la requête et démarrer le chronomètre"""
+      if request.endpoint not in LIVENESS_ENDPOINTS:
+            get_registry()
+      g.request_id = new_request_id(request.headers.get('X-Request-Id'))
+      g.trace = start_trace(g.request_id)
+      g.start_time = time.perf_counter()
+      metrics.http_in_flight.inc()
+      g.in_flight = True
+      
+      # Site client : clé d'API, sinon hôte de l'Origin, sinon en-tête Host
+      if request.endpoint in TENANT_ENDPOINTS and request.method != "OPTIONS":
+            g.agent = get_registry().resolve(
+                  request.headers.get(TenantConfig.API_KEY_HEADER),
+                  request.headers.get('Origin'),
+                  request.host
+            )
+            if g.agent is None:
+                  return jsonify({'error': 'Site inconnu'}), 404
+
+@api.after_app_request
+def log_request(response):
+      """Renvoyer l'identifiant de requête et la durée des étapes, journaliser et mesurer la requête"""
+      response.headers['X-Request-Id'] = g.get('request_id', '')
+      timing = finish_trace(g.get('trace'), request.method, request.path, response.status_code)
+      if timing:
+            response.headers['Server-Timing'] = timing
+      
+      # Identifiant de session renvoyé au client (nouveau ou prolongé)
+      session_id = g.get('session_id')
+      if session_id:
+            response.headers[SessionConfig.SESSION_HEADER] = session_id
+            response.set_cookie(
+                  SessionConfig.SESSION_COOKIE, session_id,
+                  max_age=SessionConfig.SESSION_TTL,
+                  secure=SessionConfig.COOKIE_SECURE,
+                  httponly=True,
+                  samesite=SessionConfig.COOKIE_SAMESITE
+            )
+      
+      # Origines des sites clients (hors CORS_ORIGINS, gérées par flask_cors)
+      origin = cors_origin(request.headers.get('Origin'))
+      if origin and 'Access-Control-Allow-Origin' not in response.headers:
+            response.headers['Access-Control-Allow-Origin'] = origin
+            response.headers['Access-Control-Allow-Credentials'] = 'true'
+            response.headers['Access-Control-Expose-Headers'] = f"X-Request-Id, Server-Timing, {SessionConfig.SESSION_HEADER}"
+            response.headers.add('Vary', 'Origin')
+      if request.method != "OPTIONS":
+            duration = time.perf_counter() - g.get('start_time', time.perf_counter())
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            metrics.http_requests.inc(route, request.method, response.status_code)
+            metrics.http_duration.observe(duration, route)
+            if worker_state['first_request_ms'] is None and request.endpoint not in PROBE_ENDPOINTS and worker_ready():
+                  # Latence de la première requête servie par ce worker (après un scale-up)
+                  worker_state['first_request_ms'] = round(duration * 1000, 2)
+                  metrics.worker_startup.observe(duration, "first_request")
+            request_log.info("request", extra={"fields": {
+                  "method": request.method,
+                  "path": request.path,
+                  "status": response.status_code,
+                  "duration_ms": round(duration * 1000, 2)
+            }})
+      return response
+
+@api.teardown_app_request
+def end_request(exc=None):
+      """Fin de la requête (après la fin du flux pour les réponses SSE)"""
+      if g.pop('in_flight', False):
+            metrics.http_in_flight.dec()
+
 # Handler explicite pour les requêtes OPTIONS (preflight)
-@app.before_request
+@api.before_app_request
 def handle_preflight():
-    if request.method == "OPTIONS":
-        print(f"🔄 Requête OPTIONS reçue pour: {request.path}")
-        print(f"Origin: {request.headers.get('Origin')}")
-        
-        response = make_response()
-        
-        # Vérifier si l'origin est autorisé
-        origin = request.headers.get('Origin')
-        if origin in Config.CORS_ORIGINS:
-            response.headers.add("Access-Control-Allow-Origin", origin)
-        elif Config.CORS_ORIGINS == ["*"]:  
-            response.headers.add("Access-Control-Allow-Origin", "*")
-        else:
-            # Fallback pour votre domaine spécifique
-            response.headers.add("Access-Control-Allow-Origin", "https://noujiengennering.netlify.app")
-            
-        response.headers.add('Access-Control-Allow-Headers', "Content-Type,Authorization")
-        response.headers.add('Access-Control-Allow-Methods', "GET,POST,OPTIONS")
-        response.headers.add('Access-Control-Allow-Credentials', 'true')
-        response.headers.add('Access-Control-Max-Age', '86400')  # Cache preflight 24h
-        
-        print(f"✅ Headers CORS ajoutés pour OPTIONS")
-        return response
+      if request.method == "OPTIONS":
+            response = make_response()
+            
+            # Vérifier si l'origin est autorisé (sinon le navigateur bloque l'appel)
+            origin = cors_origin(request.headers.get('Origin'))
+            if origin:
+                  response.headers.add("Access-Control-Allow-Origin", origin)
+                  response.headers.add("Vary", "Origin")
+                  
+            response.headers.add('Access-Control-Allow-Headers', f"Content-Type,Authorization,X-Request-Id,{SessionConfig.SESSION_HEADER},{TenantConfig.API_KEY_HEADER}")
+            response.headers.add('Access-Control-Allow-Methods', "GET,POST,OPTIONS")
+            response.headers.add('Access-Control-Allow-Credentials', 'true')
+            response.headers.add('Access-Control-Max-Age', '86400')  # Cache preflight 24h
+            
+            return response
 
-# Rate limiting simple (stockage en mémoire)
-request_counts = defaultdict(lambda: {"count": 0, "reset_time": time.time() + 60})
+def cors_origin(origin):
+      """Origine à renvoyer dans Access-Control-Allow-Origin : CORS_ORIGINS ou hôte d'un site client (None sinon)"""
+      if not origin:
+            return None
+      # Avec les cookies autorisés, l'origine est renvoyée telle quelle, jamais "*"
+      if origin in Config.CORS_ORIGINS or Config.CORS_ORIGINS == ["*"]:
+            return origin
+      if worker_ready() and get_registry().allows_origin(origin):
+            return origin
+      return None
 
-def check_rate_limit(client_ip):
-      """Vérifier le rate limiting"""
-      current_time = time.time()
-      client_data = request_counts[client_ip]
+def get_session_id(data=None, create=True):
+      """Extraire l'identifiant de session (en-tête, corps JSON, query string ou cookie).
       
-      # Reset du compteur si 1 minute écoulée
-      if current_time > client_data["reset_time"]:
-            client_data["count"] = 0
-            client_data["reset_time"] = current_time + 60
+      Sans identifiant, un nouveau est créé ; il est renvoyé au client
+      (en-tête et cookie, voir log_request) pour que la requête suivante
+      retrouve la même conversation.
+      """
+      session_id = request.headers.get(SessionConfig.SESSION_HEADER)
+      if not session_id and isinstance(data, dict):
+            session_id = data.get('session_id')
+      if not session_id:
+            session_id = request.args.get('session_id')
+      if not session_id:
+            session_id = request.cookies.get(SessionConfig.SESSION_COOKIE)
       
-      # Vérifier la limite
-      if client_data["count"] >= SecurityConfig.RATE_LIMIT_PER_MINUTE:
-            return False
-      
-      client_data["count"] += 1
-      return True
+      if not session_id or not isinstance(session_id, str) or len(session_id) > 128:
+            if not create:
+                  return None
+            session_id = uuid.uuid4().hex
+      g.session_id = session_id
+      return session_id
 
-def validate_message(message):
-      """Valider le message utilisateur"""
-      if not message:
-            return False, "Message vide"
+def parse_chat_request():
+      """Extraire et valider le message et la session de la requête courante.
+      
+      Retourne (message, session_id, None) ou (None, None, réponse d'erreur).
+      """
+      # Récupérer le message depuis le frontend
+      with span("parse"):
+            data = request.get_json()
       
-      if len(message) < SecurityConfig.MIN_MESSAGE_LENGTH:
-            return False, "Message trop court"
+      if not data or 'message' not in data:
+            request_log.info("validation_failed", extra={"fields": {"reason": "missing_message"}})
+            metrics.validation_failures.inc("missing_message")
+            return None, None, (jsonify({
+                  'error': 'Message requis'
+            }), 400)
       
-      if len(message) > SecurityConfig.MAX_MESSAGE_LENGTH:
-            return False, "Message trop long"
+      user_message = data['message']
+      session_id = get_session_id(data)
       
-      # Vérifier les mots interdits
-      message_lower = message.lower()
-      for blocked_word in SecurityConfig.BLOCKED_WORDS:
-            if blocked_word in message_lower:
-                  return False, f"Contenu non autorisé détecté"
+      # Valider le message
+      with span("validate"):
+            is_valid, error_msg = validate_message(user_message)
+      if not is_valid:
+            request_log.info("validation_failed", extra={"fields": {"reason": error_msg}})
+            return None, None, (jsonify({
+                  'error': error_msg
+            }), 400)
       
-      return True, None
+      return user_message, session_id, None
 
-# Initialiser l'agent
-welcome_agent = WelcomeAgent()
+def overloaded_response(error):
+      """503 + Retry-After : budget Groq épuisé, la requête est refusée tout de suite"""
+      response = jsonify({
+            'error': 'Service très sollicité. Veuillez réessayer dans quelques instants.',
+            'error_type': 'overloaded',
+            'retry_after': error.retry_after
+      })
+      response.status_code = 503
+      response.headers['Retry-After'] = str(error.retry_after)
+      return response
 
-@app.route('/api/welcome', methods=['POST'])
+def sse_event(data, event=None):
+      """Formater un événement Server-Sent Events"""
+      payload = json.dumps(data, ensure_ascii=False)
+      if event:
+            return f"event: {event}\ndata: {payload}\n\n"
+      return f"data: {payload}\n\n"
+
+@api.route('/api/welcome', methods=['POST'])
 def chat_with_welcome_agent():
       try:
             # Obtenir l'IP du client pour le rate limiting
-            client_ip = request.environ.get('HTTP_X_FORWARDED_FOR', request.environ.get('REMOTE_ADDR', 'unknown'))
+            client_ip = client_ip_from(request.headers.get('X-Forwarded-For'), request.remote_addr)
             
             # Vérifier le rate limiting
             if not check_rate_limit(client_ip):
@@ -107,91 +286,218 @@ def chat_with_welcome_agent():
                         'rate_limit_exceeded': True
                   }), 429
             
-            print(f"🔄 Requête POST reçue de {client_ip}")
+            user_message, session_id, error = parse_chat_request()
+            if error:
+                  return error
             
-            # Récupérer le message depuis le frontend
-            data = request.get_json()
-            print(f"Data reçue: {data}")
+            # Traiter le message avec l'agent
+            response = get_agent().process_message(user_message, session_id)
             
-            if not data or 'message' not in data:
-                  print("Erreur: Message manquant")
+            with span("serialize"):
                   return jsonify({
-                        'error': 'Message requis'
-                  }), 400
-            
-            user_message = data['message']
+                        'response': response,
+                        'session_id': session_id,
+                        'timestamp': time.time()
+                  })
+        
+      except AdmissionRejected as e:
+            return overloaded_response(e)
+      except Exception as e:
+            error_log.error("chat_with_welcome_agent_failed", exc_info=e)
+            return jsonify({
+                  'error': 'Erreur interne du serveur. Veuillez réessayer.',
+                  'error_type': 'server_error'
+            }), 500
+
+@api.route('/api/welcome/stream', methods=['POST'])
+def stream_with_welcome_agent():
+      """Variante de /api/welcome qui transmet la réponse au fil de la génération (SSE)"""
+      try:
+            client_ip = client_ip_from(request.headers.get('X-Forwarded-For'), request.remote_addr)
             
-            # Valider le message
-            is_valid, error_msg = validate_message(user_message)
-            if not is_valid:
-                  print(f"Validation échouée: {error_msg}")
+            if not check_rate_limit(client_ip):
                   return jsonify({
-                        'error': error_msg
-                  }), 400
+                        'error': 'Trop de requêtes. Veuillez patienter avant de réessayer.',
+                        'rate_limit_exceeded': True
+                  }), 429
             
-            print(f"Message utilisateur: {user_message}")
+            user_message, session_id, error = parse_chat_request()
+            if error:
+                  return error
             
-            # Traiter le message avec l'agent
-            print("Appel à welcome_agent.process_message...")
-            response = welcome_agent.process_message(user_message)
-            print(f"Réponse générée ({len(response)} caractères)")
+            stream = get_agent().stream_message(user_message, session_id)
+            # Démarrer le tour avant d'envoyer les en-têtes : un refus d'admission devient un 503
+            first = next(stream, None)
+            
+            def generate():
+                  try:
+                        if first is not None:
+                              yield sse_event({'delta': first})
+                        for delta in stream:
+                              yield sse_event({'delta': delta})
+                  except Exception as e:
+                        error_log.error("stream_with_welcome_agent_failed", exc_info=e)
+                        yield sse_event({
+                              'error': 'Erreur interne du serveur. Veuillez réessayer.',
+                              'error_type': 'server_error'
+                        }, event='error')
+                        return
+                  finally:
+                        stream.close()
+                  yield sse_event({
+                        'session_id': session_id,
+                        'timestamp': time.time()
+                  }, event='done')
             
+            response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+            response.headers['Cache-Control'] = 'no-cache'
+            # Désactiver la mise en tampon des proxys (nginx, Render)
+            response.headers['X-Accel-Buffering'] = 'no'
+            return response
+        
+      except AdmissionRejected as e:
+            return overloaded_response(e)
+      except Exception as e:
+            error_log.error("stream_with_welcome_agent_failed", exc_info=e)
             return jsonify({
-                  'response': response,
-                  'timestamp': time.time()
-            })
+                  'error': 'Erreur interne du serveur. Veuillez réessayer.',
+                  'error_type': 'server_error'
+            }), 500
+
+@api.route('/api/welcome/batch', methods=['POST'])
+def batch_with_welcome_agent():
+      """Traiter un lot de conversations indépendantes ; un résultat NDJSON par conversation terminée"""
+      if not BatchConfig.ENABLED:
+            abort(404)
+      try:
+            if not check_batch_token(request.headers.get('Authorization')):
+                  return jsonify({'error': 'Jeton invalide'}), 401
+            
+            try:
+                  conversations, rejected = parse_batch(request.get_json(silent=True))
+            except BatchError as e:
+                  request_log.info("validation_failed", extra={"fields": {"reason": e.message}})
+                  return jsonify({'error': e.message}), e.status
+            
+            # Un jeton de rate limiting par message du lot
+            client_ip = client_ip_from(request.headers.get('X-Forwarded-For'), request.remote_addr)
+            allowed, retry_after = check_batch_rate_limit(client_ip, sum(len(item.messages) for item in conversations))
+            if not allowed:
+                  response = jsonify({
+                        'error': 'Trop de requêtes. Veuillez patienter avant de réessayer.',
+                        'rate_limit_exceeded': True
+                  })
+                  response.status_code = 429
+                  response.headers['Retry-After'] = str(max(1, int(retry_after + 0.999)))
+                  return response
+            
+            welcome_agent = get_agent()
+            
+            def generate():
+                  started = time.perf_counter()
+                  counts = {}
+                  for item in rejected:
+                        line = item_result(item)
+                        counts[line['status']] = counts.get(line['status'], 0) + 1
+                        yield ndjson(line)
+                  for item, responses, error in welcome_agent.process_batch(conversations):
+                        line = item_result(item, responses, error)
+                        counts[line['status']] = counts.get(line['status'], 0) + 1
+                        yield ndjson(line)
+                  yield ndjson({
+                        'done': True,
+                        'conversations': len(conversations) + len(rejected),
+                        'statuses': counts,
+                        'duration_ms': round((time.perf_counter() - started) * 1000, 1)
+                  })
+            
+            response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+            response.headers['Cache-Control'] = 'no-cache'
+            response.headers['X-Accel-Buffering'] = 'no'
+            return response
         
       except Exception as e:
-            print(f"ERREUR dans chat_with_welcome_agent: {str(e)}")
-            print(f"Type d'erreur: {type(e)}")
-            import traceback
-            traceback.print_exc()
+            error_log.error("batch_with_welcome_agent_failed", exc_info=e)
             return jsonify({
                   'error': 'Erreur interne du serveur. Veuillez réessayer.',
                   'error_type': 'server_error'
             }), 500
 
-@app.route('/api/health', methods=['GET'])
+@api.route('/api/health', methods=['GET'])
 def health_check():
-      """Route de test pour vérifier que le serveur fonctionne"""
+      """Liveness : le processus répond (n'initialise pas le worker)"""
       return jsonify({
             'status': 'OK',
             'message': 'WelcomeAgent backend is running!',
+            'ready': worker_ready(),
             'config': {
-                  'model': welcome_agent.model,
-                  'company': welcome_agent.company_name,
+                  'model': GroqConfig.DEFAULT_MODEL,
+                  'company': WelcomeAgentConfig.COMPANY_INFO['name'],
                   'version': '1.0.0'
             }
       })
 
-@app.route('/api/reset', methods=['POST'])
+@api.route('/api/health/ready', methods=['GET'])
+def readiness_check():
+      """Readiness : worker initialisé et au moins un modèle Groq disponible (503 sinon)"""
+      welcome_agent = get_agent()
+      available = welcome_agent.is_available()
+      return jsonify({
+            'status': 'ready' if available else 'unavailable',
+            'ready': available,
+            'pid': worker_state['pid'],
+            'startup': {
+                  'init_ms': worker_state['init_ms'],
+                  'prewarm': worker_state['prewarm'],
+                  'first_request_ms': worker_state['first_request_ms']
+            }
+      }), 200 if available else 503
+
+@api.route('/api/reset', methods=['POST'])
 def reset_conversation():
       """Réinitialiser la conversation"""
       try:
-            client_ip = request.environ.get('HTTP_X_FORWARDED_FOR', request.environ.get('REMOTE_ADDR', 'unknown'))
+            client_ip = client_ip_from(request.headers.get('X-Forwarded-For'), request.remote_addr)
             
             if not check_rate_limit(client_ip):
                   return jsonify({
                   'error': 'Trop de requêtes. Veuillez patienter.'
                   }), 429
             
-            message = welcome_agent.reset_conversation()
+            session_id = get_session_id(request.get_json(silent=True))
+            message = get_agent().reset_conversation(session_id)
             return jsonify({
                   'response': message,
+                  'session_id': session_id,
                   'conversation_reset': True
             })
       except Exception as e:
-            print(f"Erreur reset: {str(e)}")
+            error_log.error("reset_failed", exc_info=e)
             return jsonify({
                   'error': 'Erreur lors de la réinitialisation'
             }), 500
 
-@app.route('/api/stats', methods=['GET'])
+@api.route('/api/stats', methods=['GET'])
 def get_stats():
       """Obtenir des statistiques sur la conversation"""
       try:
+            welcome_agent = get_agent()
+            session_id = get_session_id(create=False)
             return jsonify({
-                  'conversation_length': welcome_agent.get_conversation_length(),
+                  'session_id': session_id,
+                  'conversation_length': welcome_agent.get_conversation_length(session_id) if session_id else 0,
+                  'sessions': welcome_agent.get_session_stats(),
+                  'cache': welcome_agent.get_cache_stats(),
+                  'resilience': welcome_agent.get_resilience_stats(),
+                  'router': welcome_agent.get_router_stats(),
+                  'single_flight': welcome_agent.get_single_flight_stats(),
+                  'admission': welcome_agent.get_admission_stats(),
+                  'knowledge': welcome_agent.get_knowledge_stats(),
+                  'speculation': welcome_agent.get_speculation_stats(),
+                  'generation': welcome_agent.get_generation_stats(),
+                  'tenants': get_registry().stats(),
+                  'logging': logging_stats(),
+                  'rate_limiter': rate_limiter.stats(),
                   'model_used': welcome_agent.model,
                   'company_info': {
                   'name': welcome_agent.company_name,
@@ -199,13 +505,48 @@ def get_stats():
                   }
             })
       except Exception as e:
-            print(f"Erreur stats: {str(e)}")
+            error_log.error("stats_failed", exc_info=e)
             return jsonify({
                   'error': 'Erreur lors de la récupération des statistiques'
             }), 500
 
+@api.route('/api/metrics', methods=['GET'])
+def get_metrics():
+      """Métriques au format texte Prometheus"""
+      if not MetricsConfig.ENABLED:
+            abort(404)
+      return Response(metrics.registry.render(), content_type=metrics.CONTENT_TYPE)
+
+@api.route('/api/admin/profile', methods=['POST'])
+def profile_worker():
+      """Profiler le worker qui reçoit la requête pendant N secondes (piles agrégées)"""
+      if not admin_enabled():
+            abort(404)
+      if not check_admin_token(request.headers.get('Authorization')):
+            return jsonify({'error': 'Jeton invalide'}), 401
+      
+      try:
+            seconds = float(request.args.get('seconds', 10))
+            interval = float(request.args.get('interval_ms', TracingConfig.PROFILE_INTERVAL_MS)) / 1000
+      except ValueError:
+            return jsonify({'error': 'Paramètres invalides'}), 400
+      if not 0 < seconds <= TracingConfig.PROFILE_MAX_SECONDS or not 0.001 <= interval <= 1:
+            return jsonify({
+                  'error': f"Durée entre 0 et {TracingConfig.PROFILE_MAX_SECONDS} s, intervalle entre 1 et 1000 ms"
+            }), 400
+      
+      try:
+            report = profiler.profile(seconds, interval, TracingConfig.PROFILE_MAX_STACKS)
+      except ProfilerBusy as e:
+            return jsonify({'error': str(e)}), 409
+      request_log.info("profile", extra={"fields": {"seconds": report['seconds'], "samples": report['samples']}})
+      
+      if request.args.get('format') == 'folded':
+            return Response(folded(report), mimetype='text/plain')
+      return jsonify(report)
+
 # Route de test pour débugger CORS
-@app.route('/api/cors-test', methods=['GET', 'POST', 'OPTIONS'])
+@api.route('/api/cors-test', methods=['GET', 'POST', 'OPTIONS'])
 def cors_test():
       """Route de test pour vérifier les en-têtes CORS"""
       return jsonify({
@@ -215,14 +556,53 @@ def cors_test():
             'headers': dict(request.headers)
       })
 
+def create_app():
+      """Construire l'application Flask.
+      
+      Aucune ressource liée au processus n'est créée ici (voir init_worker) :
+      l'application peut être chargée dans le maître gunicorn (--preload) et
+      partagée par les workers. Les structures en lecture seule coûteuses
+      (mots-clés, classifieur d'intentions) sont construites ici pour n'être
+      calculées qu'une fois.
+      """
+      if not load_config():
+            raise RuntimeError("Configuration invalide, voir les messages ci-dessus")
+      
+      app = Flask(__name__)
+      
+      print("CORS origins autorisés :", Config.CORS_ORIGINS)
+      
+      # Configuration CORS simplifiée et plus permissive
+      CORS(app, 
+           origins=Config.CORS_ORIGINS,
+           methods=["GET", "POST", "OPTIONS"],
+           allow_headers=[
+                 "Content-Type", "Authorization", "X-Request-Id", SessionConfig.SESSION_HEADER, TenantConfig.API_KEY_HEADER
+           ],
+           expose_headers=["X-Request-Id", "Server-Timing", SessionConfig.SESSION_HEADER],
+           supports_credentials=True,
+           send_wildcard=False
+      )
+      app.register_blueprint(api)
+      
+      get_content_matcher()
+      if IntentConfig.ENABLED:
+            get_intent_classifier()
+      if KnowledgeConfig.ENABLED:
+            get_knowledge_index()
+      return app
+
+app = create_app()
+
 if __name__ == '__main__':
       print("Démarrage du serveur WelcomeAgent...")
       print(f"API disponible sur: http://{Config.FLASK_HOST}:{Config.FLASK_PORT}")
       print(f"Health check: http://{Config.FLASK_HOST}:{Config.FLASK_PORT}/api/health")
       print(f"CORS test: http://{Config.FLASK_HOST}:{Config.FLASK_PORT}/api/cors-test")
       
+      init_worker()
       app.run(
             host=Config.FLASK_HOST,
             port=Config.FLASK_PORT,
             debug=Config.FLASK_DEBUG
-      )
\ No newline at end of file
+      )
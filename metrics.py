@@ -0,0 +1,315 @@
+import glob
+import json
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from config import MetricsConfig
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    """Base des métriques : une valeur par combinaison d'étiquettes, un verrou par métrique"""
+
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        if not self.labels and self.kind != "histogram":
+            self._values[()] = 0
+
+    def _key(self, labels):
+        if len(labels) != len(self.labels):
+            raise ValueError(f"{self.name} attend les étiquettes {self.labels}")
+        return tuple(str(value) for value in labels)
+
+    def samples(self):
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+    def describe(self):
+        return {"type": self.kind, "help": self.help, "labels": list(self.labels)}
+
+
+class Counter(_Metric):
+    """Compteur croissant"""
+
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Valeur instantanée (requêtes en cours...)"""
+
+    kind = "gauge"
+
+    def inc(self, *labels, amount=1):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    """Histogramme à bornes fixes : compte par intervalle, somme et nombre d'observations"""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=MetricsConfig.LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # Dernier intervalle = au-delà de la plus grande borne (+Inf)
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def samples(self):
+        with self._lock:
+            return [[list(key), [list(counts), total]] for key, (counts, total) in self._values.items()]
+
+    def describe(self):
+        description = super().describe()
+        description["buckets"] = list(self.buckets)
+        return description
+
+
+class MetricsRegistry:
+    """Registre des métriques du processus.
+
+    Avec un dossier partagé, chaque worker y écrit périodiquement un instantané
+    de ses métriques ; l'export additionne les instantanés de tous les workers.
+    Les compteurs et histogrammes d'un worker arrêté restent comptés, ses
+    jauges sont ignorées.
+    """
+
+    def __init__(self, multiproc_dir=None, flush_interval=5):
+        self.multiproc_dir = multiproc_dir
+        self.flush_interval = flush_interval
+        self._metrics = {}
+        self._writer = None
+
+    def _register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self._register(Counter(name, help_text, labels))
+
+    def gauge(self, name, help_text, labels=()):
+        return self._register(Gauge(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=MetricsConfig.LATENCY_BUCKETS):
+        return self._register(Histogram(name, help_text, labels, buckets))
+
+    def snapshot(self):
+        """Instantané sérialisable des métriques du processus"""
+        return {
+            name: dict(metric.describe(), samples=metric.samples())
+            for name, metric in self._metrics.items()
+        }
+
+    # --- Agrégation entre workers ---
+
+    def _snapshot_path(self, pid):
+        return os.path.join(self.multiproc_dir, f"{pid}.json")
+
+    def flush(self):
+        """Écrire l'instantané du processus dans le dossier partagé"""
+        if not self.multiproc_dir:
+            return
+        path = self._snapshot_path(os.getpid())
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"pid": os.getpid(), "metrics": self.snapshot()}, f)
+        os.replace(tmp_path, path)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except OSError:
+                pass
+
+    def start(self):
+        """Démarrer l'écriture périodique de l'instantané (sans effet sans dossier partagé)"""
+        # Un worker forké hérite de self._writer mais pas du thread lui-même
+        if not self.multiproc_dir or (self._writer is not None and self._writer.is_alive()):
+            return
+        os.makedirs(self.multiproc_dir, exist_ok=True)
+        self._writer = threading.Thread(target=self._flush_loop, name="metrics-writer", daemon=True)
+        self._writer.start()
+
+    def _worker_snapshots(self):
+        """Instantanés de tous les workers : (pid, métriques, vivant)"""
+        self.flush()
+        for path in glob.glob(os.path.join(self.multiproc_dir, "*.json")):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            yield data["pid"], data["metrics"], _pid_alive(data["pid"])
+
+    def collect(self):
+        """Métriques agrégées : celles du processus, ou de tous les workers"""
+        if not self.multiproc_dir:
+            return self.snapshot()
+
+        merged = {}
+        for pid, metrics, alive in self._worker_snapshots():
+            for name, metric in metrics.items():
+                if metric["type"] == "gauge" and not alive:
+                    continue
+                target = merged.setdefault(name, dict(metric, samples={}))
+                samples = target["samples"]
+                for labels, value in metric["samples"]:
+                    key = tuple(labels)
+                    if metric["type"] == "histogram":
+                        counts, total = samples.get(key, ([0] * len(value[0]), 0.0))
+                        samples[key] = ([a + b for a, b in zip(counts, value[0])], total + value[1])
+                    else:
+                        samples[key] = samples.get(key, 0) + value
+        for metric in merged.values():
+            metric["samples"] = [[list(key), value] for key, value in metric["samples"].items()]
+        return merged
+
+    def render(self):
+        """Format texte d'exposition Prometheus"""
+        lines = []
+        for name, metric in sorted(self.collect().items()):
+            labels = metric["labels"]
+            lines.append(f"# HELP {name} {metric['help']}")
+            lines.append(f"# TYPE {name} {metric['type']}")
+            for values, value in sorted(metric["samples"]):
+                if metric["type"] != "histogram":
+                    lines.append(f"{name}{_format_labels(labels, values)} {_format_value(value)}")
+                    continue
+                counts, total = value
+                cumulative = 0
+                for bound, count in zip(list(metric["buckets"]) + [math.inf], counts):
+                    cumulative += count
+                    le = 'le="' + _format_value(bound) + '"'
+                    lines.append(f"{name}_bucket{_format_labels(labels, values, le)} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels, values)} {_format_value(total)}")
+                lines.append(f"{name}_count{_format_labels(labels, values)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+registry = MetricsRegistry(MetricsConfig.MULTIPROC_DIR, MetricsConfig.FLUSH_INTERVAL)
+
+# Requêtes HTTP
+http_requests = registry.counter(
+    "welcome_agent_http_requests_total", "Requêtes HTTP traitées", ("route", "method", "status"))
+http_duration = registry.histogram(
+    "welcome_agent_http_request_duration_seconds", "Durée des requêtes HTTP", ("route",))
+http_in_flight = registry.gauge(
+    "welcome_agent_http_requests_in_flight", "Requêtes HTTP en cours")
+
+# Tours de conversation
+turns = registry.counter(
+    "welcome_agent_turns_total", "Tours de conversation par issue (completed, cached, fast_path, redirected, shed, error)", ("outcome",))
+turn_duration = registry.histogram(
+    "welcome_agent_turn_duration_seconds", "Durée de bout en bout d'un tour, par modèle", ("model",))
+fast_path = registry.counter(
+    "welcome_agent_fast_path_total", "Tours répondus par le classifieur d'intentions, par intention", ("intent",))
+first_chunk = registry.histogram(
+    "welcome_agent_stream_first_chunk_seconds", "Délai avant le premier fragment d'une réponse en flux", ("model",))
+
+# Appels Groq
+upstream_duration = registry.histogram(
+    "welcome_agent_upstream_duration_seconds", "Durée des appels Groq (retries inclus), par modèle", ("model", "outcome"))
+upstream_in_flight = registry.gauge(
+    "welcome_agent_upstream_in_flight", "Appels Groq en cours, par modèle", ("model",))
+upstream_errors = registry.counter(
+    "welcome_agent_upstream_errors_total", "Appels Groq en échec, par classe d'erreur", ("model", "error_class"))
+admission = registry.counter(
+    "welcome_agent_admission_total", "Décisions du contrôle d'admission (admitted, queued, queue_full, budget, timeout, deferred)", ("model", "outcome"))
+admission_wait = registry.histogram(
+    "welcome_agent_admission_wait_seconds", "Attente dans la file d'admission avant l'appel Groq", ("model",))
+speculative_calls = registry.counter(
+    "welcome_agent_speculative_calls_total",
+    "Appels Groq spéculatifs par issue (used, cancelled, discarded) et motif d'abandon", ("outcome", "reason"))
+coalesced = registry.counter(
+    "welcome_agent_coalesced_requests_total", "Tours servis par un appel Groq identique déjà en cours")
+truncated_responses = registry.counter(
+    "welcome_agent_truncated_responses_total",
+    "Réponses coupées par max_tokens, par type de demande (continued : complétées, cut : restées tronquées)",
+    ("policy", "outcome"))
+tokens = registry.counter(
+    "welcome_agent_tokens_total", "Tokens consommés (prompt, completion), par modèle", ("model", "kind"))
+completion_tokens = registry.histogram(
+    "welcome_agent_completion_tokens", "Tokens générés par réponse", ("model",), buckets=MetricsConfig.TOKEN_BUCKETS)
+
+# Filtrage des requêtes
+validation_failures = registry.counter(
+    "welcome_agent_validation_failures_total", "Messages rejetés à la validation, par motif", ("reason",))
+rate_limited = registry.counter(
+    "welcome_agent_rate_limited_total", "Requêtes refusées par le rate limiting")
+
+# Lots (/api/welcome/batch)
+batch_items = registry.counter(
+    "welcome_agent_batch_items_total", "Conversations traitées en lot, par issue (ok, validation, overloaded, error)", ("status",))
+
+# Étapes des requêtes (tracing.span)
+span_duration = registry.histogram(
+    "welcome_agent_span_duration_seconds", "Durée des étapes d'une requête (parse, validate, groq...)", ("span",),
+    buckets=MetricsConfig.SPAN_BUCKETS)
+
+# Démarrage des workers
+worker_startup = registry.histogram(
+    "welcome_agent_worker_startup_seconds", "Démarrage d'un worker par phase (init, prewarm, first_request)", ("phase",))
+
+
+def setup_metrics():
+    """Démarrer l'écriture de l'instantané partagé entre workers"""
+    if MetricsConfig.ENABLED:
+        registry.start()
@@ -0,0 +1,179 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+
+def client_ip_from(forwarded_for, remote_addr):
+    """Extraire l'IP du client : premier saut de X-Forwarded-For, sinon l'adresse distante"""
+    if forwarded_for:
+        first_hop = forwarded_for.split(",", 1)[0].strip()
+        if first_hop:
+            return first_hop
+    return remote_addr or "unknown"
+
+
+def _refill(tokens, updated, now, capacity, rate):
+    """Niveau du seau après recharge depuis la dernière mise à jour"""
+    return min(capacity, tokens + max(0.0, now - updated) * rate)
+
+
+class MemoryBackend:
+    """État des seaux en mémoire du processus.
+
+    Les clients sont gardés dans une LRU : un client inactif depuis plus
+    de idle_ttl a un seau plein et peut être oublié sans changer le résultat.
+    """
+
+    def __init__(self, max_clients, idle_ttl):
+        self.max_clients = max_clients
+        self.idle_ttl = idle_ttl
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def _evict(self, now):
+        buckets = self._buckets
+        while buckets:
+            key, bucket = next(iter(buckets.items()))
+            if len(buckets) <= self.max_clients and now - bucket[1] <= self.idle_ttl:
+                break
+            del buckets[key]
+            self.evictions += 1
+
+    def acquire(self, key, capacity, rate, cost=1.0):
+        """Consommer cost jetons ; retourne (autorisé, secondes avant le prochain jeton)"""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = [capacity, now]
+                self._buckets[key] = bucket
+                self._evict(now)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = _refill(bucket[0], bucket[1], now, capacity, rate)
+                bucket[1] = now
+
+            if bucket[0] >= cost:
+                bucket[0] -= cost
+                return True, 0.0
+            return False, (cost - bucket[0]) / rate
+
+    def stats(self):
+        with self._lock:
+            return {"backend": "memory", "clients": len(self._buckets), "evictions": self.evictions}
+
+
+class SQLiteBackend:
+    """État des seaux partagé par tous les workers d'une machine via SQLite.
+
+    Placé par défaut dans /dev/shm (mémoire partagée) quand il existe. Chaque
+    vérification est une transaction BEGIN IMMEDIATE, donc atomique entre
+    processus.
+    """
+
+    # Nettoyage des clients inactifs toutes les N vérifications
+    SWEEP_EVERY = 1000
+
+    def __init__(self, path, idle_ttl):
+        self.path = path
+        self.idle_ttl = idle_ttl
+        self._local = threading.local()
+        self._checks = 0
+        self.evictions = 0
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS buckets ("
+            "client TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS buckets_updated ON buckets(updated)")
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        # Une connexion SQLite ne doit pas être réutilisée après un fork (gunicorn --preload)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def acquire(self, key, capacity, rate, cost=1.0):
+        """Consommer cost jetons ; retourne (autorisé, secondes avant le prochain jeton)"""
+        conn = self._connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE client = ?", (key,)).fetchone()
+            tokens = capacity if row is None else _refill(row[0], row[1], now, capacity, rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            conn.execute(
+                "INSERT INTO buckets (client, tokens, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT(client) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                (key, tokens, now)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        self._checks += 1
+        if self._checks % self.SWEEP_EVERY == 0:
+            self._sweep(now)
+        return (True, 0.0) if allowed else (False, (cost - tokens) / rate)
+
+    def _sweep(self, now):
+        cursor = self._connection().execute("DELETE FROM buckets WHERE updated < ?", (now - self.idle_ttl,))
+        self.evictions += cursor.rowcount
+
+    def stats(self):
+        count = self._connection().execute("SELECT COUNT(*) FROM buckets").fetchone()[0]
+        return {"backend": "sqlite", "path": self.path, "clients": count, "evictions": self.evictions}
+
+
+class RateLimiter:
+    """Limiteur à seau de jetons (token bucket).
+
+    capacity jetons au maximum (rafale autorisée), rechargés à raison de
+    per_minute jetons par minute.
+    """
+
+    def __init__(self, backend, per_minute, burst=None):
+        self.backend = backend
+        self.capacity = float(burst or per_minute)
+        self.rate = per_minute / 60.0
+        self.rejections = 0
+
+    def check(self, client_id, cost=1.0):
+        """Retourne (autorisé, secondes à attendre avant de réessayer)"""
+        allowed, retry_after = self.backend.acquire(client_id, self.capacity, self.rate, cost)
+        if not allowed:
+            self.rejections += 1
+        return allowed, retry_after
+
+    def stats(self):
+        stats = self.backend.stats()
+        stats["rejections"] = self.rejections
+        return stats
+
+
+def default_sqlite_path():
+    """Fichier partagé par les workers : /dev/shm si disponible, sinon le dossier temporaire"""
+    directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(directory, "welcome_agent_ratelimit.db")
+
+
+def create_rate_limiter(config):
+    """Construire le limiteur décrit par SecurityConfig"""
+    idle_ttl = config.RATE_LIMIT_IDLE_TTL
+    if config.RATE_LIMIT_BACKEND == "sqlite":
+        backend = SQLiteBackend(config.RATE_LIMIT_DB_PATH or default_sqlite_path(), idle_ttl)
+    else:
+        backend = MemoryBackend(config.RATE_LIMIT_MAX_CLIENTS, idle_ttl)
+    return RateLimiter(backend, config.RATE_LIMIT_PER_MINUTE, config.RATE_LIMIT_BURST)
@@ -0,0 +1,68 @@
+import hmac
+from config import SecurityConfig, BatchConfig
+from agents.keyword_matcher import get_content_matcher
+from rate_limiter import RateLimiter, create_rate_limiter, client_ip_from
+from tracing import span
+import metrics
+
+# Rate limiting par seau de jetons (backend mémoire ou partagé)
+rate_limiter = create_rate_limiter(SecurityConfig)
+
+# Lots : budget séparé (un jeton par message), mêmes seaux que rate_limiter
+batch_rate_limiter = RateLimiter(rate_limiter.backend, BatchConfig.RATE_LIMIT_PER_MINUTE, BatchConfig.RATE_LIMIT_BURST)
+
+def check_rate_limit(client_ip):
+    """Vérifier le rate limiting"""
+    with span("rate_limit"):
+        allowed, _ = rate_limiter.check(client_ip)
+    if not allowed:
+        metrics.rate_limited.inc()
+    return allowed
+
+def check_batch_rate_limit(client_ip, messages):
+    """Vérifier le rate limiting d'un lot ; retourne (autorisé, secondes avant de réessayer)"""
+    allowed, retry_after = batch_rate_limiter.check(f"batch:{client_ip}", messages)
+    if not allowed:
+        metrics.rate_limited.inc()
+    return allowed, retry_after
+
+def _bearer_matches(authorization, key):
+    """Comparer (à temps constant) le jeton de l'en-tête Authorization: Bearer à la clé"""
+    scheme, _, token = (authorization or "").partition(" ")
+    return scheme.lower() == "bearer" and hmac.compare_digest(token.strip().encode(), key.encode())
+
+def check_batch_token(authorization):
+    """Vérifier le jeton des lots (en-tête Authorization: Bearer ; toujours refusé si BATCH_API_KEY est absent)"""
+    return bool(BatchConfig.API_KEY) and _bearer_matches(authorization, BatchConfig.API_KEY)
+
+def admin_enabled():
+    return bool(SecurityConfig.ADMIN_API_KEY)
+
+def check_admin_token(authorization):
+    """Vérifier le jeton des routes d'administration (toujours refusé si ADMIN_API_KEY est absent)"""
+    return admin_enabled() and _bearer_matches(authorization, SecurityConfig.ADMIN_API_KEY)
+
+# Matcher des listes de mots-clés, compilé au démarrage
+content_matcher = get_content_matcher()
+
+def _reject(reason, error_msg):
+    """Compter le rejet (motif court pour les métriques) et retourner l'erreur"""
+    metrics.validation_failures.inc(reason)
+    return False, error_msg
+
+def validate_message(message):
+    """Valider le message utilisateur"""
+    if not message:
+        return _reject("empty", "Message vide")
+
+    if len(message) < SecurityConfig.MIN_MESSAGE_LENGTH:
+        return _reject("too_short", "Message trop court")
+
+    if len(message) > SecurityConfig.MAX_MESSAGE_LENGTH:
+        return _reject("too_long", "Message trop long")
+
+    # Vérifier les mots interdits
+    if "blocked" in content_matcher.categories(message):
+        return _reject("blocked", f"Contenu non autorisé détecté")
+
+    return True, None
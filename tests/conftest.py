@@ -0,0 +1,5 @@
+import os
+
+# Configuration minimale pour importer l'application (aucun appel réel à Groq)
+os.environ.setdefault("GROQ_API_KEY", "gsk_test")
+os.environ.setdefault("LOG_FILE", "")
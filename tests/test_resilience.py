@@ -0,0 +1,229 @@
+import asyncio
+import time
+import pytest
+from agents.resilience import CircuitBreaker, CircuitOpenError, ResilientCaller
+
+
+class UpstreamError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def make_caller(max_retries=2, total_deadline=5, hedging=False, **options):
+    breaker = CircuitBreaker(failure_threshold=10, reset_timeout=30)
+    return ResilientCaller(timeout=5, max_retries=max_retries, total_deadline=total_deadline,
+                           backoff_base=0.01, backoff_max=0.02, breaker=breaker, hedging=hedging, **options)
+
+
+def failing(errors, result="ok"):
+    """Requête qui lève les erreurs données, une par tentative, puis réussit"""
+    attempts = []
+
+    def request(timeout):
+        attempts.append(timeout)
+        if len(attempts) <= len(errors):
+            raise errors[len(attempts) - 1]
+        return result
+    return request, attempts
+
+
+def prime_latencies(caller, seconds, samples=20):
+    """Latences observées : le hedging ne part qu'une fois le p95 connu"""
+    for _ in range(samples):
+        caller.latencies.record(seconds)
+
+
+def half_open_caller():
+    """Appelant dont le disjoncteur vient de s'ouvrir et accepte un appel d'essai"""
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    return ResilientCaller(timeout=5, max_retries=0, total_deadline=5, backoff_base=0.01,
+                           backoff_max=0.01, breaker=breaker)
+
+
+def test_cancelled_half_open_trial_releases_slot():
+    caller = half_open_caller()
+
+    async def slow(timeout):
+        await asyncio.sleep(10)
+
+    async def ok(timeout):
+        return "ok"
+
+    async def scenario():
+        trial = asyncio.ensure_future(caller.acall(slow))
+        await asyncio.sleep(0.01)
+        assert caller.breaker.state == CircuitBreaker.HALF_OPEN
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+        # L'essai annulé n'a rien conclu : l'appel suivant peut servir d'essai
+        return await caller.acall(ok)
+
+    assert asyncio.run(scenario()) == "ok"
+    assert caller.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_allows_single_trial():
+    caller = half_open_caller()
+
+    async def slow(timeout):
+        await asyncio.sleep(10)
+
+    async def ok(timeout):
+        return "ok"
+
+    async def scenario():
+        trial = asyncio.ensure_future(caller.acall(slow))
+        await asyncio.sleep(0.01)
+        try:
+            with pytest.raises(CircuitOpenError):
+                await caller.acall(ok)
+        finally:
+            trial.cancel()
+
+    asyncio.run(scenario())
+
+
+def test_transient_errors_are_retried():
+    caller = make_caller(max_retries=2)
+    request, attempts = failing([UpstreamError(503), TimeoutError()])
+
+    assert caller.call(request) == "ok"
+    assert len(attempts) == 3
+    assert caller.counters["retries"] == 2
+    assert caller.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_client_errors_are_not_retried():
+    caller = make_caller(max_retries=2)
+    request, attempts = failing([UpstreamError(400)])
+
+    with pytest.raises(UpstreamError):
+        caller.call(request)
+    assert len(attempts) == 1
+    assert caller.counters["failures"] == 0
+
+
+def test_retries_stop_at_max_retries():
+    caller = make_caller(max_retries=1)
+    request, attempts = failing([UpstreamError(500)] * 3)
+
+    with pytest.raises(UpstreamError):
+        caller.call(request)
+    assert len(attempts) == 2
+
+
+def test_backoff_is_bounded_and_stops_at_deadline():
+    caller = make_caller(max_retries=5, total_deadline=0.05)
+    for attempt in range(10):
+        assert 0 <= caller._backoff(attempt) <= caller.backoff_max
+
+    def slow_failure(timeout):
+        time.sleep(0.03)
+        raise UpstreamError(503)
+
+    started = time.monotonic()
+    with pytest.raises(UpstreamError):
+        caller.call(slow_failure)
+    # Pas de nouvelle tentative dont le backoff dépasserait le délai global
+    assert time.monotonic() - started < 0.2
+    assert caller.counters["retries"] < 5
+
+
+def test_hedge_wins_over_slow_primary():
+    caller = make_caller(hedging=True, hedge_min_delay=0.02)
+    prime_latencies(caller, 0.02)
+    calls = []
+
+    def request(timeout):
+        calls.append(timeout)
+        if len(calls) == 1:
+            time.sleep(0.5)
+            return "primary"
+        return "hedge"
+
+    assert caller.call(request) == "hedge"
+    assert caller.counters["hedges"] == 1
+    assert caller.counters["hedge_wins"] == 1
+
+
+def test_async_hedge_wins_over_slow_primary():
+    caller = make_caller(hedging=True, hedge_min_delay=0.02)
+    prime_latencies(caller, 0.02)
+    calls = []
+
+    async def request(timeout):
+        calls.append(timeout)
+        if len(calls) == 1:
+            await asyncio.sleep(0.5)
+            return "primary"
+        return "hedge"
+
+    assert asyncio.run(caller.acall(request)) == "hedge"
+    assert caller.counters["hedge_wins"] == 1
+
+
+def test_hedged_attempt_is_bounded_by_timeout():
+    caller = make_caller(max_retries=0, total_deadline=0.2, hedging=True, hedge_min_delay=0.02)
+    prime_latencies(caller, 0.02)
+
+    def stuck(timeout):
+        # Serveur qui ignore le timeout demandé
+        time.sleep(1)
+        return "late"
+
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        caller.call(stuck)
+    assert time.monotonic() - started < 0.5
+
+
+def test_trickling_stream_stops_at_deadline():
+    caller = make_caller(total_deadline=0.1)
+    closed = []
+
+    class Trickle:
+        def __iter__(self):
+            for index in range(100):
+                time.sleep(0.02)
+                yield index
+
+        def close(self):
+            closed.append(True)
+
+    stream = caller.call(lambda timeout: Trickle(), stream=True)
+    received = []
+    with pytest.raises(TimeoutError):
+        for chunk in stream:
+            received.append(chunk)
+    assert len(received) < 10
+    assert closed
+
+
+def test_async_trickling_stream_stops_at_deadline():
+    caller = make_caller(total_deadline=0.1)
+
+    class Trickle:
+        async def __aiter__(self):
+            for index in range(100):
+                await asyncio.sleep(0.02)
+                yield index
+
+        async def close(self):
+            pass
+
+    async def request(timeout):
+        return Trickle()
+
+    async def scenario():
+        received = []
+        stream = await caller.acall(request, stream=True)
+        with pytest.raises(TimeoutError):
+            async for chunk in stream:
+                received.append(chunk)
+        return received
+
+    assert len(asyncio.run(scenario())) < 10
@@ -0,0 +1,35 @@
+from types import SimpleNamespace
+import main
+from config import SessionConfig
+
+
+class FakeCompletions:
+    """Client Groq factice : enregistre les messages reçus"""
+
+    def __init__(self):
+        self.calls = []
+
+    def create(self, messages, **params):
+        self.calls.append(messages)
+        message = SimpleNamespace(role="assistant", content=f"Réponse {len(self.calls)}")
+        usage = SimpleNamespace(prompt_tokens=10, completion_tokens=5, total_tokens=15)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason="stop")], usage=usage)
+
+
+def test_requests_without_session_id_share_history():
+    completions = FakeCompletions()
+    main.get_agent().client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    client = main.app.test_client()
+
+    first = client.post("/api/welcome", json={"message": "Je veux construire une maison à Douala"},
+                        base_url="https://localhost")
+    session_id = first.headers[SessionConfig.SESSION_HEADER]
+    assert first.get_json()["session_id"] == session_id
+    assert client.get_cookie(SessionConfig.SESSION_COOKIE).value == session_id
+
+    # Aucun identifiant explicite : le cookie renvoyé par la première réponse suffit
+    second = client.post("/api/welcome", json={"message": "Quel est le délai pour les fondations ?"},
+                         base_url="https://localhost")
+    assert second.headers[SessionConfig.SESSION_HEADER] == session_id
+    contents = [message["content"] for message in completions.calls[-1]]
+    assert "Je veux construire une maison à Douala" in contents
@@ -0,0 +1,108 @@
+import asyncio
+import time
+from agents.session_backend import SQLiteSessionBackend
+from agents.session_store import SessionStore
+
+
+def make_store(backend=None, max_sessions=100, ttl=60, revalidate_interval=5.0, **kwargs):
+    return SessionStore(max_history=10, ttl=ttl, max_sessions=max_sessions, max_turns=1000,
+                        max_bytes=10 ** 6, stripes=1, backend=backend,
+                        revalidate_interval=revalidate_interval, **kwargs)
+
+
+def turn(content, role="user"):
+    return {"role": role, "content": content}
+
+
+class CountingBackend(SQLiteSessionBackend):
+    """Backend SQLite qui compte les lectures de révision"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.revision_reads = 0
+
+    def revision(self, session_id):
+        self.revision_reads += 1
+        return super().revision(session_id)
+
+
+def test_lru_eviction_drops_least_recent_session():
+    store = make_store(max_sessions=2)
+    store.append("a", turn("1"))
+    store.append("b", turn("2"))
+    store.get_history("a")
+    store.append("c", turn("3"))
+
+    assert store.length("a") == 1
+    assert store.length("b") == 0
+    assert store.stats()["evictions"] == 1
+
+
+def test_ttl_expiry():
+    store = make_store(ttl=0.05)
+    store.append("a", turn("1"))
+    time.sleep(0.06)
+
+    assert store.get_history("a") == []
+    assert store.stats()["expirations"] == 1
+
+
+def test_revision_counts_appends_and_resets(tmp_path):
+    backend = SQLiteSessionBackend(str(tmp_path / "sessions.db"), ttl=60)
+    store = make_store(backend)
+    store.append("a", turn("1"), turn("2", "assistant"))
+    store.reset("a")
+    backend.flush(5)
+
+    assert backend.revision("a") == 3
+    assert store.get_history("a") == []
+
+
+def test_reload_after_restart(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    backend = SQLiteSessionBackend(path, ttl=60)
+    make_store(backend).append("a", turn("bonjour"), turn("salut", "assistant"))
+    backend.flush(5)
+
+    store = make_store(SQLiteSessionBackend(path, ttl=60))
+    assert store.get_history("a") == [turn("bonjour"), turn("salut", "assistant")]
+
+
+def test_reload_changes_from_other_worker(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    first = make_store(SQLiteSessionBackend(path, ttl=60), revalidate_interval=0)
+    second_backend = SQLiteSessionBackend(path, ttl=60)
+    second = make_store(second_backend, revalidate_interval=0)
+
+    first.append("a", turn("1"))
+    first.backend.flush(5)
+    assert second.get_history("a") == [turn("1")]
+
+    second.append("a", turn("2", "assistant"))
+    second_backend.flush(5)
+    assert first.get_history("a") == [turn("1"), turn("2", "assistant")]
+
+
+def test_unknown_session_is_read_once(tmp_path):
+    backend = CountingBackend(str(tmp_path / "sessions.db"), ttl=60)
+    store = make_store(backend)
+    store.get_history("a")
+    store.length("a")
+    store.append("a", turn("1"))
+
+    assert backend.revision_reads == 1
+
+
+def test_arefresh_loads_session_off_loop(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    backend = SQLiteSessionBackend(path, ttl=60)
+    make_store(backend).append("a", turn("1"))
+    backend.flush(5)
+
+    reader = CountingBackend(path, ttl=60)
+    store = make_store(reader)
+    assert store.needs_refresh("a")
+    asyncio.run(store.arefresh("a"))
+    assert not store.needs_refresh("a")
+    assert store.get_history("a") == [turn("1")]
+    assert reader.revision_reads == 1
@@ -0,0 +1,207 @@
+import contextvars
+import os
+import re
+import sys
+import threading
+import time
+from config import TracingConfig
+from logging_setup import get_logger
+import metrics
+
+request_log = get_logger("request")
+
+# Trace de la requête en cours (None hors requête ou si le traçage est désactivé)
+_trace_var = contextvars.ContextVar("trace", default=None)
+
+
+class Trace:
+    """Durées des étapes d'une requête, cumulées par nom d'étape"""
+
+    __slots__ = ("request_id", "started", "spans")
+
+    def __init__(self, request_id):
+        self.request_id = request_id
+        self.started = time.perf_counter()
+        self.spans = {}
+
+    def add(self, name, seconds):
+        self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self, total):
+        """Valeur de l'en-tête Server-Timing (durées en millisecondes)"""
+        parts = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.spans.items()]
+        parts.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(parts)
+
+
+class _Span:
+    __slots__ = ("name", "trace", "started")
+
+    def __init__(self, name, trace):
+        self.name = name
+        self.trace = trace
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.started
+        self.trace.add(self.name, elapsed)
+        metrics.span_duration.observe(elapsed, self.name)
+        return False
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name):
+    """Chronométrer une étape de la requête en cours : `with span("validate"): ...`"""
+    trace = _trace_var.get()
+    if trace is None:
+        return _NO_SPAN
+    return _Span(name, trace)
+
+
+def record(name, seconds):
+    """Ajouter une durée déjà mesurée (délai avant le premier fragment...)"""
+    trace = _trace_var.get()
+    if trace is not None:
+        trace.add(name, seconds)
+        metrics.span_duration.observe(seconds, name)
+
+
+def start_trace(request_id):
+    """Démarrer la trace de la requête courante"""
+    trace = Trace(request_id) if TracingConfig.ENABLED else None
+    _trace_var.set(trace)
+    return trace
+
+
+def finish_trace(trace, method, path, status):
+    """Clore la trace : valeur de l'en-tête Server-Timing (ou None), log des requêtes lentes"""
+    if trace is None:
+        return None
+    total = trace.elapsed()
+    if total * 1000 >= TracingConfig.SLOW_REQUEST_MS:
+        request_log.warning("slow_request", extra={"fields": {
+            "method": method,
+            "path": path,
+            "status": status,
+            "duration_ms": round(total * 1000, 2),
+            "spans_ms": {name: round(seconds * 1000, 2) for name, seconds in trace.spans.items()}
+        }})
+    return trace.server_timing(total) if TracingConfig.SERVER_TIMING else None
+
+
+# --- Profilage à la demande ---
+
+class ProfilerBusy(Exception):
+    """Un profilage est déjà en cours dans ce processus"""
+
+
+class SamplingProfiler:
+    """Profileur par échantillonnage des piles de tous les threads du processus.
+
+    Toutes les `interval` secondes, la pile de chaque thread est relevée
+    (sys._current_frames) et comptée ; rien n'est instrumenté, et rien
+    ne tourne en dehors d'un profilage. Le temps mesuré est du temps réel :
+    un thread bloqué sur une attente apparaît dans la pile de cette attente.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._labels = {}
+
+    @property
+    def running(self):
+        return self._lock.locked()
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+        return label
+
+    def _stack(self, frame):
+        labels = []
+        while frame is not None:
+            labels.append(self._label(frame.f_code))
+            frame = frame.f_back
+        labels.reverse()
+        return labels
+
+    @staticmethod
+    def _threads():
+        # Threads d'un même pool regroupés (batch_0, batch_1... -> batch)
+        return {thread.ident: re.sub(r"[-_ ]?\d+", "", thread.name) or "thread" for thread in threading.enumerate()}
+
+    def profile(self, seconds, interval=0.005, max_stacks=200):
+        """Échantillonner pendant `seconds` secondes (bloquant) et retourner les piles agrégées"""
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy("Un profilage est déjà en cours")
+        try:
+            own = threading.get_ident()
+            names = self._threads()
+            stacks = {}
+            samples = 0
+            started, cpu_started = time.monotonic(), time.process_time()
+            deadline = started + seconds
+            while time.monotonic() < deadline:
+                for ident, frame in sys._current_frames().items():
+                    if ident == own:
+                        continue
+                    if ident not in names:
+                        names = self._threads()
+                    key = (names.get(ident, "thread"), *self._stack(frame))
+                    stacks[key] = stacks.get(key, 0) + 1
+                samples += 1
+                time.sleep(interval)
+            elapsed, cpu = time.monotonic() - started, time.process_time() - cpu_started
+        finally:
+            self._lock.release()
+
+        # Fonctions : échantillons où elle est en haut de pile (self) ou présente (total)
+        functions = {}
+        for key, count in stacks.items():
+            for label in set(key[1:]):
+                entry = functions.setdefault(label, [0, 0])
+                entry[1] += count
+            if len(key) > 1:
+                functions[key[-1]][0] += count
+
+        top_stacks = sorted(stacks.items(), key=lambda item: item[1], reverse=True)[:max_stacks]
+        top_functions = sorted(functions.items(), key=lambda item: item[1][0], reverse=True)[:50]
+        return {
+            "pid": os.getpid(),
+            "seconds": round(elapsed, 3),
+            "cpu_seconds": round(cpu, 3),
+            "interval_ms": round(interval * 1000, 2),
+            "samples": samples,
+            "stacks": [{"stack": ";".join(key), "count": count} for key, count in top_stacks],
+            "functions": [
+                {"function": label, "self": own_count, "total": total}
+                for label, (own_count, total) in top_functions
+            ],
+        }
+
+
+def folded(report):
+    """Piles au format « pile compte » (flamegraph.pl, speedscope)"""
+    return "".join(f"{entry['stack']} {entry['count']}\n" for entry in report["stacks"])
+
+
+profiler = SamplingProfiler()